@@ -21,6 +21,13 @@ from logging import getLogger
 import uuid
 import struct
 import math
+from binascii import hexlify
+
+# related
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # pyogp
 from pyogp.lib.base.exc import DataParsingError
@@ -30,49 +37,96 @@ from pyogp.lib.base.exc import DataParsingError
 # initialize logging
 logger = getLogger('pyogp.lib.base.datatypes')
 
+# the wire layouts of vectors and quaternions, little endian floats
+_VECTOR3 = struct.Struct('<3f')
+_QUATERNION = struct.Struct('<4f')
+
+def _unpack_floats(bytes, offset, count, width):
+    """ the floats of count packed items of width floats each, count is
+    all that fit in bytes after offset if None """
+
+    if count == None:
+        count = (len(bytes) - offset) / (width * 4)
+
+    return struct.unpack_from('<%df' % (count * width), bytes, offset), count
+
+def _w_from_xyz(x, y, z):
+    """ the W of a normalized quaternion, which is sent as X, Y and Z """
+
+    t = 1.0 - (x*x + y*y + z*z)
+    if t > 0:
+        return math.sqrt(t)
+    else:
+        # Avoid sqrt(-episilon)
+        return 0.0
+
 class Vector3(object):
     """ represents a vector as a tuple"""
 
+    # positions and velocities are the most common variables in inbound
+    # traffic, so vectors have no per-instance __dict__
+    __slots__ = ('X', 'Y', 'Z')
+
     def __init__(self, bytes = None, offset = 0, X = 0.0, Y = 0.0, Z = 0.0):
 
         if bytes != None:
 
-            self.unpack_from_bytes(bytes, offset)
+            self.X, self.Y, self.Z = _VECTOR3.unpack_from(bytes, offset)
 
         else:
 
-            if type(X) != float: 
-                self.X = float(X)
-            else:
-                self.X = X
-            if type(Y) != float:
-                self.Y = float(Y)
-            else:
-                self.Y = Y
-            if type(Z) != float:
-                self.Z = float(Z)
-            else:
-                self.Z = Z
+            self.X = float(X)
+            self.Y = float(Y)
+            self.Z = float(Z)
+
+    @classmethod
+    def _make(cls, values):
+        """ a vector from a sequence of 3 floats, which are not converted """
+
+        vector = object.__new__(cls)
+        vector.X, vector.Y, vector.Z = values
+        return vector
+
+    @classmethod
+    def unpack_list(cls, bytes, offset = 0, count = None):
+        """ a list of the count vectors packed in bytes from offset, or all
+        that fit if count is None """
+
+        values, count = _unpack_floats(bytes, offset, count, 3)
+        make = cls._make
+
+        return [make(values[i:i + 3]) for i in xrange(0, count * 3, 3)]
+
+    @staticmethod
+    def unpack_array(bytes, offset = 0, count = None):
+        """ the count vectors packed in bytes from offset, or all that fit
+        if count is None, as a (count, 3) numpy array of float32 """
+
+        if numpy == None:
+            raise ImportError("unpack_array needs numpy")
+
+        if count == None:
+            count = (len(bytes) - offset) / 12
+
+        return numpy.frombuffer(bytes, '<f4', count * 3, offset).reshape(count, 3)
 
     def unpack_from_bytes(self, bytes, offset):
         """ unpack floats from binary """
 
-        # unpack from binary as Little Endian
-        self.X = struct.unpack("<f", bytes[offset:offset+4])[0]
-        self.Y = struct.unpack("<f", bytes[offset+4:offset+8])[0]
-        self.Z = struct.unpack("<f", bytes[offset+8:offset+12])[0]
+        # unpack from binary as Little Endian, in place
+        self.X, self.Y, self.Z = _VECTOR3.unpack_from(bytes, offset)
 
     def get_bytes(self):
         """ get bytes """
 
-        return struct.pack("<3f", self.X, self.Y, self.Z)
+        return _VECTOR3.pack(self.X, self.Y, self.Z)
 
     def data(self):
 
         return ((self.X, self.Y, self.Z))
 
     def copy(self):
-        return Vector3( X = self.X, Y = self.Y, Z = self.Z )
+        return Vector3._make((self.X, self.Y, self.Z))
 
     def __repr__(self):
         """ represent a vector as a string """
@@ -84,6 +138,78 @@ class Vector3(object):
 
         return ((self.X, self.Y, self.Z))
 
+    def __getstate__(self):
+
+        return (self.X, self.Y, self.Z)
+
+    def __setstate__(self, state):
+
+        self.X, self.Y, self.Z = state
+
+    # arithmetic builds the result directly, with no intermediate tuples
+
+    def __add__(self, other):
+
+        vector = object.__new__(Vector3)
+        vector.X = self.X + other.X
+        vector.Y = self.Y + other.Y
+        vector.Z = self.Z + other.Z
+        return vector
+
+    def __sub__(self, other):
+
+        vector = object.__new__(Vector3)
+        vector.X = self.X - other.X
+        vector.Y = self.Y - other.Y
+        vector.Z = self.Z - other.Z
+        return vector
+
+    def __mul__(self, scalar):
+
+        vector = object.__new__(Vector3)
+        vector.X = self.X * scalar
+        vector.Y = self.Y * scalar
+        vector.Z = self.Z * scalar
+        return vector
+
+    __rmul__ = __mul__
+
+    def __div__(self, scalar):
+
+        return self * (1.0 / scalar)
+
+    __truediv__ = __div__
+
+    def __neg__(self):
+
+        vector = object.__new__(Vector3)
+        vector.X = -self.X
+        vector.Y = -self.Y
+        vector.Z = -self.Z
+        return vector
+
+    def __iadd__(self, other):
+
+        self.X += other.X
+        self.Y += other.Y
+        self.Z += other.Z
+        return self
+
+    def __isub__(self, other):
+
+        self.X -= other.X
+        self.Y -= other.Y
+        self.Z -= other.Z
+        return self
+
+    def dot(self, other):
+
+        return self.X * other.X + self.Y * other.Y + self.Z * other.Z
+
+    def length(self):
+
+        return math.sqrt(self.X * self.X + self.Y * self.Y + self.Z * self.Z)
+
     def dist_squared(a, b):
         x = a.X - b.X
         y = a.Y - b.Y
@@ -102,11 +228,13 @@ class Vector3(object):
             raise ValueError("Expected 3 values in string")
 
         x, y, z = [float(d.strip()) for d in dims]
-        return Vector3(X=x, Y=y, Z=z)
+        return Vector3._make((x, y, z))
 
 class Quaternion(object):
     """ represents a quaternion as a tuple"""
 
+    __slots__ = ('X', 'Y', 'Z', 'W')
+
     def __init__(self, bytes = None, offset = 0, length = 4, X = 0.0, Y = 0.0, Z = 0.0, W = 0.0):
 
         if bytes != None:
@@ -115,58 +243,82 @@ class Quaternion(object):
 
         else:
 
-            if type(X) != float:
-                self.X = float(X)
-            else:
-                self.X = X
-            if type(Y) != float:
-                self.Y = float(Y)
-            else:
-                self.Y = Y            
-            if type(Z) != float: 
-                self.Z = float(Z)
-            else:
-                self.Z = Z
-            if type(W) != float: 
-                self.W = float(W)
-            else:
-                self.W = W
+            self.X = float(X)
+            self.Y = float(Y)
+            self.Z = float(Z)
+            self.W = float(W)
 
-    def unpack_from_bytes(self, bytes, offset, length=4):
-        """ unpack floats from binary """
+    @classmethod
+    def _make(cls, values):
+        """ a quaternion from a sequence of 4 floats, which are not
+        converted """
 
-        # unpack from binary as Little Endian
-        self.X = struct.unpack("<f", bytes[offset:offset+4])[0]
-        self.Y = struct.unpack("<f", bytes[offset+4:offset+8])[0]
-        self.Z = struct.unpack("<f", bytes[offset+8:offset+12])[0]
+        quat = object.__new__(cls)
+        quat.X, quat.Y, quat.Z, quat.W = values
+        return quat
 
-        #if length == 4:
-        # the above logic failed, the viewer was sending e.g. AgentUpdate:BodyRotation as 12 bytes (XYZ)
-        # moved this to a try:except
-        try:
-            #logger.debug("X:%s Y:%s Z:%s len(bytes):%s" % (self.X, self.Y, self.Z, len(bytes)))
-            self.W = struct.unpack("<f", bytes[offset+12:offset+16])[0]
+    @classmethod
+    def from_xyz(cls, x, y, z):
+        """ a normalized quaternion from the X, Y and Z it is sent as """
+
+        quat = object.__new__(cls)
+        quat.X = x
+        quat.Y = y
+        quat.Z = z
+        quat.W = _w_from_xyz(x, y, z)
+        return quat
+
+    @classmethod
+    def unpack_list(cls, bytes, offset = 0, count = None, length = 4):
+        """ a list of the count quaternions packed in bytes from offset, or
+        all that fit if count is None. length is 3 for quaternions sent as
+        X, Y and Z. """
+
+        values, count = _unpack_floats(bytes, offset, count, length)
+
+        if length == 3:
+            from_xyz = cls.from_xyz
+            return [from_xyz(*values[i:i + 3]) for i in xrange(0, count * 3, 3)]
+
+        make = cls._make
+        return [make(values[i:i + 4]) for i in xrange(0, count * 4, 4)]
+
+    @staticmethod
+    def unpack_array(bytes, offset = 0, count = None, length = 4):
+        """ the count quaternions packed in bytes from offset, or all that
+        fit if count is None, as a (count, length) numpy array of float32 """
+
+        if numpy == None:
+            raise ImportError("unpack_array needs numpy")
+
+        if count == None:
+            count = (len(bytes) - offset) / (length * 4)
 
-        except:
+        return numpy.frombuffer(bytes, '<f4', count * length, offset).reshape(count, length)
+
+    def unpack_from_bytes(self, bytes, offset, length=4):
+        """ unpack floats from binary """
+
+        # the viewer sends e.g. AgentUpdate:BodyRotation as 12 bytes (XYZ)
+        # whatever the length, so go by what is in bytes
+        if len(bytes) - offset >= 16:
+            self.X, self.Y, self.Z, self.W = _QUATERNION.unpack_from(bytes, offset)
+        else:
             # Unpack from vector3 
-            t = 1.0 - (self.X*self.X + self.Y*self.Y + self.Z*self.Z)
-            if t > 0:
-                self.W = math.sqrt(t)
-            else:
-                # Avoid sqrt(-episilon)
-                self.W = 0           
+            self.X, self.Y, self.Z = _VECTOR3.unpack_from(bytes, offset)
+            self.W = _w_from_xyz(self.X, self.Y, self.Z)
 
     def get_bytes(self):
         """ get bytes """
 
-        return struct.pack("<4f", self.X, self.Y, self.Z, self.W)
+        return _QUATERNION.pack(self.X, self.Y, self.Z, self.W)
 
     def data(self):
 
         return ((self.X, self.Y, self.Z, self.W))
 
     def copy(self):
-        return Quaternion(X=self.X, Y=self.Y, Z=self.Z, W=self.W)
+        return Quaternion._make((self.X, self.Y, self.Z, self.W))
 
     def __repr__(self):
         """ represent a quaternion as a string """
@@ -178,42 +330,91 @@ class Quaternion(object):
 
         return ((self.X, self.Y, self.Z, self.W))
 
+    def __getstate__(self):
+
+        return (self.X, self.Y, self.Z, self.W)
+
+    def __setstate__(self, state):
+
+        self.X, self.Y, self.Z, self.W = state
+
+NULL_UUID_BYTES = '\x00' * 16
+
 class UUID(object):
     """ represents a uuid as, well, a uuid 
 
     inbound LLUUID data from packets is already UUID(), they are 
     already the same 'datatype'
+
+    A UUID holds its 16 bytes, and builds the uuid.UUID in the uuid
+    attribute when it is first asked for. UUIDs are hashed and compared by
+    their bytes.
     """
 
+    __slots__ = ('_bytes', '_uuid')
+
     def __init__(self, string = '00000000-0000-0000-0000-000000000000', bytes = None, offset = 0):
 
         if bytes != None:
 
             self.unpack_from_bytes(bytes, offset)
 
+        elif string == '00000000-0000-0000-0000-000000000000':
+
+            self._bytes = NULL_UUID_BYTES
+            self._uuid = None
+
         else:
 
             self.uuid = uuid.UUID(string)
 
+    @classmethod
+    def from_bytes(cls, bytes, offset = 0):
+        """ the UUID of the 16 bytes at offset """
+
+        if offset or len(bytes) != 16:
+            bytes = bytes[offset:offset+16]
+
+        new_uuid = object.__new__(cls)
+        new_uuid._bytes = bytes
+        new_uuid._uuid = None
+
+        return new_uuid
+
+    def get_uuid(self):
+
+        if self._uuid == None:
+            self._uuid = uuid.UUID(bytes = self._bytes)
+
+        return self._uuid
+
+    def set_uuid(self, value):
+
+        self._uuid = value
+        self._bytes = value.bytes
+
+    uuid = property(get_uuid, set_uuid)
+
     def random(self):
 
-        if str(self.uuid) == '00000000-0000-0000-0000-000000000000':
+        if self._bytes == NULL_UUID_BYTES:
             self.uuid = uuid.uuid4()
             return self.uuid
 
         else:
-            logger.warning("Attempted to overwrite a stored uuid %s with a random, that is a bad idea..." % (str(self.uuid)))
+            logger.warning("Attempted to overwrite a stored uuid %s with a random, that is a bad idea..." % (str(self)))
 
     def unpack_from_bytes(self, bytes, offset):
         """ unpack uuid from binary """
 
         # unpack from binary
-        self.uuid = uuid.UUID(bytes = bytes[offset:offset+16])
+        self._bytes = str(bytes[offset:offset+16])
+        self._uuid = None
 
     def get_bytes(self):
         """ get bytes """
 
-        return str(self.uuid.bytes)
+        return self._bytes
 
     def data(self):
         """ represent a uuid as, well, a uuid """
@@ -221,25 +422,47 @@ class UUID(object):
         return self.uuid
 
     def copy(self):
-        return UUID(string=str(self.uuid))
+        return UUID(bytes = self._bytes)
+
+    def __str__(self):
+
+        hex = hexlify(self._bytes)
+        return '%s-%s-%s-%s-%s' % (hex[:8], hex[8:12], hex[12:16], hex[16:20], hex[20:])
 
     def __repr__(self):
         """ represent a uuid as a string """
 
-        return str(self.uuid)
+        return self.__str__()
 
     def __call__(self):
         """ represent a uuid as, well, a uuid """
 
         return self.uuid
 
+    def __hash__(self):
+
+        return hash(self._bytes)
 
     def __eq__(self, other):
-        if hasattr(other,'uuid'):
+        if isinstance(other, UUID):
+            return self._bytes == other._bytes
+        elif hasattr(other,'uuid'):
             return self.uuid == other.uuid
         else:
             return False
 
+    def __ne__(self, other):
+
+        return not self.__eq__(other)
+
+    def __getstate__(self):
+
+        return self._bytes
+
+    def __setstate__(self, state):
+
+        self._bytes = state
+        self._uuid = None
 
     def __xor__(self, arg):
         """ the xor of two UUIDs """
@@ -247,6 +470,71 @@ class UUID(object):
         result = uuid.UUID(int = temp)
         return UUID(result.__str__())
 
+class FrozenUUID(UUID):
+    """ a UUID that can't be changed, as a UUIDTable hands the same one to
+    every packet that carries its id. copy() returns one that can be. """
+
+    __slots__ = ()
+
+    def __init__(self, string = '00000000-0000-0000-0000-000000000000', bytes = None, offset = 0):
+
+        # the slots are set here, as the setters UUID.__init__ uses refuse
+        if bytes != None:
+            self._bytes = str(bytes[offset:offset+16])
+            self._uuid = None
+        else:
+            value = uuid.UUID(string)
+            self._bytes = value.bytes
+            self._uuid = value
+
+    def __frozen(self, *args):
+
+        raise TypeError("%s is shared and can't be changed, copy() it first" % (str(self)))
+
+    set_uuid = __frozen
+    random = __frozen
+    unpack_from_bytes = __frozen
+
+    uuid = property(UUID.get_uuid, __frozen)
+
+class UUIDTable(object):
+    """ shares one FrozenUUID between the packets decoded with it that
+    carry the same id, rather than building a UUID per field
+
+    It holds up to size ids, and is emptied when it is full, so the ids
+    seen over and over are soon shared again, and ones that are only seen
+    once don't stay around. Each UDPMessageDeserializer has its own, if
+    settings.ENABLE_UUID_INTERNING is set.
+    """
+
+    def __init__(self, size = 65536):
+
+        self.size = size
+        self.uuids = {}
+
+    def get(self, bytes, offset = 0):
+        """ the FrozenUUID of the 16 bytes at offset """
+
+        if offset or len(bytes) != 16:
+            bytes = bytes[offset:offset+16]
+
+        try:
+            return self.uuids[bytes]
+        except KeyError:
+            pass
+
+        if len(self.uuids) >= self.size:
+            self.uuids.clear()
+
+        new_uuid = FrozenUUID.from_bytes(bytes)
+        self.uuids[bytes] = new_uuid
+
+        return new_uuid
+
+    def __len__(self):
+
+        return len(self.uuids)
+
 
 
 
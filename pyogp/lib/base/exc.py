@@ -215,6 +215,12 @@ class MessageSerializationError(MessageSystemError):
     def __str__(self):   
         return "Error serializing '%s' due to reason: '%s'" % (self.label, self.reason)    
 
+class MessageTooLarge(MessageSerializationError):
+    """ a message doesn't fit in one datagram, and has to be split
+
+    stores the label and reason in ``label`` and ``reason`` attributes
+    """
+
 class MessageDeserializationError(MessageSystemError):
     """ problem deserializing packet data
 
@@ -21,6 +21,7 @@ from logging import getLogger
 import time
 import struct
 import math
+from binascii import hexlify
 
 # related
 from llbase import llsd
@@ -28,6 +29,10 @@ try:
     from eventlet import api as eventlet
 except ImportError:
     import eventlet
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # pyogp
 from pyogp.lib.base.exc import DataParsingError, DeserializationFailed
@@ -38,6 +43,42 @@ logger = getLogger('...utilities.helpers')
 
 
 
+def _as_uints(data, dtype, offset, count):
+    """ data as a numpy array of dtype, read from offset if it is bytes
+
+    offset is in bytes, so it doesn't apply to an array, which is sliced
+    by the caller instead, and an array with an offset or count raises
+    ValueError rather than having them ignored """
+
+    if numpy == None:
+        raise ImportError("dequantizing arrays needs numpy")
+
+    if isinstance(data, numpy.ndarray):
+        if offset or count != None:
+            raise ValueError("offset and count are for a byte buffer, slice the array instead")
+        return data
+
+    if count == None:
+        count = -1
+
+    return numpy.frombuffer(data, dtype, count, offset)
+
+def _dequantize(values, max_value, lower, upper):
+    """ maps unsigned ints from 0..max_value onto lower..upper, snapping
+    values within one step of zero to 0.0 """
+
+    one_over_max = 1.0 / max_value
+    delta = numpy.subtract(upper, lower, dtype = numpy.float64)
+
+    floats = values * one_over_max
+    floats *= delta
+    floats += lower
+
+    max_error = numpy.broadcast_to(delta * one_over_max, floats.shape)
+    floats[numpy.abs(floats) < max_error] = 0.0
+
+    return floats
+
 class Helpers(object):
     """ contains useful helper functions """
 
@@ -45,10 +86,9 @@ class Helpers(object):
     def bytes_to_hex(data):
         """ converts bytes to hex format """
 
-        #from binascii import hexlify
-        #return hex_string
-        #hex_string = hexlify(data)
-        return ''.join(["%02X " % ord(x) for x in data]).strip()
+        hex_string = hexlify(data).upper()
+
+        return ' '.join([hex_string[i:i+2] for i in xrange(0, len(hex_string), 2)])
 
     @staticmethod
     def bytes_to_ascii(data):
@@ -121,6 +161,23 @@ class Helpers(object):
 
         return val
 
+    @staticmethod
+    def packed_u16s_to_floats(data, lower, upper, offset = 0, count = None):
+        """ Extract the floats packed as u16s in a byte buffer, as a numpy
+        array, the way packed_u16_to_float does for one. data may also be an
+        array of the u16s, e.g. a column of a columnar block, and lower and
+        upper may be arrays that broadcast against the values, e.g. one per
+        component of a vector. offset (in bytes) and count only apply to a
+        byte buffer, an array is sliced instead. """
+
+        return _dequantize(_as_uints(data, '<u2', offset, count), 65535, lower, upper)
+
+    @staticmethod
+    def packed_u8s_to_floats(data, lower, upper, offset = 0, count = None):
+        """ Extract the floats packed as u8s in a byte buffer, as a numpy
+        array, the way packed_u8_to_float does for one """
+
+        return _dequantize(_as_uints(data, 'u1', offset, count), 255, lower, upper)
 
     @staticmethod
     def pack_quaternion_to_vector3(quaternion):
@@ -164,6 +221,24 @@ class Helpers(object):
 
         pass
 
+class LazyHex(object):
+    """ the hex of some bytes, for passing as an argument of a log call,
+    which only formats it when a handler emits the record, e.g.
+
+    logger.debug('Sent %s', LazyHex(data))
+    """
+
+    __slots__ = ('data', 'prefix')
+
+    def __init__(self, data, prefix = ''):
+
+        self.data = data
+        self.prefix = prefix
+
+    def __str__(self):
+
+        return self.prefix + Helpers.bytes_to_hex(self.data)
+
 class ListLLSDSerializer(object):
     """adapter for serializing a list to LLSD
 
@@ -0,0 +1,109 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+
+Benchmark of the block decoding done by UDPMessageDeserializer
+
+The "before" numbers come from legacy_decode(), the per variable
+DataUnpacker walk of the template the deserializer used to do, the "after"
+numbers from the compiled TemplateDecoder.
+
+    python -m pyogp.lib.base.message.benchmarks.bench_deserializer
+"""
+
+# standard python libs
+import timeit
+
+# pyogp
+from pyogp.lib.base.settings import Settings
+
+# pyogp messaging
+from pyogp.lib.base.message.template import MsgData, MsgBlockData, MsgVariableData
+from pyogp.lib.base.message.msgtypes import MsgType, MsgBlockType, PacketLayout
+from pyogp.lib.base.message.data_unpacker import DataUnpacker
+from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.zerocode import zero_code_expand
+from pyogp.lib.base.message.tests.test_packetdata import AGENT_DATA_UPDATE, \
+     AGENT_ANIMATION, OBJECT_UPDATE
+
+ITERATIONS = 5000
+
+def legacy_decode(template, data, decode_pos, msg_data, unpacker = DataUnpacker()):
+    """ the interpretive decode the compiled plans replace """
+
+    for block in template.blocks:
+
+        if block.block_type == MsgBlockType.MBT_SINGLE:
+            repeat_count = 1
+        elif block.block_type == MsgBlockType.MBT_MULTIPLE:
+            repeat_count = block.number
+        else:
+            repeat_count = unpacker.unpack_data(data, MsgType.MVT_U8, decode_pos)
+            decode_pos += 1
+
+        for i in range(repeat_count):
+            block_data = MsgBlockData(block.name)
+            block_data.block_number = i
+            msg_data.add_block(block_data)
+
+            for variable in block.variables:
+                var_size = variable.size
+                if variable.type == MsgType.MVT_VARIABLE:
+                    data_size = var_size
+                    if data_size == 1:
+                        var_size = unpacker.unpack_data(data, MsgType.MVT_U8, decode_pos)
+                    elif data_size == 2:
+                        var_size = unpacker.unpack_data(data, MsgType.MVT_U16, decode_pos)
+                    else:
+                        var_size = unpacker.unpack_data(data, MsgType.MVT_U32, decode_pos)
+                    decode_pos += data_size
+
+                unpacked_data = unpacker.unpack_data(data, variable.type, decode_pos, var_size=var_size)
+                if variable.type == MsgType.MVT_VARIABLE and variable.name != 'Data':
+                    unpacked_data = unpacked_data.rstrip('\x00')
+                block_data.add_variable(MsgVariableData(variable.name, unpacked_data, variable.type))
+                decode_pos += var_size
+
+    return decode_pos
+
+def main():
+
+    settings = Settings(quiet_logging = True)
+    settings.ENABLE_DEFERRED_PACKET_PARSING = False
+    deserializer = UDPMessageDeserializer(settings = settings)
+
+    for name, packet in (('AgentDataUpdate', AGENT_DATA_UPDATE),
+                         ('AgentAnimation', AGENT_ANIMATION),
+                         ('ObjectUpdate', OBJECT_UPDATE)):
+
+        # grab the expanded buffer and template the way deserialize() does
+        message = deserializer.deserialize(packet)
+        template = deserializer.template_dict[message.name]
+        data = packet
+        if ord(packet[0]) & 0x80:
+            data = packet[:6] + zero_code_expand(packet, 6)
+        freq_bytes = template.frequency
+        if freq_bytes == -1:
+            freq_bytes = 4
+        decode_pos = PacketLayout.PACKET_ID_LENGTH + freq_bytes
+
+        before = timeit.Timer(lambda: legacy_decode(template, data, decode_pos, MsgData(name))).timeit(ITERATIONS)
+        after = timeit.Timer(lambda: template.decoder.decode(data, decode_pos, MsgData(name))).timeit(ITERATIONS)
+
+        print '%-16s before: %8.2f us  after: %8.2f us  (%.1fx)' % \
+              (name, before / ITERATIONS * 1e6, after / ITERATIONS * 1e6, before / after)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+
+Benchmark of the block encoding done by UDPMessageSerializer
+
+The "before" numbers come from legacy_encode(), the per variable
+DataPacker walk of the template the serializer used to do, the "after"
+numbers from the compiled TemplateEncoder.
+
+    python -m pyogp.lib.base.message.benchmarks.bench_serializer
+"""
+
+# standard python libs
+import timeit
+from uuid import UUID
+
+# pyogp
+from pyogp.lib.base import exc
+from pyogp.lib.base.datatypes import Vector3, Quaternion
+
+# pyogp messaging
+from pyogp.lib.base.message.message import Message, Block
+from pyogp.lib.base.message.msgtypes import MsgType, MsgBlockType
+from pyogp.lib.base.message.data_packer import DataPacker
+from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
+
+ITERATIONS = 5000
+
+AGENT_ID = UUID('550e8400-e29b-41d4-a716-446655440000')
+SESSION_ID = UUID('550e8400-e29b-41d4-a716-446655440001')
+
+MESSAGES = (
+    Message('AgentUpdate',
+            Block('AgentData', AgentID = AGENT_ID, SessionID = SESSION_ID,
+                  BodyRotation = Quaternion(X = 0.0, Y = 0.0, Z = 0.6, W = 0.8),
+                  HeadRotation = Quaternion(X = 0.0, Y = 0.0, Z = 0.0, W = 1.0),
+                  State = 0,
+                  CameraCenter = Vector3(X = 128.0, Y = 128.0, Z = 22.5),
+                  CameraAtAxis = Vector3(X = 1.0, Y = 0.0, Z = 0.0),
+                  CameraLeftAxis = Vector3(X = 0.0, Y = 1.0, Z = 0.0),
+                  CameraUpAxis = Vector3(X = 0.0, Y = 0.0, Z = 1.0),
+                  Far = 64.0, ControlFlags = 0, Flags = 0)),
+    Message('ChatFromViewer',
+            Block('AgentData', AgentID = AGENT_ID, SessionID = SESSION_ID),
+            Block('ChatData', Message = 'Hi Locklainn Tester', Type = 1, Channel = 0)),
+    Message('PacketAck',
+            [Block('Packets', ID = i) for i in range(64)]),
+    )
+
+# the prefix packed before MVT_VARIABLE data, by its size in the template
+_SIZE_TYPES = {
+    1: MsgType.MVT_U8,
+    2: MsgType.MVT_U16,
+    4: MsgType.MVT_U32,
+    }
+
+def legacy_encode(template, message, packer = DataPacker()):
+    """ the per variable encode the compiled plans replace """
+
+    msg_buffer = template.msg_num_hex
+
+    for template_block in template.get_blocks():
+
+        block_list = message.get_block(template_block.name)
+        block_count = len(block_list)
+
+        if template_block.block_type == MsgBlockType.MBT_MULTIPLE:
+            if template_block.number != block_count:
+                raise exc.MessageSerializationError(template_block.name, "block data mismatch")
+
+        elif template_block.block_type == MsgBlockType.MBT_VARIABLE:
+            msg_buffer += packer.pack_data(block_count, MsgType.MVT_U8)
+
+        for block in block_list:
+
+            for v in template_block.get_variables():
+
+                variable = block.vars.get(v.name)
+                if variable == None:
+                    raise exc.MessageSerializationError(v.name, "variable value is not set")
+
+                data = packer.pack_data(variable.data, v.type)
+
+                if v.type == MsgType.MVT_VARIABLE:
+                    if v.size not in _SIZE_TYPES:
+                        raise exc.MessageSerializationError("variable size", "unrecognized variable size")
+                    msg_buffer += packer.pack_data(len(data), _SIZE_TYPES[v.size])
+
+                msg_buffer += data
+
+    return msg_buffer
+
+def main():
+
+    serializer = UDPMessageSerializer()
+
+    for message in MESSAGES:
+
+        template = serializer.template_dict[message.name]
+        assert legacy_encode(template, message) == template.encoder.encode(message)
+
+        before = timeit.Timer(lambda: legacy_encode(template, message)).timeit(ITERATIONS)
+        after = timeit.Timer(lambda: template.encoder.encode(message)).timeit(ITERATIONS)
+
+        print '%-16s before: %8.2f us  after: %8.2f us  (%.1fx)' % \
+              (message.name, before / ITERATIONS * 1e6, after / ITERATIONS * 1e6, before / after)
+
+if __name__ == "__main__":
+    main()
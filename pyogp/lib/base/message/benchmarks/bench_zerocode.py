@@ -0,0 +1,76 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+
+Benchmark of zero code expansion
+
+The "before" numbers come from legacy_zero_code_expand(), the per byte
+string concatenation the deserializer used to do, the "after" numbers from
+zerocode.zero_code_expand. The payloads are the zero coded bodies of
+captured packets, and a full MTU made of several ObjectUpdate bodies.
+
+    python -m pyogp.lib.base.message.benchmarks.bench_zerocode
+"""
+
+# standard python libs
+import timeit
+
+# pyogp messaging
+from pyogp.lib.base.message.zerocode import zero_code_expand
+from pyogp.lib.base.message.tests.test_packetdata import AGENT_DATA_UPDATE, \
+     OBJECT_UPDATE
+
+ITERATIONS = 2000
+
+def legacy_zero_code_expand(msg_buf):
+    """ the quadratic expansion zero_code_expand replaces """
+
+    newstring = ""
+    in_zero = False
+    for c in msg_buf:
+        if c != '\0':
+            if in_zero == True:
+                zero_count = ord(c)
+                zero_count = zero_count -1
+                while zero_count>0:
+                    newstring = newstring + '\x00'
+                    zero_count = zero_count -1
+                in_zero = False
+            else:
+                newstring = newstring + c
+        else:
+            newstring = newstring + c
+            in_zero = True
+    return newstring
+
+def main():
+
+    # the body follows the 6 byte header, none of these have extra header
+    payloads = (('AgentDataUpdate', AGENT_DATA_UPDATE[6:]),
+                ('ObjectUpdate', OBJECT_UPDATE[6:]),
+                ('ObjectUpdate x4', OBJECT_UPDATE[6:] * 4))
+
+    for name, payload in payloads:
+
+        assert legacy_zero_code_expand(payload) == zero_code_expand(payload)
+
+        before = timeit.Timer(lambda: legacy_zero_code_expand(payload)).timeit(ITERATIONS)
+        after = timeit.Timer(lambda: zero_code_expand(payload)).timeit(ITERATIONS)
+
+        print '%-16s %5d bytes  before: %8.2f us  after: %8.2f us  (%.1fx)' % \
+              (name, len(payload), before / ITERATIONS * 1e6, after / ITERATIONS * 1e6, before / after)
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,8 @@ or in
 $/LicenseInfo$
 """
 
-from msgtypes import PackFlags
+from msgtypes import PackFlags, PacketLayout
+from message import Message, PreparedMessage
 
 class Host(object):
 
@@ -72,14 +73,19 @@ class Circuit(object):
 
         packet.packet_id = self.next_packet_id()
 
+        #the acks are per send, as a packet may be sent more than once
+        packet.acks = []
+        packet.num_acks = 0
+
         #if we have acks that we can add on, add them
         ack_count = len(self.acks)
         if ack_count > 0 and packet.name != "PacketAck":
             packet.send_flags |= PackFlags.LL_ACK_FLAG
 
             #also, sends as many acks as we can onto the end of the packet
-            #acks are just the packet_id that we are acking
-            for packet_id in self.acks:
+            #acks are just the packet_id that we are acking. The serializer
+            #drops those that don't fit, see sent_acks
+            for packet_id in self.acks[:PacketLayout.MAX_APPENDED_ACKS]:
                 packet.add_ack(packet_id)
 
         if flag == PackFlags.LL_RELIABLE_FLAG:
@@ -103,6 +109,13 @@ class Circuit(object):
             del self.final_retry_packets[packet_id]
             self.final_packet_count -= 1
 
+    def sent_acks(self, packet_ids):
+        """ the acks in packet_ids went out appended to a packet, so
+            they don't need to be sent in a PacketAck """
+        if packet_ids:
+            sent = set(packet_ids)
+            self.acks = [packet_id for packet_id in self.acks if packet_id not in sent]
+
     def collect_ack(self, packet_id):
         """ set a packet_id that this circuit needs to eventually ack
             (need to send ack out)"""
@@ -112,6 +125,10 @@ class Circuit(object):
         """ add a packet that we want to be acked
             (want an incoming ack) """
         self.unack_packet_count += 1
+        #keep the message as it was sent, even if the sender goes on to
+        #change it, cloning is cheap as the blocks are shared until then
+        if isinstance(packet, (Message, PreparedMessage)):
+            packet = packet.clone()
         #self.unack_packet_bytes += buffer_length
         #if it can be resent/retried (not final) add it to the unack list
         #if 'retries' in params:
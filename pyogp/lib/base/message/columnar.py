@@ -0,0 +1,263 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+
+Columnar decoding of repeated blocks into NumPy structured arrays
+
+This needs numpy, which is an optional dependency. Messages are decoded
+this way when they are listed in Settings.COLUMNAR_MESSAGES.
+
+LLUUID, IP_ADDR and MVT_FIXED fields are raw bytes, which numpy hands back
+as numpy.void: use record['FullID'].tobytes() to get them as a str. They
+aren't 'S' fields, as numpy drops the trailing NULs of those, and a UUID
+can end in one.
+"""
+
+# standard python libs
+from logging import getLogger
+
+# related
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# pyogp messaging
+from template_decoder import VARIABLE_SIZE_FORMATS, VARIABLE_BLOCK_COUNT
+from msgtypes import MsgType, MsgBlockType
+
+logger = getLogger('message.columnar')
+
+# maps a fixed size variable type to its numpy dtype
+# LLVector3, LLVector3d and LLVector4 are arrays of their components, and
+# LLQuaternion is the X, Y and Z that are sent, without W
+# LLUUID, IP_ADDR and MVT_FIXED are raw bytes, see the module docstring
+NUMPY_FORMATS = {
+    MsgType.MVT_S8:             'i1',
+    MsgType.MVT_U8:             'u1',
+    MsgType.MVT_BOOL:           'u1',
+    MsgType.MVT_LLUUID:         'V16',
+    MsgType.MVT_IP_ADDR:        'V4',
+    MsgType.MVT_IP_PORT:        '>u2',
+    MsgType.MVT_U16:            '<u2',
+    MsgType.MVT_U32:            '<u4',
+    MsgType.MVT_U64:            '<u8',
+    MsgType.MVT_S16:            '<i2',
+    MsgType.MVT_S32:            '<i4',
+    MsgType.MVT_S64:            '<i8',
+    MsgType.MVT_F32:            '<f4',
+    MsgType.MVT_F64:            '<f8',
+    MsgType.MVT_LLVector3:      ('<f4', (3,)),
+    MsgType.MVT_LLVector3d:     ('<f8', (3,)),
+    MsgType.MVT_LLVector4:      ('<f4', (4,)),
+    MsgType.MVT_LLQuaternion:   ('<f4', (3,)),
+    }
+
+# kinds of steps in a block's layout
+FIXED_BYTES = 0
+VARIABLE_BYTES = 1
+
+class ColumnarBlock(object):
+    """ the layout of a template block as a numpy structured array
+
+    Fixed size variables get a field of their numpy type. MVT_VARIABLE
+    variables get an object field holding the bytes.
+    """
+
+    def __init__(self, template_block):
+
+        self.name = template_block.name
+        self.block_type = template_block.block_type
+        self.number = template_block.number
+
+        fields = []
+        fixed_fields = []
+
+        # a list of (FIXED_BYTES, size, None) or
+        # (VARIABLE_BYTES, Struct, strip) tuples
+        self.steps = []
+
+        for variable in template_block.get_variables():
+
+            if variable.type == MsgType.MVT_VARIABLE:
+
+                # some variable data needs to treated as binary instead of as string
+                self.steps.append((VARIABLE_BYTES,
+                                   VARIABLE_SIZE_FORMATS[variable.size],
+                                   variable.name != 'Data'))
+                fields.append((variable.name, object))
+                continue
+
+            if variable.type == MsgType.MVT_FIXED:
+                field = (variable.name, 'V%d' % (variable.size))
+            elif isinstance(NUMPY_FORMATS[variable.type], tuple):
+                field = (variable.name, ) + NUMPY_FORMATS[variable.type]
+            else:
+                field = (variable.name, NUMPY_FORMATS[variable.type])
+
+            size = numpy.dtype([field]).itemsize
+
+            # merge runs of fixed size variables
+            if self.steps and self.steps[-1][0] == FIXED_BYTES:
+                self.steps[-1] = (FIXED_BYTES, self.steps[-1][1] + size, None)
+            else:
+                self.steps.append((FIXED_BYTES, size, None))
+
+            fields.append(field)
+            fixed_fields.append(field)
+
+        self.dtype = numpy.dtype(fields)
+        self.fixed_dtype = numpy.dtype(fixed_fields)
+        self.fixed_names = [field[0] for field in fixed_fields]
+        self.variable_names = [field[0] for field in fields if field[1] is object]
+
+class ColumnarDecoder(object):
+    """ decodes the repeated (Multiple and Variable) blocks of a message
+    into numpy structured arrays, one record per repeat
+
+    Single blocks are decoded as usual, by the template's TemplateDecoder.
+    Blocks made of fixed size variables only are read straight out of the
+    datagram with numpy.frombuffer.
+    """
+
+    def __init__(self, template):
+
+        if numpy == None:
+            raise ImportError("columnar decoding of %s needs numpy" % (template.name))
+
+        self.name = template.name
+        self.decoder = template.decoder
+        # every field is decoded, see TemplateDecoder.project
+        self.projection = None
+        self.blocks = [ColumnarBlock(block) for block in template.get_blocks()]
+
+    def decode(self, data, decode_pos, msg_data, data_len = None, uuids = None):
+        """ decode the blocks in data starting at decode_pos into msg_data
+
+        the repeated blocks are stored as structured arrays in
+        msg_data.blocks, in place of lists of BlockRecords. Their rows support
+        the same block['Variable'] access.
+
+        returns the position after the last block, or None if the data is
+        too short for the template
+        """
+
+        if data_len == None:
+            data_len = len(data)
+
+        for block, block_decoder in zip(self.blocks, self.decoder.blocks):
+
+            if block.block_type == MsgBlockType.MBT_SINGLE:
+                decode_pos = self.decoder.decode_block(block_decoder, data, decode_pos, msg_data, data_len, uuids)
+            else:
+                decode_pos = self.decode_block(block, data, decode_pos, msg_data, data_len)
+
+            if decode_pos == None:
+                return None
+
+        return decode_pos
+
+    def decode_block(self, block, data, decode_pos, msg_data, data_len):
+        """ decode all repeats of block into a structured array in msg_data
+
+        returns the position after the block, or None if the data is too
+        short for the template
+        """
+
+        if block.block_type == MsgBlockType.MBT_MULTIPLE:
+            repeat_count = block.number
+        else:
+            if decode_pos >= data_len:
+                logger.warning("ERROR: no block count for %s in %s", block.name, self.name)
+                return None
+            repeat_count = VARIABLE_BLOCK_COUNT.unpack_from(data, decode_pos)[0]
+            decode_pos += 1
+
+            # like the TemplateDecoder, a Variable block that isn't there
+            # has no entry in msg_data
+            if repeat_count == 0:
+                return decode_pos
+
+        if not block.variable_names:
+
+            end_pos = decode_pos + repeat_count * block.dtype.itemsize
+            if end_pos > data_len:
+                logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                return None
+
+            # copied, so the array doesn't hold on to the datagram
+            msg_data.blocks[block.name] = numpy.frombuffer(data, block.dtype, repeat_count, decode_pos).copy()
+            return end_pos
+
+        fixed = []
+        variables = []
+
+        for i in range(repeat_count):
+
+            for kind, size, strip in block.steps:
+
+                if kind == FIXED_BYTES:
+
+                    end_pos = decode_pos + size
+                    if end_pos > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                        return None
+
+                    fixed.append(data[decode_pos:end_pos])
+
+                else:
+
+                    if decode_pos + size.size > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", decode_pos + size.size, data_len, self.name)
+                        return None
+
+                    var_size = size.unpack_from(data, decode_pos)[0]
+                    decode_pos += size.size
+
+                    end_pos = decode_pos + var_size
+                    if end_pos > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                        return None
+
+                    value = data[decode_pos:end_pos]
+                    if strip:
+                        value = value.rstrip('\x00')
+                    variables.append(value)
+
+                decode_pos = end_pos
+
+        records = numpy.empty(repeat_count, block.dtype)
+
+        if block.fixed_names:
+            fixed = numpy.frombuffer(''.join(fixed), block.fixed_dtype, repeat_count)
+            for name in block.fixed_names:
+                records[name] = fixed[name]
+
+        # the values are in record order, one per variable field
+        count = len(block.variable_names)
+        for index, name in enumerate(block.variable_names):
+            records[name] = variables[index::count]
+
+        msg_data.blocks[block.name] = records
+
+        return decode_pos
+
+def get_columnar_decoder(template):
+    """ the ColumnarDecoder of template, built on first use """
+
+    if template.columnar_decoder == None:
+        template.columnar_decoder = ColumnarDecoder(template)
+
+    return template.columnar_decoder
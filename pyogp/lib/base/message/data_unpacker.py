@@ -55,11 +55,6 @@ class DataUnpacker(object):
 
     def unpack_data(self, data, data_type, start_index=-1, \
                     var_size=-1, endian_type=EndianType.NONE):
-        if start_index != -1:
-            if var_size != -1:
-                data = data[start_index:start_index+var_size]
-            else:
-                data = data[start_index:start_index+sizeof(data_type)]
 
         if data_type in self.unpacker:
             unpack_tup = self.unpacker[data_type]
@@ -70,11 +65,23 @@ class DataUnpacker(object):
 
             unpack = unpack_tup[1]
             if callable(unpack):
+                if start_index != -1:
+                    if var_size != -1:
+                        data = data[start_index:start_index+var_size]
+                    else:
+                        data = data[start_index:start_index+sizeof(data_type)]
                 try:
                     return unpack(endian, data, var_size)
                 except struct.error, error:
                     traceback.print_exc()
                     raise DataUnpackingError(data, error)
+            elif start_index != -1:
+                # read in place rather than slicing the data
+                try:
+                    return struct.unpack_from(endian + unpack, data, start_index)[0]
+                except struct.error, error:
+                    traceback.print_exc()
+                    raise DataUnpackingError(data, error)
             else:
                 try:
                     return struct.unpack(endian + unpack, data)[0]
@@ -0,0 +1,201 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+# standard
+import struct
+import math
+import uuid
+
+# related
+from llbase import llsd
+
+# pyogp
+from msgtypes import MsgType
+from records import BlockRecord, get_record_class
+from pyogp.lib.base import exc
+
+# Converts a Message into the {'message': name, 'body': {Block: [{Var: value}]}}
+# form that messages take on the event queue, with the values converted the
+# way the viewer's LLSD message builder does: LLUUIDs as uuids, vectors and
+# quaternions as arrays of reals, U32, U64 and IP_ADDR as binary in network
+# order (LLSD integers are signed 32 bit), and fixed and 'Data' variables as
+# binary.
+
+def _to_uuid(value):
+
+    if isinstance(value, uuid.UUID):
+        return value
+    elif isinstance(value, str) and len(value) == 16:
+        # a raw column of a columnar block
+        return uuid.UUID(bytes = value)
+
+    return value.uuid
+
+def _to_array(value):
+
+    if isinstance(value, (tuple, list)):
+        return value
+    elif hasattr(value, 'tolist'):
+        # a numpy subarray of a columnar block
+        return value.tolist()
+
+    return value.data()
+
+def _to_quaternion(value):
+
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    elif not isinstance(value, (tuple, list)):
+        return value.data()
+
+    if len(value) == 3:
+        # the X, Y and Z of a columnar block, rebuild W
+        x, y, z = value
+        t = 1.0 - (x * x + y * y + z * z)
+        return (x, y, z, t > 0 and math.sqrt(t) or 0.0)
+
+    return value
+
+def _to_string(value):
+
+    try:
+        value.decode('utf-8')
+    except (UnicodeDecodeError, AttributeError):
+        return llsd.binary(value)
+
+    if '\x00' in value:
+        return llsd.binary(value)
+
+    return value
+
+_U32 = struct.Struct('>I')
+_U64 = struct.Struct('>Q')
+
+# converts a value of a variable type, types that are missing are already in
+# their llsd form
+CONVERTERS = {
+    MsgType.MVT_LLUUID:         _to_uuid,
+    MsgType.MVT_LLVector3:      _to_array,
+    MsgType.MVT_LLVector3d:     _to_array,
+    MsgType.MVT_LLVector4:      _to_array,
+    MsgType.MVT_LLQuaternion:   _to_quaternion,
+    MsgType.MVT_U32:            lambda value: llsd.binary(_U32.pack(value)),
+    MsgType.MVT_U64:            lambda value: llsd.binary(_U64.pack(value)),
+    MsgType.MVT_IP_ADDR:        llsd.binary,
+    MsgType.MVT_BOOL:           bool,
+    MsgType.MVT_FIXED:          llsd.binary,
+    MsgType.MVT_VARIABLE:       _to_string,
+    }
+
+def _to_untyped(value):
+    """ converts a value whose variable type is not known """
+
+    if hasattr(value, 'uuid'):
+        return value.uuid
+    elif hasattr(value, 'data') and hasattr(value, 'X'):
+        return value.data()
+    elif isinstance(value, str):
+        return _to_string(value)
+
+    return value
+
+def _convert(var_name, var_type, value):
+
+    if var_type == MsgType.MVT_VARIABLE and var_name == 'Data':
+        return llsd.binary(value)
+
+    converter = CONVERTERS.get(var_type, None)
+
+    if converter != None:
+        return converter(value)
+    elif var_type == None or var_type == -1:
+        return _to_untyped(value)
+
+    return value
+
+def _record_to_dict(record):
+
+    return dict([(var_name, _convert(var_name, var_type, value))
+                 for var_name, var_type, value in zip(record._fields, record._types, record)])
+
+def _block_list_to_dicts(template, block_name, block_list):
+
+    if hasattr(block_list, 'dtype'):
+        # a columnar block, whose rows are in the order of its template
+        record_class = get_record_class(template, block_name)
+        return [_record_to_dict(record_class(row)) for row in block_list.tolist()]
+
+    # the types of the variables of blocks that don't know them
+    template_types = {}
+    if template != None:
+        record_class = get_record_class(template, block_name)
+        if record_class != None:
+            template_types = dict(zip(record_class._fields, record_class._types))
+
+    dicts = []
+
+    for block in block_list:
+
+        if isinstance(block, BlockRecord):
+            dicts.append(_record_to_dict(block))
+        else:
+            values = {}
+            for var_name in block.var_list:
+                variable = block.vars[var_name]
+                var_type = variable.var_type
+                if var_type == None or var_type == -1:
+                    var_type = template_types.get(var_name)
+                values[var_name] = _convert(var_name, var_type, variable.data)
+            dicts.append(values)
+
+    return dicts
+
+def message_to_dict(message, template = None):
+    """ the {'message': name, 'body': {Block: [{Var: value}]}} form of a
+    Message, with its values converted to the types llsd formats
+
+    template, the message's MessageTemplate, gives the types of the values
+    of blocks built without them, it defaults to the template a received
+    message was decoded with.
+    """
+
+    if template == None:
+        template = getattr(message, 'template', None)
+
+    body = {}
+
+    for block_name, block_list in message.blocks.iteritems():
+        body[block_name] = _block_list_to_dicts(template, block_name, block_list)
+
+    return {'message': message.name, 'body': body}
+
+# the formats to_llsd can write
+FORMATTERS = {
+    'xml':      llsd.format_xml,
+    'binary':   llsd.format_binary,
+    }
+
+def format_message(message, format = 'xml', template = None):
+    """ a Message as llsd in format, 'xml' or 'binary', see message_to_dict """
+
+    try:
+        formatter = FORMATTERS[format]
+    except KeyError:
+        raise exc.MessageSerializationError(message.name, "unknown llsd format %s" % (format))
+
+    return formatter(message_to_dict(message, template))
@@ -17,14 +17,14 @@ $/LicenseInfo$
 """
 
 # standard
-from binascii import hexlify
-
-#related
-from llbase import llsd
+import copy
 
 # pyogp
-from template import MsgData, MsgBlockData, MsgVariableData
+from template import MsgData, MsgBlockData, MsgVariableData, data_as_string
+from records import as_record, BlockRecord, get_record_class
+from llsd_format import message_to_dict, format_message
 from msgtypes import PackFlags
+from pyogp.lib.base import exc
 
 # NOTE: right now there is no checking with the template
 
@@ -35,13 +35,31 @@ class MessageBase(MsgData):
     base representation of a message name, blocks, and variables.
     MessageBase expects a name, and args consisting of Block() instances 
     (which takes a name and kwargs)
+
+    Blocks of a known message, with a value for each of their variables,
+    are kept as records (see records.BlockRecord), and the blocks of a
+    message can be read as attributes: message.AgentData[0].AgentID
     """
 
+    __slots__ = ()
+
     def __init__(self, name, *args):
 
         super(Message, self).__init__(name)        
         self.parse_blocks(args)
 
+    def __getattr__(self, name):
+        """ blocks as attributes, their names are capitalized """
+
+        # through get_block, so a LazyMessage only decodes the one block
+        if name[:1].isupper():
+            try:
+                return self.get_block(name)
+            except KeyError:
+                pass
+
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
     def parse_blocks(self, block_list):
         """ parse the Block() instances in the args """
 
@@ -59,6 +77,8 @@ class Block(MsgBlockData):
     Block expects a name, and kwargs for variables (var_name = value)
     """
 
+    __slots__ = ()
+
     def __init__(self, name, **kwargs):
 
         super(Block, self).__init__(name)
@@ -78,6 +98,8 @@ class Variable(MsgVariableData):
     Variable expects a name, and data
     """
 
+    __slots__ = ()
+
     def __init__(self, name, data, var_type = None):
 
         super(Variable, self).__init__(name, data, var_type)
@@ -85,13 +107,33 @@ class Variable(MsgVariableData):
 class Message(MessageBase):
     """ a pyogp represention of a Second Life message """
 
+    __slots__ = ('original_args', 'send_flags', 'packet_id', 'event_queue_id',
+                 'acks', 'num_acks', 'trusted', 'reliable', 'resent',
+                 'socket', 'retries', 'host', 'expiration_time', '_shared',
+                 '_pool', 'template')
+
     def __init__(self, name, *args):
 
         super(MessageBase, self).__init__(name)
+
+        # the names of the blocks whose lists are shared with a clone
+        self._shared = ()
+
+        # the MessagePool the message goes back to when released
+        self._pool = None
+
+        # the MessageTemplate of a message that was received, whose blocks
+        # are kept as records of its record classes
+        self.template = None
+
         self.parse_blocks(args)
 
         self.original_args = args
 
+        self.__reset_header()
+
+    def __reset_header(self):
+
         self.send_flags         = PackFlags.LL_NONE
         self.packet_id          = 0 # aka, sequence number
         self.event_queue_id     = 0 # aka, event queue id
@@ -115,95 +157,321 @@ class Message(MessageBase):
         self.acks.append(packet_id)
         self.num_acks += 1
 
+    def renew(self, name):
+        """ empty the message for reuse as a new message called name, see
+        pool.MessagePool """
+
+        self.name = name
+        self.size = 0
+        self.blocks.clear()
+        self._shared = ()
+        self.original_args = ()
+        self.template = None
+
+        self.__reset_header()
+
+    def release(self):
+        """ hand the message back to the pool it came from, if any, for
+        reuse. It must not be used after this """
+
+        if self._pool != None:
+            self._pool.release(self)
+
+    def clone(self):
+        """ a copy of the message, which shares its blocks with this one
+        until either of them changes them through add_block() or set_var()
+
+        e.g. for a handler that rewrites a message other handlers also see,
+        or to keep a message as it was sent. Changing blocks in place
+        (message.blocks[...].append(), or block.vars[...].data = ...)
+        isn't seen by the copy on write, and changes both messages.
+        """
+
+        clone = Message(self.name)
+
+        for attribute in Message.__slots__:
+            setattr(clone, attribute, getattr(self, attribute))
+
+        # the clone isn't the pool's to reuse
+        clone._pool = None
+
+        clone.acks = list(self.acks)
+
+        # only the dict of block lists is copied, the lists are copied by
+        # whichever of the messages changes one first
+        clone.blocks = dict(self.blocks)
+        clone._shared = set(clone.blocks)
+        self._shared = set(self._shared).union(clone.blocks)
+
+        return clone
+
+    def __own_blocks(self, block_name):
+        """ the list of block_name blocks, copied first if a clone shares it """
+
+        if block_name in self._shared:
+            self._shared.remove(block_name)
+            self.blocks[block_name] = copy.copy(self.blocks[block_name])
+
+        return self.blocks[block_name]
+
+    def add_block(self, block):
+
+        if block.name in self._shared:
+            self.__own_blocks(block.name)
+
+        if self.template != None:
+            block = as_record(self.template, block)
+
+        super(Message, self).add_block(block)
+
+    def set_var(self, block_name, var_name, value, block_number = 0):
+        """ set a variable of the block_number'th block_name block
+
+        The block is replaced by a changed copy rather than changed in
+        place, so clones of the message are left as they were.
+        """
+
+        block_list = self.__own_blocks(block_name)
+        block = block_list[block_number]
+
+        if isinstance(block, BlockRecord):
+            block_list[block_number] = block._replace(**{var_name: value})
+
+        elif isinstance(block, MsgBlockData):
+            changed = Block(block.name)
+            for name in block.var_list:
+                variable = block.get_variable(name)
+                changed.add_variable(Variable(name, variable.data, variable.var_type))
+
+            if var_name in changed.vars:
+                changed.vars[var_name].data = value
+            else:
+                changed.add_variable(Variable(var_name, value))
+
+            if self.template != None:
+                changed = as_record(self.template, changed)
+
+            block_list[block_number] = changed
+
+        else:
+            # a row of a columnar array, whose array was copied above
+            block_list[block_number][var_name] = value
+
     def get_var(self, block, variable):
+        """ the variable in the first instance of block """
 
-        return self.blocks[block].vars[variable]
+        return self.get_block(block)[0].get_variable(variable)
 
     def from_dict_params(self, data):
         """ build this instance from a dict """
         pass
 
-    def to_dict(self):
-        """ an dict representation of a message """
-
-        # todo: make this properly honor datatypes
-        # Named datatypes need to better represent themselves
-        base_repr = {'body': {}, 'message': ''}
-
-        base_repr['message'] = self.name
-        
-        for block in self.blocks:
-            for _vars in self.blocks[block]:
-                new_vars = {}
-
-                for avar in _vars.var_list:
-                    this_var = _vars.get_variable(avar)
-                    new_vars[this_var.name] = this_var.data
- 
-            if block in base_repr['body']:
-                base_repr['body'][block].append(new_vars)
-            else: 
-                base_repr['body'][block] = [new_vars]
+    def to_dict(self, template = None):
+        """ an dict representation of a message, in the form of a message
+        on the event queue, see llsd_format.message_to_dict """
 
-        return base_repr
+        return message_to_dict(self, template)
 
     def from_llsd_params(self, data):
         """ build this instance from llsd """
         pass
 
-    def to_llsd(self):
-        """ an llsd representation of a message """
-
-        # broken!!! e.g.
-        '''
-        2010-01-09 01:47:16,482       client_proxy.lib.udpproxy     : INFO     Sending message:AgentUpdate to Host: '216.82.49.231:12035'. ID:86
-        2010-01-09 01:47:16,482       client_proxy.lib.udpproxy     : ERROR    Problem handling viewer to sim proxy: invalid type.
-        Traceback (most recent call last):
-          File "/Users/enus/sandbox/lib/python2.6/site-packages/pyogp.apps-0.1dev-py2.6.egg/pyogp/apps/proxy/lib/udpproxy.py", line 111, in _send_viewer_to_sim
-            logger.debug(recv_packet.as_llsd()) # ToDo: make this optionally llsd logging once that's in
-          File "/Users/enus/sandbox/lib/python2.6/site-packages/pyogp.lib.base-0.1dev-py2.6.egg/pyogp/lib/base/message/message.py", line 158, in as_llsd
-            return llsd.format_xml(self.as_dict())
-          File "build/bdist.macosx-10.6-universal/egg/llbase/llsd.py", line 353, in format_xml
-            return _g_xml_formatter.format(something)
-          File "build/bdist.macosx-10.6-universal/egg/llbase/llsd.py", line 334, in format
-            return cllsd.llsd_to_xml(something)
-        TypeError: invalid type
-        '''
-        
-        return llsd.format_xml(self.as_dict())
+    def to_llsd(self, format = 'xml', template = None):
+        """ an llsd representation of a message, format is 'xml' or
+        'binary', see llsd_format.message_to_dict """
+
+        return format_message(self, format, template)
 
     def data(self):
-        """ a string representation of a packet """
+        """ a string representation of a packet
+
+        This is only built when asked for, so log a message by passing it
+        as an argument, logger.debug('%s', message), rather than formatting
+        it into the log message.
+        """
 
-        string = ''
         delim = '    '
+        var_format = delim + delim + "%s:" + delim + "%s\n"
 
-        for k in self.__dict__:
+        lines = ['\nName: %s\n' % (self.name)]
 
-            if k == 'name':
-                string += '\nName: %s\n' % (self.name)
-            if k == 'blocks':
+        for ablock, block_list in self.blocks.iteritems():
+            lines.append("%sBlock Name:%s%s\n" % (delim, delim, ablock))
 
-                for ablock in self.blocks:
-                    string += "%sBlock Name:%s%s\n" % (delim, delim, ablock)
-                    for somevars in self.blocks[ablock]:
+            if hasattr(block_list, 'dtype'):
+                # a columnar block, whose rows are in the order of its
+                # template, which the decoder that made it set
+                record_class = get_record_class(self.template, ablock)
+                block_list = [record_class(row) for row in block_list.tolist()]
 
-                        for avar in somevars.var_list:
-                            zvar = somevars.get_variable(avar)
-                            # strings were being displayed as numbers, ToDo: make this such that it displays hex in place of binary
-                            #try:
-                            #    string += "%s%s%s:%s%s\n" % (delim, delim, zvar.name, delim, hexlify(zvar.data))
-                            #except TypeError:
-                            #    string += "%s%s%s:%s%s\n" % (delim, delim, zvar.name, delim, zvar.data)
-                            string += "%s%s%s:%s%s\n" % (delim, delim, zvar.name, delim, zvar)
+            for somevars in block_list:
 
-        return string
+                if isinstance(somevars, BlockRecord):
+                    for var_name, var_type, value in zip(somevars._fields, somevars._types, somevars):
+                        lines.append(var_format % (var_name, data_as_string(value, var_type)))
+                else:
+                    for avar in somevars.var_list:
+                        zvar = somevars.vars[avar]
+                        lines.append(var_format % (zvar.name, zvar))
+
+        return ''.join(lines)
 
     def __repr__(self):
         """ a string representation of a packet """
 
         return self.data()
 
+class LazyMessage(Message):
+    """ a Message received over udp, which holds on to the zero expanded
+    datagram and its template, and only decodes a block the first time it
+    is accessed via message['Block'], get_block() or get_var()
+
+    Accessing .blocks decodes everything that hasn't been decoded yet.
+    """
+
+    __slots__ = ('_blocks', '_data', '_decode_pos', '_data_end',
+                 '_block_offsets', '_decoded', '_uuids')
+
+    def __init__(self, name, template, data, decode_pos, data_end, uuids = None):
+
+        self._blocks = {}
+
+        super(LazyMessage, self).__init__(name)
+
+        self.template = template
+        self._data = data
+        self._decode_pos = decode_pos
+        self._data_end = data_end
+        # the UUIDTable of the deserializer, see TemplateDecoder.decode
+        self._uuids = uuids
+
+        # where each template block starts, found on first access
+        self._block_offsets = None
+        self._decoded = set()
+
+    def get_block(self, block_name):
+
+        if self._data != None and block_name not in self._decoded:
+            self.__decode_block(block_name)
+
+        return self._blocks[block_name]
+
+    def __decode_block(self, block_name):
+
+        decoder = self.template.decoder
+
+        if self._block_offsets == None:
+            self._block_offsets = decoder.block_offsets(self._data, self._decode_pos, self._data_end)
+            if self._block_offsets == None:
+                raise exc.MessageDeserializationError(self.name, "message is too short for the template")
+
+        self._decoded.add(block_name)
+
+        for block, offset in zip(decoder.blocks, self._block_offsets):
+            if block.name == block_name:
+                if decoder.decode_block(block, self._data, offset, self, self._data_end, self._uuids) == None:
+                    raise exc.MessageDeserializationError(self.name, "block %s is too short for the template" % (block_name))
+                break
+
+    def __decode_all(self):
+
+        for block in self.template.decoder.blocks:
+            if block.name not in self._decoded:
+                self.__decode_block(block.name)
+
+        # nothing else left to decode, let go of the datagram
+        self._data = None
+
+    def get_blocks(self):
+
+        if self._data != None:
+            self.__decode_all()
+
+        return self._blocks
+
+    def set_blocks(self, blocks):
+
+        self._blocks = blocks
+        self._data = None
+
+    blocks = property(get_blocks, set_blocks)
+
+    def add_block(self, block):
+        """ decode_block() adds blocks through here, so this must not
+        force the rest of the message to decode """
+
+        if block.name not in self._blocks:
+            self._blocks[block.name] = []
+
+        self._blocks[block.name].append(block)
+
+class PreparedMessage(object):
+    """ a message whose blocks were encoded once by
+    UDPMessageSerializer.prepare(), for messages like AgentUpdate that are
+    sent over and over with nearly the same contents
 
+    Fixed size variables are changed in place in the encoded body with
+    set_var(). Only the header (flags, sequence number and appended acks) is
+    built each time it is sent, the zero coded body is kept until set_var()
+    changes it. It has the attributes of a Message that circuits and the
+    UDPDispatcher use when sending.
+    """
+
+    def __init__(self, message, body, offsets):
+
+        self.name = message.name
+
+        # the encoded message number and blocks
+        self.body = bytearray(body)
+
+        # (block name, block number, variable name) -> (position, Struct, converter)
+        self.offsets = offsets
+
+        # what UDPMessageSerializer.encode_body built from body, until
+        # set_var() changes it
+        self.encoded_body = None
+
+        self.send_flags         = message.send_flags
+        self.packet_id          = 0 # aka, sequence number
+        self.acks               = []
+        self.num_acks           = 0
 
+        self.trusted            = message.trusted
+        self.reliable           = False
+        self.resent             = False
 
+        self.retries            = 1 #by default
+        self.host               = None
+        self.expiration_time    = 0
+
+    def set_var(self, block_name, var_name, value, block_number = 0):
+        """ change the value of a fixed size variable """
+
+        try:
+            position, var_struct, convert = self.offsets[(block_name, block_number, var_name)]
+        except KeyError:
+            raise exc.MessageSerializationError("%s.%s" % (block_name, var_name), "not a fixed size variable of %s" % (self.name))
+
+        if convert == None:
+            var_struct.pack_into(self.body, position, value)
+        else:
+            var_struct.pack_into(self.body, position, *convert(value))
+
+        self.encoded_body = None
+
+    def clone(self):
+        """ a copy of the message with its own body, e.g. to keep it as it
+        was sent while this one goes on being changed with set_var() """
+
+        clone = PreparedMessage.__new__(PreparedMessage)
+        clone.__dict__.update(self.__dict__)
+
+        clone.body = bytearray(self.body)
+        clone.acks = list(self.acks)
+
+        return clone
+
+    def add_ack(self, packet_id):
+
+        self.acks.append(packet_id)
+        self.num_acks += 1
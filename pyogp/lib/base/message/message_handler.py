@@ -42,12 +42,36 @@ class MessageHandler(object):
 
         self.handlers = {}
 
-    def register(self, message_name):
+        # message name -> frozenset of the fields subscribers read, or None for all of them
+        self.projections = {}
 
-        if self.settings.LOG_VERBOSE: logger.debug('Creating a monitor for %s' % (message_name))
+    def register(self, message_name, fields = None):
+        """ returns the notifier to subscribe to for message_name
+
+        fields optionally lists what the subscriber reads from the message,
+        as 'Block' or 'Block.Variable' names, e.g. ['ObjectData.FullID',
+        'ObjectData.PCode']. The deserializer then only decodes the union of
+        the fields of all the registrations for the message. A registration
+        without fields means the whole message is decoded.
+        """
+
+        if self.settings.LOG_VERBOSE: logger.debug('Creating a monitor for %s', message_name)
+
+        if fields == None:
+            self.projections[message_name] = None
+        elif message_name not in self.projections:
+            self.projections[message_name] = frozenset(fields)
+        elif self.projections[message_name] != None:
+            self.projections[message_name] = self.projections[message_name].union(fields)
 
         return self.handlers.setdefault(message_name, MessageHandledNotifier(message_name, self.settings))
 
+    def get_projection(self, message_name):
+        """ the fields of message_name that subscribers read, as a frozenset
+        of 'Block' and 'Block.Variable' names, or None if all of them """
+
+        return self.projections.get(message_name)
+
     def is_message_handled(self, message_name):
         """ if the message is being monitored, return True, otherwise, return False 
 
@@ -73,7 +97,7 @@ class MessageHandler(object):
             # Handle the message if we have subscribers
             # Conveniently, this will also enable verbose message logging
             if len(handler) > 0:
-                if self.settings.LOG_VERBOSE and not (self.settings.UDP_SPAMMERS and self.settings.DISABLE_SPAMMERS): logger.debug('Handling message : %s' % (message.name))
+                if self.settings.LOG_VERBOSE and not (self.settings.UDP_SPAMMERS and self.settings.DISABLE_SPAMMERS): logger.debug('Handling message : %s', message.name)
 
                 handler(message)
 
@@ -99,7 +123,7 @@ class MessageHandledNotifier(object):
     def unsubscribe(self, *args, **kwdargs):
         self.event.unsubscribe(*args, **kwdargs)
 
-        if self.settings.LOG_VERBOSE: logger.debug("Removed the monitor for %s by %s" % (args, kwdargs))
+        if self.settings.LOG_VERBOSE: logger.debug("Removed the monitor for %s by %s", args, kwdargs)
 
     def __len__(self):
 
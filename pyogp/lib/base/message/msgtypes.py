@@ -27,6 +27,8 @@ class PacketLayout(object):
     PHL_NAME = 6
     #1 byte flags, 4 bytes sequence, 1 byte offset + 1 byte message name (high)
     MINIMUM_VALID_PACKET_SIZE = PACKET_ID_LENGTH + 1
+    #the number of acks appended to a packet is stored in its last byte
+    MAX_APPENDED_ACKS = 255
 
 class EndianType(object):
     LITTLE  = '<'
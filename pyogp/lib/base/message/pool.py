@@ -0,0 +1,75 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+# pyogp messaging
+from message import Message
+
+class MessagePool(object):
+    """ a free list of Message instances, for the deserializer to reuse
+    rather than allocate a new one per packet received
+
+    A message only goes back to the pool when whoever consumes it, having
+    finished with it and not kept it, calls message.release(). It must not
+    be used after that. Messages that are never released are just left to
+    the garbage collector, so handlers that keep messages are safe. Only
+    the Message and its dict of blocks are reused, the blocks themselves
+    (records) are not, so blocks kept after a release stay valid.
+
+    hits and misses count the acquired messages that were reused and
+    newly allocated. Free list appends and pops are atomic, so a pool can
+    be shared by threads, although the counters are then approximate.
+    """
+
+    def __init__(self, size = 256):
+
+        # the most released messages kept for reuse
+        self.size = size
+
+        self.free = []
+
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, name):
+        """ an empty Message called name, reused if one was released """
+
+        try:
+            message = self.free.pop()
+        except IndexError:
+            self.misses += 1
+            message = Message(name)
+        else:
+            self.hits += 1
+            message.renew(name)
+
+        message._pool = self
+
+        return message
+
+    def release(self, message):
+        """ return message to the pool, see Message.release """
+
+        # released messages aren't released a second time
+        message._pool = None
+
+        if len(self.free) < self.size:
+            self.free.append(message)
+
+    def __repr__(self):
+
+        return 'MessagePool(free=%s, hits=%s, misses=%s)' % (len(self.free), self.hits, self.misses)
@@ -0,0 +1,278 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+# standard python libs
+from operator import itemgetter
+
+# pyogp messaging
+from template import MsgVariableData
+from msgtypes import MsgType
+
+# (block name, variable names, variable types) -> record class, blocks
+# that look the same share a class, as do the templates of every
+# TemplateDictionary
+_class_cache = {}
+
+class RecordVariable(MsgVariableData):
+    """ a read only view of one value of a BlockRecord, for code that uses
+    block.vars[name].data or block.get_variable(name)
+
+    Records are immutable, so setting data raises an AttributeError, see
+    BlockRecord._replace.
+    """
+
+    __slots__ = ('_value', )
+
+    def __init__(self, name, value, var_type = None):
+
+        self.name = name
+        self.size = -1
+        self.var_type = var_type
+        self._value = value
+
+    def get_data(self):
+
+        return self._value
+
+    data = property(get_data)
+
+class BufferedData(object):
+    """ the bytes of a MVT_VARIABLE or MVT_FIXED value of a decoded record,
+    which keeps a reference to the datagram, and only copies its bytes out
+    when the value is read. Records read through it, so it is only seen by
+    code that reads a record with tuple's own methods. """
+
+    __slots__ = ('_buffer', '_start', '_end', '_strip', '_data')
+
+    def __init__(self, buff, start, end, strip = False):
+
+        self._buffer = buff
+        self._start = start
+        self._end = end
+        self._strip = strip
+        self._data = None
+
+    def get(self):
+
+        if self._buffer != None:
+            data = self._buffer[self._start:self._end]
+            if self._strip:
+                data = data.rstrip('\x00')
+            self._data = data
+            self._buffer = None
+
+        return self._data
+
+    def __eq__(self, other):
+
+        if isinstance(other, BufferedData):
+            other = other.get()
+
+        return self.get() == other
+
+    def __ne__(self, other):
+
+        return not self.__eq__(other)
+
+    def __hash__(self):
+
+        return hash(self.get())
+
+    def __len__(self):
+
+        return len(self.get())
+
+    def __str__(self):
+
+        return self.get()
+
+    def __repr__(self):
+
+        return repr(self.get())
+
+def _resolve(value):
+
+    if value.__class__ is BufferedData:
+        return value.get()
+
+    return value
+
+def _buffered_getter(index):
+    """ reads the index'th value of a record, which may be BufferedData """
+
+    def get_value(record):
+        return _resolve(tuple.__getitem__(record, index))
+
+    return get_value
+
+class BlockRecord(tuple):
+    """ the base of the record classes made for each template block by
+    make_record_class
+
+    A record is a tuple of the values of one repeat of a block, in template
+    order, which are read as attributes (block.FullID) or by name
+    (block['FullID']). It also has the read side of MsgBlockData, vars,
+    var_list, get_variable() and get_variables(), with the variables built
+    when they are asked for.
+    """
+
+    __slots__ = ()
+
+    # set on each record class
+    name = None
+    _fields = ()
+    _types = ()
+    _index = {}
+
+    # whether any of the values are MVT_VARIABLE or MVT_FIXED, which the
+    # decoder leaves in the datagram as BufferedData
+    _buffered = False
+
+    def __getitem__(self, key):
+
+        if isinstance(key, basestring):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key)
+
+        elif isinstance(key, slice):
+            return tuple(self)[key]
+
+        return _resolve(tuple.__getitem__(self, key))
+
+    def __iter__(self):
+
+        if not self._buffered:
+            return tuple.__iter__(self)
+
+        return (_resolve(value) for value in tuple.__iter__(self))
+
+    def get_var_list(self):
+
+        return list(self._fields)
+
+    var_list = property(get_var_list)
+
+    def get_variable(self, var_name):
+
+        return RecordVariable(var_name, self[var_name], self._types[self._index[var_name]])
+
+    def get_vars(self):
+
+        return dict([(var_name, self.get_variable(var_name)) for var_name in self._fields])
+
+    vars = property(get_vars)
+
+    def get_variables(self):
+
+        return self.vars.values()
+
+    def __call__(self):
+
+        return self.vars
+
+    def _asdict(self):
+
+        return dict(zip(self._fields, self))
+
+    def _replace(self, **kwargs):
+        """ a copy of the record with the values in kwargs changed """
+
+        values = list(self)
+        for var_name in kwargs:
+            values[self._index[var_name]] = kwargs[var_name]
+
+        return self.__class__(values)
+
+    def __repr__(self):
+
+        return '%s(%s)' % (self.name, ', '.join(['%s=%r' % (var_name, value)
+                                                  for var_name, value in zip(self._fields, self)]))
+
+    def __getnewargs__(self):
+
+        return (tuple(self), )
+
+def make_record_class(template_block, var_names = None):
+    """ returns a BlockRecord class for template_block, whose values are
+    the variables in var_names (all of them if None), in template order """
+
+    fields = []
+    types = []
+
+    for variable in template_block.get_variables():
+        if var_names == None or variable.name in var_names:
+            fields.append(variable.name)
+            types.append(variable.type)
+
+    key = (template_block.name, tuple(fields), tuple(types))
+
+    if key not in _class_cache:
+
+        attributes = {
+            '__slots__': (),
+            'name': template_block.name,
+            '_fields': tuple(fields),
+            '_types': tuple(types),
+            '_index': dict([(var_name, i) for i, var_name in enumerate(fields)]),
+            '_buffered': False,
+            }
+
+        for i, (var_name, var_type) in enumerate(zip(fields, types)):
+            if var_type in (MsgType.MVT_VARIABLE, MsgType.MVT_FIXED):
+                attributes[var_name] = property(_buffered_getter(i))
+                attributes['_buffered'] = True
+            else:
+                attributes[var_name] = property(itemgetter(i))
+
+        _class_cache[key] = type(template_block.name + 'Record', (BlockRecord, ), attributes)
+
+    return _class_cache[key]
+
+def register_template(template):
+    """ make the record classes of template's blocks, see
+    MessageTemplateBlock.record_class """
+
+    for block in template.get_blocks():
+        block.record_class = make_record_class(block)
+
+def get_record_class(template, block_name):
+    """ the record class of a block of template, or None """
+
+    try:
+        return template.get_block(block_name).record_class
+    except KeyError:
+        return None
+
+def as_record(template, block):
+    """ block as a record of template's block of that name, if it has a
+    value for each of its variables, and as is otherwise """
+
+    if isinstance(block, BlockRecord):
+        return block
+
+    record_class = get_record_class(template, block.name)
+
+    if record_class == None or len(block.vars) != len(record_class._fields):
+        return block
+
+    try:
+        return record_class([block.vars[var_name].data for var_name in record_class._fields])
+    except KeyError:
+        return block
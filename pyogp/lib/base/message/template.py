@@ -24,10 +24,24 @@ import binascii
 
 from msgtypes import MsgType, MsgBlockType
 
+def data_as_string(data, var_type):
+    """ the display string of a variable's data """
+
+    if var_type == MsgType.MVT_VARIABLE:
+        return data
+    elif var_type == MsgType.MVT_FIXED:
+        return str(struct.unpack('h'*(len(data)/2), data))
+    else: 
+        return str(data)
+
 class MsgData(object):
     """ Used as a Message that is being created that will be
         serialized and sent. """
 
+    # tens of thousands of these can be queued up at once, so the message
+    # data classes have no per-instance __dict__
+    __slots__ = ('name', 'size', 'blocks')
+
     def __init__(self, name):
         self.name = name
         self.size = 0
@@ -52,6 +66,8 @@ class MsgBlockData(object):
     """ Used as a Message block that is being created that will be
         serialized and sent. """
 
+    __slots__ = ('name', 'size', 'vars', 'var_list', 'block_number')
+
     def __init__(self, name):
         self.name = name
         self.size = 0
@@ -65,6 +81,18 @@ class MsgBlockData(object):
     def __getitem__(self, name):
         return self.get_variable(name).data
 
+    def __getattr__(self, name):
+        """ variables as attributes, like the fields of a BlockRecord, so
+        blocks built by hand read like received ones """
+
+        if name[:1].isupper():
+            try:
+                return self.vars[name].data
+            except KeyError:
+                pass
+
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
     def get_variables(self):
         return self.vars.values()
 
@@ -79,6 +107,9 @@ class MsgBlockData(object):
 class MsgVariableData(object):
     """ Used as a Message Block variable that is being created that will be
         serialized and sent """
+
+    __slots__ = ('name', 'size', 'data', 'var_type')
+
     def __init__(self, name, data, var_type=None):   #LDE 23oct2008 added var_type for display issues
         self.name = name
         #data_size holds info whether or not the variable is of type
@@ -90,12 +121,7 @@ class MsgVariableData(object):
         return MsgType.MVT_as_string(self.var_type) #LDE 23oct2008 adding var_type_as_string to allow for easier display
 
     def get_data_as_string(self):
-        if self.var_type == MsgType.MVT_VARIABLE:
-            return self.data
-        elif self.var_type == MsgType.MVT_FIXED:
-            return str(struct.unpack('h'*(len(self.data)/2), self.data))
-        else: 
-            return str(self.data)
+        return data_as_string(self.data, self.var_type)
 
     def __str__(self):
         # *TODO: Add a heuristic to detect that this is binary data
@@ -137,6 +163,10 @@ class MessageTemplateBlock(object):
         self.block_type = 0
         self.number = 0
 
+        # the BlockRecord class that holds decoded repeats of the block,
+        # see records.register_template
+        self.record_class = None
+
     def add_variable(self, var):
         self.variable_map[var.name] = var
         self.variables.append(var)
@@ -179,6 +209,14 @@ class MessageTemplate(object):
         self.msg_deprecation = None
         self.msg_encoding = None
 
+        # the compiled decode and encode plans, see
+        # TemplateDictionary.compile_templates
+        self.decoder = None
+        self.encoder = None
+
+        # built on first use, see columnar.get_columnar_decoder
+        self.columnar_decoder = None
+
     def add_block(self, block):
         self.block_map[block.name] = block
         self.blocks.append(block)
@@ -0,0 +1,207 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+# standard python libs
+import os
+import sys
+import stat
+import marshal
+from hashlib import sha1
+from logging import getLogger
+
+# pyogp messaging
+from template import MessageTemplate, MessageTemplateBlock, MessageTemplateVariable
+from template_parser import MessageTemplateParser
+
+logger = getLogger('message.template_cache')
+
+# The templates parsed from a message_template.msg are kept as nested
+# tuples, marshalled to a file in CACHE_DIR named for a hash of the template
+# file, so that the next process to load the same template file skips the
+# parser. Bump CACHE_VERSION when the parser or the cached form changes, as
+# it is part of the hash.
+CACHE_VERSION = 1
+
+def _default_cache_dir():
+
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+    return os.path.join(cache_home, 'pyogp', 'templates')
+
+# where the cache files are written, None turns the file cache off. It may
+# also be set with the PYOGP_TEMPLATE_CACHE environment variable, where an
+# empty value turns it off. The directory and its files are only used if
+# they belong to this user and no one else can write to them.
+CACHE_DIR = os.environ.get('PYOGP_TEMPLATE_CACHE', _default_cache_dir()) or None
+
+# key -> the cached form of the templates already loaded by this process
+_loaded = {}
+
+def template_key(contents):
+    """ the cache key of the contents of a template file """
+
+    key = sha1(contents)
+    key.update('%s %s %s' % (CACHE_VERSION, marshal.version, sys.version_info[:2]))
+
+    return key.hexdigest()
+
+def dump_templates(templates):
+    """ the cached form of a list of MessageTemplates """
+
+    return tuple([(template.name, template.frequency, template.msg_num, template.msg_num_hex,
+                   template.msg_trust, template.msg_encoding, template.msg_deprecation,
+                   tuple([(block.name, block.block_type, block.number,
+                           tuple([(variable.name, variable.type, variable.size)
+                                  for variable in block.get_variables()]))
+                          for block in template.get_blocks()]))
+                  for template in templates])
+
+def build_templates(data):
+    """ new MessageTemplates from their cached form """
+
+    templates = []
+
+    for name, frequency, msg_num, msg_num_hex, msg_trust, msg_encoding, msg_deprecation, blocks in data:
+
+        new_template = MessageTemplate(intern(name))
+        new_template.frequency = frequency
+        new_template.msg_num = msg_num
+        new_template.msg_num_hex = msg_num_hex
+        new_template.msg_trust = msg_trust
+        new_template.msg_encoding = msg_encoding
+        new_template.msg_deprecation = msg_deprecation
+
+        for block_name, block_type, number, variables in blocks:
+
+            new_block = MessageTemplateBlock(intern(block_name))
+            new_block.block_type = block_type
+            new_block.number = number
+
+            for var_name, var_type, size in variables:
+                new_block.add_variable(MessageTemplateVariable(intern(var_name), var_type, size))
+
+            new_template.add_block(new_block)
+
+        templates.append(new_template)
+
+    return templates
+
+def _is_private(path):
+    """ whether path belongs to this user, and only they can write to it """
+
+    try:
+        status = os.stat(path)
+    except OSError:
+        return False
+
+    if hasattr(os, 'getuid') and status.st_uid != os.getuid():
+        return False
+
+    return not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def _read_cache(path):
+
+    if not _is_private(os.path.dirname(path)):
+        return None
+
+    if not _is_private(path):
+        if os.path.exists(path):
+            logger.warning("Ignoring the template cache %s, which isn't private to this user" % (path))
+        return None
+
+    try:
+        cache_file = open(path, 'rb')
+    except IOError:
+        return None
+
+    try:
+        try:
+            return marshal.load(cache_file)
+        except (EOFError, ValueError, TypeError), error:
+            logger.warning("Ignoring the unreadable template cache %s: %s" % (path, error))
+            return None
+    finally:
+        cache_file.close()
+
+def _write_cache(path, data):
+
+    # written under a temporary name, and renamed into place, so another
+    # process never reads half a file
+    temp_path = '%s.%s.tmp' % (path, os.getpid())
+
+    cache_dir = os.path.dirname(path)
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+
+        if not _is_private(cache_dir):
+            logger.warning("Not using the template cache %s, which isn't private to this user" % (cache_dir))
+            return
+
+        cache_file = open(temp_path, 'wb')
+        try:
+            marshal.dump(data, cache_file)
+        finally:
+            cache_file.close()
+
+        os.rename(temp_path, path)
+
+    except (IOError, OSError), error:
+        logger.warning("Couldn't write the template cache %s: %s" % (path, error))
+
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def load_templates(template_file, cache_dir = None):
+    """ the MessageTemplates of template_file, an open message_template.msg,
+    parsed by MessageTemplateParser the first time it is seen, and rebuilt
+    from the cache after that. cache_dir defaults to CACHE_DIR. """
+
+    if cache_dir == None:
+        cache_dir = CACHE_DIR
+
+    template_file.seek(0)
+    key = template_key(template_file.read())
+
+    data = _loaded.get(key)
+
+    if data == None and cache_dir != None:
+        data = _read_cache(os.path.join(cache_dir, key))
+
+    if data != None:
+        try:
+            templates = build_templates(data)
+        except (TypeError, ValueError), error:
+            # loaded, but not in the shape dump_templates writes
+            logger.warning("Ignoring the malformed template cache %s: %s" % (key, error))
+        else:
+            _loaded[key] = data
+            return templates
+
+    templates = MessageTemplateParser(template_file).message_templates
+    data = dump_templates(templates)
+
+    if cache_dir != None:
+        _write_cache(os.path.join(cache_dir, key), data)
+
+    _loaded[key] = data
+
+    return templates
@@ -0,0 +1,443 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+# standard python libs
+import struct
+from logging import getLogger
+
+# pyogp
+from pyogp.lib.base.datatypes import UUID, Vector3, Quaternion
+from pyogp.lib.base import exc
+
+# pyogp messaging
+from msgtypes import MsgType, MsgBlockType
+from records import make_record_class, BufferedData
+
+logger = getLogger('message.template_decoder')
+
+# kinds of steps in a block's decode plan
+FIXED_RUN = 0
+VARIABLE_FIELD = 1
+FIXED_FIELD = 2
+
+def _to_port(value):
+    """ IP_PORT is big endian, but is unpacked as part of a little endian run """
+    return ((value & 0xff) << 8) | (value >> 8)
+
+_to_vector3 = Vector3._make
+
+def _to_quaternion(values):
+    """ quaternions are sent as the X, Y, Z of a normalized quaternion """
+    return Quaternion.from_xyz(*values)
+
+# or UUIDTable.get, if decode() is given a table
+_to_uuid = UUID.from_bytes
+
+# maps a fixed size variable type to (struct format, value count, converter)
+# all formats are little endian, as this is how they appear on the wire
+# (IP_PORT being the exception, see _to_port)
+FIXED_FORMATS = {
+    MsgType.MVT_S8:             ('b', 1, None),
+    MsgType.MVT_U8:             ('B', 1, None),
+    MsgType.MVT_BOOL:           ('B', 1, None),
+    MsgType.MVT_LLUUID:         ('16s', 1, _to_uuid),
+    MsgType.MVT_IP_ADDR:        ('4s', 1, None),
+    MsgType.MVT_IP_PORT:        ('H', 1, _to_port),
+    MsgType.MVT_U16:            ('H', 1, None),
+    MsgType.MVT_U32:            ('I', 1, None),
+    MsgType.MVT_U64:            ('Q', 1, None),
+    MsgType.MVT_S16:            ('h', 1, None),
+    MsgType.MVT_S32:            ('i', 1, None),
+    MsgType.MVT_S64:            ('q', 1, None),
+    MsgType.MVT_F32:            ('f', 1, None),
+    MsgType.MVT_F64:            ('d', 1, None),
+    MsgType.MVT_LLVector3:      ('3f', 3, _to_vector3),
+    MsgType.MVT_LLVector3d:     ('3d', 3, tuple),
+    MsgType.MVT_LLVector4:      ('4f', 4, tuple),
+    MsgType.MVT_LLQuaternion:   ('3f', 3, _to_quaternion),
+    }
+
+# the size prefix of MVT_VARIABLE data, keyed by the size in the template
+VARIABLE_SIZE_FORMATS = {
+    1: struct.Struct('<B'),
+    2: struct.Struct('<H'),
+    4: struct.Struct('<I'),
+    }
+
+VARIABLE_BLOCK_COUNT = struct.Struct('>B')
+
+class BlockDecoder(object):
+    """ the decode plan for a single template block
+
+    Runs of consecutive fixed size variables are merged into a single
+    struct.Struct. Each MVT_VARIABLE variable gets a step of its own, as
+    its size is read from the data, and so does each MVT_FIXED variable,
+    whose bytes are sliced out of the datagram as they are.
+
+    If variables is given, only the variables named in it are decoded. The
+    others become pad bytes in their run, or a VARIABLE_FIELD step with no
+    field, which is stepped over, and are left out of the block's records.
+    """
+
+    def __init__(self, template_block, variables = None, skipped = False):
+
+        self.name = template_block.name
+        self.block_type = template_block.block_type
+        self.number = template_block.number
+
+        # whether the whole block is stepped over, see TemplateDecoder
+        self.skipped = skipped
+
+        # the values of each repeat are decoded in template order, into one
+        # of these
+        if variables == None and template_block.record_class != None:
+            self.record_class = template_block.record_class
+        else:
+            self.record_class = make_record_class(template_block, variables)
+
+        # a list of (FIXED_RUN, Struct, fields),
+        # (VARIABLE_FIELD, Struct, (var_name, var_type, strip) or None) or
+        # (FIXED_FIELD, size, (var_name, var_type)) tuples
+        self.steps = []
+
+        run_format = []
+        run_fields = []
+        index = 0
+
+        for variable in template_block.get_variables():
+
+            wanted = variables == None or variable.name in variables
+
+            if variable.type == MsgType.MVT_VARIABLE:
+
+                if variable.size not in VARIABLE_SIZE_FORMATS:
+                    raise exc.MessageTemplateParsingError("variable %s in %s" % (variable.name, self.name))
+
+                if run_format:
+                    self.__add_run(run_format, run_fields)
+                    run_format = []
+                    run_fields = []
+                    index = 0
+
+                if wanted:
+                    # some variable data needs to treated as binary instead of as string
+                    strip = variable.name != 'Data'
+                    field = (variable.name, variable.type, strip)
+                else:
+                    field = None
+
+                self.steps.append((VARIABLE_FIELD,
+                                   VARIABLE_SIZE_FORMATS[variable.size],
+                                   field))
+                continue
+
+            if not wanted:
+
+                # step over it as part of the run
+                if variable.type == MsgType.MVT_FIXED:
+                    run_format.append('%dx' % (variable.size))
+                else:
+                    run_format.append('%dx' % (struct.calcsize('<' + FIXED_FORMATS[variable.type][0])))
+                continue
+
+            if variable.type == MsgType.MVT_FIXED:
+
+                if run_format:
+                    self.__add_run(run_format, run_fields)
+                    run_format = []
+                    run_fields = []
+                    index = 0
+
+                self.steps.append((FIXED_FIELD,
+                                   variable.size,
+                                   (variable.name, variable.type)))
+                continue
+
+            fmt, count, convert = FIXED_FORMATS[variable.type]
+
+            run_format.append(fmt)
+
+            if count == 1:
+                run_fields.append((variable.name, variable.type, index, None, convert))
+            else:
+                run_fields.append((variable.name, variable.type, index, index + count, convert))
+
+            index += count
+
+        if run_format:
+            self.__add_run(run_format, run_fields)
+
+        # the size of one repeat of the block, if it has no variable data
+        self.fixed_size = 0
+        for kind, step_struct, fields in self.steps:
+            if kind == FIXED_RUN:
+                self.fixed_size += step_struct.size
+            elif kind == FIXED_FIELD:
+                self.fixed_size += step_struct
+            else:
+                self.fixed_size = None
+                break
+
+    def __add_run(self, run_format, run_fields):
+
+        self.steps.append((FIXED_RUN,
+                           struct.Struct('<' + ''.join(run_format)),
+                           tuple(run_fields)))
+
+class TemplateDecoder(object):
+    """ a MessageTemplate compiled into a decode plan
+
+    This is built once per template by the TemplateDictionary, and replaces
+    walking the template and calling DataUnpacker.unpack_data per variable
+    for every packet received.
+
+    A projection limits decoding to some of the blocks and variables, see
+    project().
+    """
+
+    def __init__(self, template, projection = None):
+
+        self.name = template.name
+        self.template = template
+        self.projection = projection
+
+        # projection -> TemplateDecoder
+        self.projections = {}
+
+        if projection == None:
+            self.blocks = [BlockDecoder(block) for block in template.get_blocks()]
+            return
+
+        # block name -> None for the whole block, or the wanted variable names
+        wanted = {}
+        for field in projection:
+            block_name, dot, var_name = field.partition('.')
+            if not dot:
+                wanted[block_name] = None
+            elif wanted.get(block_name, ()) != None:
+                wanted.setdefault(block_name, set()).add(var_name)
+
+        for block_name in wanted:
+            if block_name not in template.block_map:
+                logger.warning("Projection of %s names an unknown block %s", self.name, block_name)
+
+        self.blocks = [BlockDecoder(block, wanted.get(block.name), block.name not in wanted)
+                       for block in template.get_blocks()]
+
+    def project(self, projection):
+        """ returns a decoder that only decodes the fields in projection
+
+        projection is a frozenset of 'Block' and 'Block.Variable' names, as
+        kept by MessageHandler. Blocks that aren't named are stepped over,
+        and so are the variables that aren't named in the blocks that are
+        named only by their variables. None means every field.
+        """
+
+        if projection == None:
+            return self
+
+        if projection not in self.projections:
+            self.projections[projection] = TemplateDecoder(self.template, projection)
+
+        return self.projections[projection]
+
+    def decode(self, data, decode_pos, msg_data, data_len = None, uuids = None):
+        """ decode the blocks in data starting at decode_pos into msg_data
+
+        data_len is where the message body ends, which is before any
+        appended acks. Fields are read in place with unpack_from, and each
+        repeat of a block is added to msg_data as a record, see
+        records.BlockRecord. LLUUIDs are taken from uuids, a
+        datatypes.UUIDTable, if it is given.
+
+        returns the position after the last block, or None if the data is
+        too short for the template
+        """
+
+        if data_len == None:
+            data_len = len(data)
+
+        for block in self.blocks:
+
+            if block.skipped:
+                decode_pos = self.skip_block(block, data, decode_pos, data_len)
+            else:
+                decode_pos = self.decode_block(block, data, decode_pos, msg_data, data_len, uuids)
+
+            if decode_pos == None:
+                return None
+
+        return decode_pos
+
+    def block_offsets(self, data, decode_pos, data_len = None):
+        """ find where each block starts, without decoding any of them
+
+        returns a list of positions, one per block in the template, or None
+        if the data is too short for the template
+        """
+
+        if data_len == None:
+            data_len = len(data)
+
+        offsets = []
+
+        for block in self.blocks:
+
+            offsets.append(decode_pos)
+            decode_pos = self.skip_block(block, data, decode_pos, data_len)
+            if decode_pos == None:
+                return None
+
+        return offsets
+
+    def __repeat_count(self, block, data, decode_pos, data_len):
+        """ returns the number of times block repeats, and where the first
+        one starts """
+
+        if block.block_type == MsgBlockType.MBT_SINGLE:
+            return 1, decode_pos
+        elif block.block_type == MsgBlockType.MBT_MULTIPLE:
+            return block.number, decode_pos
+        elif block.block_type == MsgBlockType.MBT_VARIABLE:
+            #if the block type is VARIABLE, then the current position
+            #will be the repeat count written in
+            if decode_pos >= data_len:
+                raise exc.DataUnpackingError(data, "no block count for %s in %s" % (block.name, self.name))
+            return VARIABLE_BLOCK_COUNT.unpack_from(data, decode_pos)[0], decode_pos + 1
+
+        logger.warning("ERROR: Unknown block type: %s in %s packet.", block.block_type, self.name)
+        return None, decode_pos
+
+    def skip_block(self, block, data, decode_pos, data_len):
+        """ returns the position after all repeats of block, using only the
+        sizes in the template and the size prefixes of variable data """
+
+        repeat_count, decode_pos = self.__repeat_count(block, data, decode_pos, data_len)
+        if repeat_count == None:
+            return None
+
+        if block.fixed_size != None:
+            decode_pos += repeat_count * block.fixed_size
+
+        else:
+
+            for i in range(repeat_count):
+
+                for kind, step_struct, fields in block.steps:
+
+                    if kind == FIXED_RUN:
+                        decode_pos += step_struct.size
+                    elif kind == FIXED_FIELD:
+                        decode_pos += step_struct
+                    else:
+                        if decode_pos + step_struct.size > data_len:
+                            logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", decode_pos + step_struct.size, data_len, self.name)
+                            return None
+                        decode_pos += step_struct.size + step_struct.unpack_from(data, decode_pos)[0]
+
+        if decode_pos > data_len:
+            logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", decode_pos, data_len, self.name)
+            return None
+
+        return decode_pos
+
+    def decode_block(self, block, data, decode_pos, msg_data, data_len, uuids = None):
+        """ decode all repeats of block into msg_data, see decode()
+
+        returns the position after the block, or None if the data is too
+        short for the template
+        """
+
+        repeat_count, decode_pos = self.__repeat_count(block, data, decode_pos, data_len)
+        if repeat_count == None:
+            return None
+
+        record_class = block.record_class
+
+        if uuids != None:
+            to_uuid = uuids.get
+        else:
+            to_uuid = _to_uuid
+
+        for i in range(repeat_count):
+
+            record_values = []
+
+            for kind, step_struct, fields in block.steps:
+
+                if kind == FIXED_RUN:
+
+                    end_pos = decode_pos + step_struct.size
+                    if end_pos > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                        return None
+
+                    values = step_struct.unpack_from(data, decode_pos)
+
+                    for var_name, var_type, index, end_index, convert in fields:
+
+                        if end_index == None:
+                            value = values[index]
+                        else:
+                            value = values[index:end_index]
+
+                        if convert is _to_uuid:
+                            value = to_uuid(value)
+                        elif convert != None:
+                            value = convert(value)
+
+                        record_values.append(value)
+
+                    decode_pos = end_pos
+
+                elif kind == FIXED_FIELD:
+
+                    var_name, var_type = fields
+
+                    end_pos = decode_pos + step_struct
+                    if end_pos > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                        return None
+
+                    # sliced out when it is read
+                    record_values.append(BufferedData(data, decode_pos, end_pos))
+                    decode_pos = end_pos
+
+                else:
+
+                    #this isn't the size of the data, but the max bytes
+                    #the data can be
+                    if decode_pos + step_struct.size > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", decode_pos + step_struct.size, data_len, self.name)
+                        return None
+
+                    var_size = step_struct.unpack_from(data, decode_pos)[0]
+                    decode_pos += step_struct.size
+
+                    end_pos = decode_pos + var_size
+                    if end_pos > data_len:
+                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s", end_pos, data_len, self.name)
+                        return None
+
+                    if fields != None:
+                        record_values.append(BufferedData(data, decode_pos, end_pos, fields[2]))
+
+                    decode_pos = end_pos
+
+            msg_data.add_block(record_class(record_values))
+
+        return decode_pos
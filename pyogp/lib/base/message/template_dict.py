@@ -16,14 +16,22 @@ or in
 $/LicenseInfo$
 """
 
+#standard libs
+import struct
+
 from msgtypes import MsgFrequency
 from data import msg_tmpl, msg_details
-from template_parser import MessageTemplateParser
+from template_cache import load_templates
 from data_packer import DataPacker
+from template_decoder import TemplateDecoder
+from template_encoder import TemplateEncoder
+from records import register_template
 from msgtypes import MsgType, EndianType
 
 from pyogp.lib.base import exc
 
+LOW_NUM = struct.Struct('>H')
+
 class TemplateDictionary(object):
     """the dictionary with all known templates"""
 
@@ -32,12 +40,10 @@ class TemplateDictionary(object):
         if template_list == None:
 
             if message_template == None:
-                parser = MessageTemplateParser(msg_tmpl)
-            else:
-                parser = MessageTemplateParser(message_template)
+                message_template = msg_tmpl
 
-            template_list = parser.message_templates
-            template_dict = TemplateDictionary(template_list)
+            # parsed once per template file, see template_cache
+            template_list = load_templates(message_template)
             # adding below so we can check how many packets we can parse easily len(self.template_list)
             self.template_list = template_list
 
@@ -47,8 +53,17 @@ class TemplateDictionary(object):
         # maps (freq,num) to template
         self.message_dict = {}
 
+        # message number -> template, indexed directly by the header bytes,
+        # see get_template_by_header
+        self.high_templates = [None] * 256
+        self.medium_templates = [None] * 256
+        self.low_templates = [None] * 65536
+        self.fixed_templates = {}
+
         self.build_dictionaries(template_list)
         self.build_message_ids()
+        self.build_lookup_tables()
+        self.compile_templates()
 
     def get_template_list(self):
         names = []
@@ -98,12 +113,69 @@ class TemplateDictionary(object):
                                                          MsgType.MVT_U8, \
                                                          EndianType.BIG)
 
+    def build_lookup_tables(self):
+
+        for template in self.message_templates.values():
+            frequency = template.frequency
+            if frequency == MsgFrequency.FIXED_FREQUENCY_MESSAGE:
+                self.fixed_templates[template.msg_num] = template
+            elif frequency == MsgFrequency.LOW_FREQUENCY_MESSAGE:
+                self.low_templates[template.msg_num] = template
+            elif frequency == MsgFrequency.MEDIUM_FREQUENCY_MESSAGE:
+                self.medium_templates[template.msg_num] = template
+            elif frequency == MsgFrequency.HIGH_FREQUENCY_MESSAGE:
+                self.high_templates[template.msg_num] = template
+
+    def compile_templates(self):
+        """ build the record classes, and the decode and encode plans for
+        each template once, rather than walking the template for every
+        packet we receive or send """
+
+        for template in self.message_templates.values():
+            register_template(template)
+            template.decoder = TemplateDecoder(template)
+            template.encoder = TemplateEncoder(template)
+
     def get_template(self, template_name):
         if template_name in self.message_templates:
             return self.message_templates[template_name]
 
         return None
 
+    def get_template_by_header(self, data, pos = 0, end = None):
+        """ the template of the message number at data[pos], or None if it
+        isn't known or is cut short by end
+
+        High messages are one byte, Medium ones are 0xFF and a byte, Low ones
+        are 0xFFFF and a big endian short, and Fixed ones are 0xFFFFFF and a
+        byte, so this takes at most four indexed reads.
+        """
+
+        if end == None:
+            end = len(data)
+
+        if pos >= end:
+            return None
+
+        num = ord(data[pos])
+        if num != 0xFF:
+            return self.high_templates[num]
+
+        if pos + 1 >= end:
+            return None
+
+        num = ord(data[pos + 1])
+        if num != 0xFF:
+            return self.medium_templates[num]
+
+        if pos + 3 >= end:
+            return None
+
+        if data[pos + 2] == '\xff':
+            return self.fixed_templates.get(ord(data[pos + 3]))
+
+        return self.low_templates[LOW_NUM.unpack_from(data, pos + 2)[0]]
+
     def get_template_by_pair(self, frequency, num):
         if (frequency, num) in self.message_dict:
             return self.message_dict[(frequency, num)]
@@ -0,0 +1,362 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+# standard python libs
+import struct
+
+# pyogp
+from pyogp.lib.base.datatypes import UUID, Vector3, Quaternion
+from pyogp.lib.base.helpers import Helpers
+from pyogp.lib.base import exc
+
+# pyogp messaging
+from template_decoder import FIXED_RUN, VARIABLE_FIELD, VARIABLE_SIZE_FORMATS
+from msgtypes import MsgType, MsgBlockType
+from records import BlockRecord, BufferedData
+
+VARIABLE_BLOCK_COUNT = struct.Struct('>B')
+
+#the number of repeats of a Variable block is sent in one byte
+MAX_BLOCK_REPEATS = 255
+
+# reads a value of a record by position, without BlockRecord.__getitem__
+_record_value = tuple.__getitem__
+
+def _from_port(value):
+    """ IP_PORT is big endian, but is packed as part of a little endian run """
+    return [((value & 0xff) << 8) | (value >> 8)]
+
+def _from_uuid(value):
+    if isinstance(value, UUID):
+        return [value.get_bytes()]
+    return [value.bytes]
+
+def _from_vector3(value):
+    if isinstance(value, Vector3):
+        return value()
+    return value
+
+def _from_quaternion(value):
+    """ quaternions are sent as the X, Y, Z of a normalized quaternion """
+    if isinstance(value, Quaternion):
+        value = value()
+    return Helpers.pack_quaternion_to_vector3(value)
+
+def _from_string(value):
+    """ variable data is sent UTF-8 encoded and null terminated """
+    if value == None:
+        return '\x00'
+    elif isinstance(value, unicode):
+        return value.encode('utf-8') + '\x00'
+    return value + '\x00'
+
+def _get_data(block_data, var_name):
+
+    try:
+        if isinstance(block_data, BlockRecord):
+            return block_data[var_name]
+        return block_data.vars[var_name].data
+    except KeyError:
+        raise exc.MessageSerializationError(var_name, "variable value is not set")
+
+# maps a fixed size variable type to (struct format, converter)
+# a converter returns the list of values to pack, no converter means the
+# value is packed as is
+# all formats are little endian, as this is how they go on the wire
+# (IP_PORT being the exception, see _from_port)
+FIXED_FORMATS = {
+    MsgType.MVT_S8:             ('b', None),
+    MsgType.MVT_U8:             ('B', None),
+    MsgType.MVT_BOOL:           ('B', None),
+    MsgType.MVT_LLUUID:         ('16s', _from_uuid),
+    MsgType.MVT_IP_ADDR:        ('4s', None),
+    MsgType.MVT_IP_PORT:        ('H', _from_port),
+    MsgType.MVT_U16:            ('H', None),
+    MsgType.MVT_U32:            ('I', None),
+    MsgType.MVT_U64:            ('Q', None),
+    MsgType.MVT_S16:            ('h', None),
+    MsgType.MVT_S32:            ('i', None),
+    MsgType.MVT_S64:            ('q', None),
+    MsgType.MVT_F32:            ('f', None),
+    MsgType.MVT_F64:            ('d', None),
+    MsgType.MVT_LLVector3:      ('3f', _from_vector3),
+    MsgType.MVT_LLVector3d:     ('3d', tuple),
+    MsgType.MVT_LLVector4:      ('4f', tuple),
+    MsgType.MVT_LLQuaternion:   ('3f', _from_quaternion),
+    }
+
+class BlockEncoder(object):
+    """ the encode plan for a single template block
+
+    Runs of consecutive fixed size variables are packed by a single
+    struct.Struct, MVT_FIXED ones included, which struct pads or truncates
+    to their size. Each MVT_VARIABLE variable gets a step of its own, for
+    its size prefix and data.
+    """
+
+    def __init__(self, template_block):
+
+        self.name = template_block.name
+        self.block_type = template_block.block_type
+        self.number = template_block.number
+
+        # a list of (FIXED_RUN, Struct, ((var_name, convert), ...)) or
+        # (VARIABLE_FIELD, Struct, var_name) tuples
+        self.steps = []
+
+        # one entry per step, ((var_name, offset, Struct, convert), ...) for
+        # a FIXED_RUN, where offset is from the start of the run and the
+        # Struct packs just that variable, and None for a VARIABLE_FIELD
+        self.field_layouts = []
+
+        run_format = []
+        run_fields = []
+
+        for variable in template_block.get_variables():
+
+            if variable.type == MsgType.MVT_VARIABLE:
+
+                if variable.size not in VARIABLE_SIZE_FORMATS:
+                    raise exc.MessageTemplateParsingError("variable %s in %s" % (variable.name, self.name))
+
+                if run_format:
+                    self.__add_run(run_format, run_fields)
+                    run_format = []
+                    run_fields = []
+
+                self.steps.append((VARIABLE_FIELD,
+                                   VARIABLE_SIZE_FORMATS[variable.size],
+                                   variable.name))
+                self.field_layouts.append(None)
+                continue
+
+            if variable.type == MsgType.MVT_FIXED:
+                fmt, convert = '%ds' % (variable.size), None
+            else:
+                fmt, convert = FIXED_FORMATS[variable.type]
+
+            run_format.append(fmt)
+            run_fields.append((variable.name, convert))
+
+        if run_format:
+            self.__add_run(run_format, run_fields)
+
+        # the size of one repeat of the block, if it has no variable data
+        self.fixed_size = 0
+        for kind, step_struct, fields in self.steps:
+            if kind == FIXED_RUN:
+                self.fixed_size += step_struct.size
+            else:
+                self.fixed_size = None
+                break
+
+    def repeat_size(self, block_data):
+        """ the encoded size of one repeat of the block """
+
+        if self.fixed_size != None:
+            return self.fixed_size
+
+        size = 0
+        for kind, step_struct, fields in self.steps:
+            size += step_struct.size
+            if kind == VARIABLE_FIELD:
+                size += len(_from_string(_get_data(block_data, fields)))
+
+        return size
+
+    def __add_run(self, run_format, run_fields):
+
+        self.steps.append((FIXED_RUN,
+                           struct.Struct('<' + ''.join(run_format)),
+                           tuple(run_fields)))
+
+        layout = []
+        for index, (var_name, convert) in enumerate(run_fields):
+            offset = struct.calcsize('<' + ''.join(run_format[:index]))
+            layout.append((var_name, offset, struct.Struct('<' + run_format[index]), convert))
+
+        self.field_layouts.append(tuple(layout))
+
+class TemplateEncoder(object):
+    """ a MessageTemplate compiled into an encode plan
+
+    This is built once per template by the TemplateDictionary, and replaces
+    walking the template and calling DataPacker.pack_data per variable for
+    every message sent. The size of the body is worked out first, and the
+    body is then packed into a single preallocated buffer with pack_into.
+    """
+
+    def __init__(self, template):
+
+        self.name = template.name
+        self.msg_num_hex = template.msg_num_hex
+        self.blocks = [BlockEncoder(block) for block in template.get_blocks()]
+
+    def size(self, message):
+        """ the size of what encode returns for message, worked out without
+        packing anything """
+
+        size = len(self.msg_num_hex)
+
+        for block in self.blocks:
+
+            try:
+                block_list = message.blocks[block.name]
+            except KeyError:
+                raise exc.MessageSerializationError(block.name, "block is missing")
+
+            if block.block_type == MsgBlockType.MBT_VARIABLE:
+                size += 1
+
+            for block_data in block_list:
+                size += block.repeat_size(block_data)
+
+        return size
+
+    def encode(self, message, offsets = None):
+        """ returns the message number and blocks of message, packed
+
+        If offsets is a dict, it is filled with where each fixed size
+        variable was packed, keyed by (block name, block number, variable
+        name), as (position, Struct, converter). This is what lets a
+        PreparedMessage patch variables in place.
+        """
+
+        size = len(self.msg_num_hex)
+
+        # (block encoder, block data list, variable data) per template block
+        plan = []
+
+        for block in self.blocks:
+
+            try:
+                block_list = message.blocks[block.name]
+            except KeyError:
+                raise exc.MessageSerializationError(block.name, "block is missing")
+
+            block_count = len(block_list)
+
+            #multiple block type means there is a static number of these blocks
+            #that make up this message, with the number stored in the template
+            if block.block_type == MsgBlockType.MBT_MULTIPLE:
+                if block.number != block_count:
+                    raise exc.MessageSerializationError(block.name, "block data mismatch")
+
+            #variable means the block variables can repeat, so we have to
+            #mark how many blocks there are of this type that repeat
+            elif block.block_type == MsgBlockType.MBT_VARIABLE:
+                if block_count > MAX_BLOCK_REPEATS:
+                    raise exc.MessageTooLarge(block.name, "more than %s repeats" % (MAX_BLOCK_REPEATS))
+                size += 1
+
+            variable_data = []
+
+            if block.fixed_size != None:
+                size += block_count * block.fixed_size
+
+            else:
+                for block_data in block_list:
+                    for kind, step_struct, fields in block.steps:
+                        if kind == FIXED_RUN:
+                            size += step_struct.size
+                        else:
+                            data = _from_string(_get_data(block_data, fields))
+                            variable_data.append(data)
+                            size += step_struct.size + len(data)
+
+            plan.append((block, block_list, variable_data))
+
+        buff = bytearray(size)
+        buff[0:len(self.msg_num_hex)] = self.msg_num_hex
+        pos = len(self.msg_num_hex)
+
+        for block, block_list, variable_data in plan:
+
+            if block.block_type == MsgBlockType.MBT_VARIABLE:
+                VARIABLE_BLOCK_COUNT.pack_into(buff, pos, len(block_list))
+                pos += 1
+
+            variable_data = iter(variable_data)
+
+            for block_number, block_data in enumerate(block_list):
+
+                # records are indexed by variable name, blocks hold
+                # variables by name
+                is_record = isinstance(block_data, BlockRecord)
+                if is_record:
+                    index = block_data._index
+                else:
+                    variables = block_data.vars
+
+                if offsets != None:
+                    self.__add_offsets(offsets, block, block_number, block_data, pos)
+
+                for kind, step_struct, fields in block.steps:
+
+                    if kind == FIXED_RUN:
+
+                        values = []
+                        for var_name, convert in fields:
+                            if is_record:
+                                if var_name not in index:
+                                    raise exc.MessageSerializationError(var_name, "variable value is not set")
+                                value = _record_value(block_data, index[var_name])
+                                if value.__class__ is BufferedData:
+                                    value = value.get()
+                            else:
+                                if var_name not in variables:
+                                    raise exc.MessageSerializationError(var_name, "variable value is not set")
+                                value = variables[var_name].data
+                            if convert == None:
+                                values.append(value)
+                            else:
+                                values.extend(convert(value))
+
+                        step_struct.pack_into(buff, pos, *values)
+                        pos += step_struct.size
+
+                    else:
+
+                        data = variable_data.next()
+                        step_struct.pack_into(buff, pos, len(data))
+                        pos += step_struct.size
+                        buff[pos:pos + len(data)] = data
+                        pos += len(data)
+
+        return str(buff)
+
+    def __add_offsets(self, offsets, block, block_number, block_data, pos):
+        """ record where the fixed size variables of block_data, which is
+        packed at pos, go """
+
+        # the sizes of this repeat's variable data, without consuming them
+        variable_sizes = []
+
+        for kind, step_struct, fields in block.steps:
+            if kind != FIXED_RUN:
+                variable_sizes.append(len(_from_string(_get_data(block_data, fields))))
+
+        variable_sizes = iter(variable_sizes)
+
+        for (kind, step_struct, fields), layout in zip(block.steps, block.field_layouts):
+
+            if kind == FIXED_RUN:
+                for var_name, offset, field_struct, convert in layout:
+                    offsets[(block.name, block_number, var_name)] = (pos + offset, field_struct, convert)
+                pos += step_struct.size
+            else:
+                pos += step_struct.size + variable_sizes.next()
@@ -115,7 +115,7 @@ class MessageTemplateParser(object):
 
     def _start_new_template(self, match):
 
-        new_template = template.MessageTemplate(match.group(1))
+        new_template = template.MessageTemplate(intern(match.group(1)))
 
         frequency = None
         if match.group(2) == 'Low':
@@ -136,7 +136,7 @@ class MessageTemplateParser(object):
             msg_num_hex = binTemp
             msg_num = struct.unpack('>h', '\x00' + binTemp[3])[0]
         elif frequency == MsgFrequency.LOW_FREQUENCY_MESSAGE:
-            msg_num_hex = struct.pack('>BBB', 0xff, 0xff, msg_num)
+            msg_num_hex = struct.pack('>BBH', 0xff, 0xff, msg_num)
         elif frequency == MsgFrequency.MEDIUM_FREQUENCY_MESSAGE:
             msg_num_hex = struct.pack('>BB', 0xff, msg_num)
         elif frequency == MsgFrequency.HIGH_FREQUENCY_MESSAGE:
@@ -181,7 +181,7 @@ class MessageTemplateParser(object):
 
     def _start_new_block(self, match):
 
-        new_block = template.MessageTemplateBlock(match.group(1))
+        new_block = template.MessageTemplateBlock(intern(match.group(1)))
 
         block_type = None
         block_num = 0
@@ -257,7 +257,7 @@ class MessageTemplateParser(object):
         #LDE 23oct2008 add var+type to creation of MTV object for subsequent formmating goodness
 
 
-        return template.MessageTemplateVariable(match.group(1), \
+        return template.MessageTemplateVariable(intern(match.group(1)), \
                                                 var_type, var_size)
 
 
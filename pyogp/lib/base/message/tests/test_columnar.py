@@ -0,0 +1,91 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+#standard libraries
+import unittest
+
+#related
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#local libraries
+from pyogp.lib.base.settings import Settings
+from pyogp.lib.base.message.message import Message, Block
+from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
+from pyogp.lib.base.message.tests.test_packetdata import OBJECT_UPDATE
+
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = Settings()
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = False
+        self.settings.COLUMNAR_MESSAGES = ['PacketAck', 'CoarseLocationUpdate', 'ObjectUpdate']
+        self.deserializer = UDPMessageDeserializer(settings = self.settings)
+
+    def tearDown(self):
+        pass
+
+    def test_fixed_block(self):
+        message = '\x00' + '\x00\x00\x00\x01' + '\x00' + '\xff\xff\xff\xfb' + '\x03' + \
+                  '\x01\x00\x00\x00' + '\x02\x00\x00\x00' + '\x03\x00\x00\x00'
+        packet = self.deserializer.deserialize(message)
+
+        ids = packet.blocks['Packets']
+        self.assertEquals(ids.dtype.names, ('ID',))
+        self.assertEquals(list(ids['ID']), [1, 2, 3])
+        self.assertEquals(ids[1]['ID'], 2)
+
+    def test_single_blocks_unchanged(self):
+        msg = Message('CoarseLocationUpdate',
+                      Block('Location', X=1, Y=2, Z=3),
+                      Block('Location', X=4, Y=5, Z=6),
+                      Block('Index', You=-1, Prey=1))
+        # no repeats of a Variable block
+        msg.blocks['AgentData'] = []
+        packet = self.deserializer.deserialize(UDPMessageSerializer().serialize(msg))
+
+        location = packet.blocks['Location']
+        self.assertEquals(list(location['Y']), [2, 5])
+        self.assertEquals(packet.blocks['Index'][0]['You'], -1)
+        self.assertFalse('AgentData' in packet.blocks)
+
+    def test_variable_block(self):
+        packet = self.deserializer.deserialize(OBJECT_UPDATE)
+
+        self.settings.COLUMNAR_MESSAGES = []
+        expected = self.deserializer.deserialize(OBJECT_UPDATE)
+
+        objects = packet.blocks['ObjectData']
+        self.assertEquals(len(objects), len(expected.blocks['ObjectData']))
+        for record, block in zip(objects, expected.blocks['ObjectData']):
+            self.assertEquals(record['ID'], block['ID'])
+            self.assertEquals(record['FullID'].tobytes(), block['FullID'].uuid.bytes)
+            self.assertEquals(record['NameValue'], block['NameValue'])
+            self.assertEquals(record['ObjectData'], block['ObjectData'])
+            self.assertAlmostEquals(record['Scale'][2], block['Scale'].Z, 5)
+
+if numpy == None:
+    TestColumnar = unittest.skip("columnar decoding needs numpy")(TestColumnar)
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestColumnar))
+    return suite
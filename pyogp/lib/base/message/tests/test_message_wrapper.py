@@ -20,11 +20,17 @@ $/LicenseInfo$
 import unittest, doctest
 from uuid import UUID
 
+#related
+from llbase import llsd
+
 #local libraries
 from pyogp.lib.base.message.data import msg_tmpl
 from pyogp.lib.base.message.msgtypes import MsgType
 from pyogp.lib.base.message.message import Message, Block
 from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
+from pyogp.lib.base import datatypes
+from pyogp.lib.base.settings import Settings
 
 
 class TestMessage(unittest.TestCase):
@@ -48,6 +54,15 @@ class TestMessage(unittest.TestCase):
         assert msg.blocks['CircuitCode'][0].vars['Code'].data == 531, \
                "Incorrect data in block Code"
 
+    def test_build_attributes(self):
+        msg = Message('TestPacket',
+                      Block('CircuitCode', ID=1234,Code=531)
+                      )
+
+        assert msg.CircuitCode[0].ID == 1234, "Incorrect ID read as an attribute"
+        assert msg.CircuitCode[0].Code == 531, "Incorrect Code read as an attribute"
+        self.assertRaises(AttributeError, getattr, msg.CircuitCode[0], 'Missing')
+
     def test_build_multiple(self):
         msg = Message('TestPacket',
                       Block('CircuitCode', ID=1234,Code=789),
@@ -109,6 +124,107 @@ class TestMessage(unittest.TestCase):
         serial = UDPMessageSerializer()
         msg = serial.serialize(msg)
 
+    def test_slots(self):
+        msg = Message('TestPacket',
+                      Block('CircuitCode', ID=1234,Code=789)
+                      )
+        block = msg.blocks['CircuitCode'][0]
+
+        for obj in (msg, block, block.vars['ID']):
+            assert not hasattr(obj, '__dict__'), "%s has a __dict__" % (type(obj).__name__)
+
+        self.assertRaises(AttributeError, setattr, msg, 'not_an_attribute', 1)
+
+        assert '\nName: TestPacket\n' in msg.data(), "Name missing from data()"
+        assert 'ID:    1234' in msg.data(), "Variable missing from data()"
+
+    def test_clone(self):
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID(int=1), SessionID=UUID(int=2)),
+                      Block('ChatData', Message='Hi', Type=1, Channel=0))
+        msg.packet_id = 5
+        msg.add_ack(3)
+
+        clone = msg.clone()
+        assert clone.packet_id == 5 and clone.acks == [3], "Header not copied"
+        assert clone.blocks['ChatData'] is msg.blocks['ChatData'], "Blocks copied before a change"
+
+        clone.set_var('ChatData', 'Channel', 42)
+        clone.add_ack(4)
+        assert clone['ChatData'][0]['Channel'] == 42, "Clone not changed"
+        assert msg['ChatData'][0]['Channel'] == 0, "Original changed with its clone"
+        assert msg.acks == [3], "Acks shared with the clone"
+        assert clone.blocks['AgentData'] is msg.blocks['AgentData'], "Unchanged blocks copied"
+
+        msg.add_block(Block('ChatData', Message='Bye', Type=1, Channel=0))
+        assert len(msg.blocks['ChatData']) == 2, "Block not added"
+        assert len(clone.blocks['ChatData']) == 1, "Block added to the clone"
+
+    def test_set_var_block(self):
+        msg = Message('TestPacket',
+                      Block('CircuitCode', ID=1234,Code=789)
+                      )
+        block = msg.blocks['CircuitCode'][0]
+        clone = msg.clone()
+
+        msg.set_var('CircuitCode', 'Code', 531)
+        assert msg['CircuitCode'][0]['Code'] == 531, "Variable not set"
+        assert clone['CircuitCode'][0]['Code'] == 789, "Clone changed"
+        assert block['Code'] == 789, "Block changed in place"
+
+    def test_interned_names(self):
+        deserializer = UDPMessageDeserializer()
+        template = deserializer.template_dict['PacketAck']
+        assert template.name is intern('PacketAck'), "Message name isn't interned"
+        assert template.get_block('Packets').name is intern('Packets'), "Block name isn't interned"
+
+    def test_to_dict(self):
+        msg = Message('TestPacket',
+                      Block('CircuitCode', ID=1234,Code=789),
+                      Block('CircuitCode', ID=5678,Code=456)
+                      )
+
+        assert msg.to_dict() == {'message': 'TestPacket',
+                                 'body': {'CircuitCode': [{'ID': 1234, 'Code': 789},
+                                                          {'ID': 5678, 'Code': 456}]}}, \
+               "Incorrect dict of a message"
+
+    def test_to_llsd(self):
+        source_id = datatypes.UUID('8c4b7a52-f431-4e2b-9ebd-b8b2b0d98e6e')
+        msg = Message('ChatFromSimulator',
+                      Block('ChatData', FromName='Tester', SourceID=source_id,
+                            OwnerID=datatypes.UUID(), SourceType=1, ChatType=1,
+                            Audible=1, Position=datatypes.Vector3(X=1.0, Y=2.0, Z=3.0),
+                            Message='Hi'))
+
+        # through the wire, so the blocks are records
+        settings = Settings()
+        settings.ENABLE_DEFERRED_PACKET_PARSING = False
+        deserializer = UDPMessageDeserializer(settings = settings)
+        packet = deserializer.deserialize(UDPMessageSerializer().serialize(msg))
+
+        for format in ('xml', 'binary'):
+            result = llsd.parse(packet.to_llsd(format))
+            assert result['message'] == 'ChatFromSimulator', "Incorrect name in %s" % (format)
+            chat_data = result['body']['ChatData'][0]
+            assert chat_data['SourceID'] == source_id.uuid, "Incorrect uuid in %s" % (format)
+            assert chat_data['Position'] == [1.0, 2.0, 3.0], "Incorrect vector in %s" % (format)
+            assert chat_data['FromName'] == 'Tester', "Incorrect string in %s" % (format)
+            assert chat_data['Audible'] == 1, "Incorrect integer in %s" % (format)
+
+    def test_to_llsd_u64(self):
+        msg = Message('TeleportFinish',
+                      Block('Info', AgentID=datatypes.UUID(), LocationID=1, SimIP='\x7f\x00\x00\x01',
+                            SimPort=13000, RegionHandle=2**40 + 5, SeedCapability='http://127.0.0.1/',
+                            SimAccess=13, TeleportFlags=2**31))
+
+        template = UDPMessageDeserializer().template_dict['TeleportFinish']
+        info = llsd.parse(msg.to_llsd('binary', template))['body']['Info'][0]
+        assert info['RegionHandle'] == '\x00\x00\x01\x00\x00\x00\x00\x05', "U64 not binary"
+        assert info['TeleportFlags'] == '\x80\x00\x00\x00', "U32 not binary"
+        assert info['SimIP'] == '\x7f\x00\x00\x01', "IP_ADDR not binary"
+        assert info['SimPort'] == 13000, "Incorrect port"
+
 def test_suite():
     from unittest import TestSuite, makeSuite
     suite = TestSuite()
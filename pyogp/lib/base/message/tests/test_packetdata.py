@@ -92,6 +92,27 @@ class TestPacketDecode(unittest.TestCase):
         self.assert_("RegionData" in blocks)
         self.assert_("ObjectData" in blocks)
 
+    def test_lazy_object_update(self):
+        """test that blocks of a lazily parsed packet are decoded on access"""
+
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        packet = deserializer.deserialize(OBJECT_UPDATE)
+
+        self.settings.ENABLE_LAZY_PACKET_PARSING = True
+        lazy_packet = deserializer.deserialize(OBJECT_UPDATE)
+
+        self.assertEquals(lazy_packet._decoded, set())
+        self.assertEquals(lazy_packet['ObjectData'][0]['FullID'], packet['ObjectData'][0]['FullID'])
+        self.assertEquals(lazy_packet._decoded, set(['ObjectData']))
+        self.assertEquals(lazy_packet.RegionData[0].TimeDilation, packet.RegionData[0].TimeDilation)
+        self.assertEquals(lazy_packet._decoded, set(['ObjectData', 'RegionData']))
+        assert lazy_packet._data != None, "Attribute access decoded the whole message"
+        self.assertEquals(lazy_packet.get_var('RegionData', 'RegionHandle').data,
+                          packet.get_var('RegionData', 'RegionHandle').data)
+
+        self.assertEquals(sorted(lazy_packet.blocks.keys()), sorted(packet.blocks.keys()))
+        self.assertEquals(lazy_packet._data, None)
+
 def test_suite():
     from unittest import TestSuite, makeSuite
     suite = TestSuite()
@@ -0,0 +1,111 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+#standard libraries
+import unittest
+
+#local libraries
+from pyogp.lib.base.settings import Settings
+from pyogp.lib.base.message.message import Message, Block
+from pyogp.lib.base.message.message_handler import MessageHandler
+from pyogp.lib.base.message.pool import MessagePool
+from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.udpdispatcher import UDPDispatcher
+from pyogp.lib.base.message.circuit import Host
+from pyogp.lib.base.tests.mockup_net import MockupUDPServer, MockupUDPClient
+
+PACKET_ACK = '\x40' + '\x00\x00\x00\x05' + '\x00' + \
+             '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00'
+
+class TestMessagePool(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = Settings()
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = False
+        self.settings.ENABLE_MESSAGE_POOLING = True
+
+    def tearDown(self):
+        pass
+
+    def test_acquire_release(self):
+        pool = MessagePool(size = 1)
+
+        message = pool.acquire('PacketAck')
+        message.packet_id = 5
+        message.add_ack(1)
+        message.add_block(Block('Packets', ID = 1))
+        message.release()
+        message.release()
+
+        self.assertEquals(len(pool.free), 1)
+
+        reused = pool.acquire('StartPingCheck')
+        self.assertTrue(reused is message)
+        self.assertEquals((reused.name, reused.packet_id, reused.acks, reused.blocks),
+                          ('StartPingCheck', 0, [], {}))
+        self.assertEquals((pool.hits, pool.misses), (1, 1))
+
+        pool.acquire('PacketAck').release()
+        pool.acquire('PacketAck').release()
+        self.assertEquals(len(pool.free), 1)
+
+    def test_unpooled_release(self):
+        message = Message('PacketAck')
+        message.release()
+        self.assertEquals(message.clone()._pool, None)
+
+    def test_deserializer(self):
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+
+        packet = deserializer.deserialize(PACKET_ACK)
+        self.assertEquals(packet['Packets'][0]['ID'], 1)
+        packet.release()
+
+        reused = deserializer.deserialize(PACKET_ACK)
+        self.assertTrue(reused is packet)
+        self.assertEquals(reused.packet_id, 5)
+        self.assertEquals(len(reused.blocks['Packets']), 1)
+        self.assertEquals((deserializer.message_pool.hits, deserializer.message_pool.misses), (1, 1))
+
+    def test_kept_message_not_reused(self):
+        kept = []
+        message_handler = MessageHandler(self.settings)
+        message_handler.register('PacketAck').subscribe(kept.append)
+
+        dispatcher = UDPDispatcher(MockupUDPClient(), settings = self.settings,
+                                   message_handler = message_handler)
+        host = Host((MockupUDPServer(), 80))
+
+        # the caller holds the message in one variable, and the handler
+        # keeps it, nothing releases it
+        packet = dispatcher.receive_check(host, PACKET_ACK, len(PACKET_ACK))
+        del packet
+
+        other_ack = PACKET_ACK[:1] + '\x00\x00\x00\x09' + PACKET_ACK[5:]
+        packet = dispatcher.receive_check(host, other_ack, len(other_ack))
+
+        self.assertFalse(packet is kept[0])
+        self.assertEquals(kept[0].packet_id, 5)
+        self.assertEquals(packet.packet_id, 9)
+        self.assertEquals(dispatcher.udp_deserializer.message_pool.hits, 0)
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestMessagePool))
+    return suite
@@ -0,0 +1,118 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+#standard libraries
+import unittest
+from uuid import UUID
+from StringIO import StringIO
+
+#local libraries
+from pyogp.lib.base.message.msgtypes import MsgType
+from pyogp.lib.base.message.message import Message, Block
+from pyogp.lib.base.message.template_dict import TemplateDictionary
+from pyogp.lib.base.message.template_parser import MessageTemplateParser
+from pyogp.lib.base.message.records import BlockRecord, make_record_class
+
+CUSTOM_TEMPLATE = """version 2.0
+{
+	ChatFromViewer Low 80 NotTrusted Zerocoded
+	{
+		ChatData		Single
+		{	Channel		S32	}
+		{	Message		Variable	2	}
+	}
+}
+"""
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.template_dict = TemplateDictionary()
+
+    def tearDown(self):
+        pass
+
+    def test_record_class(self):
+        template_block = self.template_dict['ChatFromViewer'].get_block('ChatData')
+        record_class = template_block.record_class
+
+        self.assertEquals(record_class._fields, ('Message', 'Type', 'Channel'))
+        self.assertEquals(record_class.name, 'ChatData')
+
+        record = record_class(('Hi', 1, 0))
+        self.assertEquals((record.Message, record.Type, record.Channel), ('Hi', 1, 0))
+        self.assertEquals(record['Channel'], 0)
+        self.assertEquals(record[0], 'Hi')
+        self.assertEquals(record._asdict(), {'Message': 'Hi', 'Type': 1, 'Channel': 0})
+        self.assertEquals(record.get_variable('Type').var_type, MsgType.MVT_U8)
+        self.assertEquals(repr(record), "ChatData(Message='Hi', Type=1, Channel=0)")
+        self.assertRaises(KeyError, record.__getitem__, 'NotAVariable')
+        self.assertRaises(AttributeError, setattr, record, 'Channel', 1)
+
+    def test_shared_classes(self):
+        template_block = self.template_dict['ChatFromViewer'].get_block('AgentData')
+        self.assertTrue(TemplateDictionary()['ChatFromViewer'].get_block('AgentData').record_class
+                        is template_block.record_class)
+
+        partial = make_record_class(template_block, ['SessionID'])
+        self.assertEquals(partial._fields, ('SessionID', ))
+
+    def test_message_builds_records(self):
+        msg = Message('ChatFromViewer')
+        msg.template = self.template_dict['ChatFromViewer']
+        msg.add_block(Block('AgentData', AgentID = UUID(int = 1), SessionID = UUID(int = 2)))
+        msg.add_block(Block('ChatData', Message = 'Hi', Type = 1, Channel = 0))
+
+        self.assertTrue(isinstance(msg.blocks['ChatData'][0], BlockRecord))
+        self.assertEquals(msg.ChatData[0].Message, 'Hi')
+        self.assertEquals(msg.AgentData[0].SessionID, UUID(int = 2))
+        self.assertEquals(msg.blocks['ChatData'][0].vars['Type'].data, 1)
+        self.assertRaises(AttributeError, getattr, msg, 'NotABlock')
+
+    def test_message_keeps_incomplete_blocks(self):
+        msg = Message('ChatFromViewer')
+        msg.template = self.template_dict['ChatFromViewer']
+        msg.add_block(Block('ChatData', Message = 'Hi', Type = 1))
+
+        self.assertFalse(isinstance(msg.blocks['ChatData'][0], BlockRecord))
+
+    def test_message_without_template_keeps_blocks(self):
+        msg = Message('ChatFromViewer',
+                      Block('ChatData', Message = 'Hi', Type = 1, Channel = 0))
+
+        self.assertFalse(isinstance(msg.blocks['ChatData'][0], BlockRecord))
+        self.assertEquals(msg.ChatData[0]['Channel'], 0)
+
+    def test_custom_template(self):
+        custom = TemplateDictionary(MessageTemplateParser(StringIO(CUSTOM_TEMPLATE)).message_templates)
+        custom_block = custom['ChatFromViewer'].get_block('ChatData')
+        template_block = self.template_dict['ChatFromViewer'].get_block('ChatData')
+
+        self.assertEquals(custom_block.record_class._fields, ('Channel', 'Message'))
+        self.assertEquals(template_block.record_class._fields, ('Message', 'Type', 'Channel'))
+
+        msg = Message('ChatFromViewer')
+        msg.template = self.template_dict['ChatFromViewer']
+        msg.add_block(Block('ChatData', Message = 'Hi', Type = 1, Channel = 0))
+        self.assertTrue(msg.blocks['ChatData'][0].__class__ is template_block.record_class)
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestRecords))
+    return suite
@@ -0,0 +1,145 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+
+#standard libraries
+import unittest
+import os
+import shutil
+import tempfile
+import marshal
+from StringIO import StringIO
+
+#local libraries
+from pyogp.lib.base.message import template_cache
+from pyogp.lib.base.message.template_cache import load_templates, dump_templates, template_key
+from pyogp.lib.base.message.template_dict import TemplateDictionary
+from pyogp.lib.base.message.template_parser import MessageTemplateParser
+from pyogp.lib.base.message.data import msg_tmpl
+
+TEMPLATE = """version 2.0
+{
+	PacketAck Fixed 0xFFFFFFFB NotTrusted Unencoded
+	{
+		Packets			Variable
+		{	ID			U32	}
+	}
+}
+{
+	TestMessage Low 1 NotTrusted Zerocoded
+	{
+		TestBlock1		Single
+		{	Test1		U32	}
+	}
+	{
+		NeighborBlock		Multiple		4
+		{	Test0		U32	}
+		{	Test1		U32	}
+		{	Test2		U32	}
+	}
+}
+"""
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        template_cache._loaded.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        template_cache._loaded.clear()
+
+    def test_cached_templates(self):
+        template_file = StringIO(TEMPLATE)
+        parsed = MessageTemplateParser(template_file).message_templates
+
+        templates = load_templates(template_file, self.cache_dir)
+        assert dump_templates(templates) == dump_templates(parsed), "Templates changed by parsing"
+        assert os.listdir(self.cache_dir) == [template_key(TEMPLATE)], "Cache file not written"
+
+        # a new process, which only has the file
+        template_cache._loaded.clear()
+        templates = load_templates(template_file, self.cache_dir)
+        assert dump_templates(templates) == dump_templates(parsed), "Templates changed by the cache"
+
+        test_message = templates[1]
+        assert test_message.name is intern('TestMessage'), "Name not interned"
+        assert test_message.get_block('NeighborBlock').number == 4, "Block changed by the cache"
+        assert [variable.name for variable in test_message.get_block('NeighborBlock').get_variables()] == \
+               ['Test0', 'Test1', 'Test2'], "Variables out of order"
+
+        # each load builds its own templates
+        assert load_templates(template_file, self.cache_dir)[0] is not templates[0], "Templates shared"
+
+    def test_changed_template(self):
+        load_templates(StringIO(TEMPLATE), self.cache_dir)
+
+        changed = TEMPLATE.replace('TestBlock1', 'ChangedBlock')
+        templates = load_templates(StringIO(changed), self.cache_dir)
+
+        assert templates[1].get_blocks()[0].name == 'ChangedBlock', "Stale templates loaded"
+        assert len(os.listdir(self.cache_dir)) == 2, "Changed template not cached"
+
+    def test_unreadable_cache(self):
+        cache_file = open(os.path.join(self.cache_dir, template_key(TEMPLATE)), 'wb')
+        cache_file.write('not marshalled')
+        cache_file.close()
+
+        templates = load_templates(StringIO(TEMPLATE), self.cache_dir)
+        assert [template.name for template in templates] == ['PacketAck', 'TestMessage'], \
+               "Templates not parsed past a bad cache file"
+
+    def test_malformed_cache(self):
+        cache_file = open(os.path.join(self.cache_dir, template_key(TEMPLATE)), 'wb')
+        marshal.dump((('PacketAck', 1), ), cache_file)
+        cache_file.close()
+
+        templates = load_templates(StringIO(TEMPLATE), self.cache_dir)
+        assert [template.name for template in templates] == ['PacketAck', 'TestMessage'], \
+               "Templates not parsed past a malformed cache file"
+
+    def test_shared_cache_dir(self):
+        planted = dump_templates(MessageTemplateParser(StringIO(TEMPLATE.replace('TestMessage', 'Planted'))).message_templates)
+        cache_file = open(os.path.join(self.cache_dir, template_key(TEMPLATE)), 'wb')
+        marshal.dump(planted, cache_file)
+        cache_file.close()
+
+        # anyone can write to the directory
+        os.chmod(self.cache_dir, 0777)
+        template_cache._loaded.clear()
+
+        templates = load_templates(StringIO(TEMPLATE), self.cache_dir)
+        assert templates[1].name == 'TestMessage', "Templates read from a shared directory"
+
+    def test_dictionary(self):
+        load_templates(msg_tmpl, self.cache_dir)
+        template_cache._loaded.clear()
+        cached = load_templates(msg_tmpl, self.cache_dir)
+
+        parsed = MessageTemplateParser(msg_tmpl).message_templates
+
+        assert dump_templates(cached) == dump_templates(parsed), \
+               "Cached templates differ from message_template.msg"
+        assert TemplateDictionary(cached).get_template_by_header('\xff\xff\xff\xfb').name == 'PacketAck', \
+               "Cached templates not indexed"
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestTemplateCache))
+    return suite
@@ -0,0 +1,120 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+#standard libraries
+import unittest
+
+#local libraries
+from pyogp.lib.base.settings import Settings
+from pyogp.lib.base.message.template import MsgData
+from pyogp.lib.base.message.template_dict import TemplateDictionary
+from pyogp.lib.base.message.template_decoder import FIXED_RUN, VARIABLE_FIELD
+from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.records import BufferedData
+from pyogp.lib.base.message.zerocode import zero_code_expand
+from pyogp.lib.base.message.benchmarks.bench_deserializer import legacy_decode
+from pyogp.lib.base.message.tests.test_packetdata import AGENT_DATA_UPDATE, OBJECT_UPDATE
+
+class TestTemplateDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.template_dict = TemplateDictionary()
+        self.settings = Settings()
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = False
+
+    def tearDown(self):
+        pass
+
+    def test_fixed_runs_are_merged(self):
+        decoder = self.template_dict['ChatFromViewer'].decoder
+
+        agent_data, chat_data = decoder.blocks
+        self.assertEquals([step[0] for step in agent_data.steps], [FIXED_RUN])
+        self.assertEquals(agent_data.steps[0][1].size, 32)
+        self.assertEquals([step[0] for step in chat_data.steps], [VARIABLE_FIELD, FIXED_RUN])
+        self.assertEquals(chat_data.steps[1][1].size, 5)
+
+    def test_matches_legacy_decode(self):
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+
+        for packet in (AGENT_DATA_UPDATE, OBJECT_UPDATE):
+            message = deserializer.deserialize(packet)
+            template = self.template_dict[message.name]
+            data = packet[:6] + zero_code_expand(packet, 6)
+            decode_pos = 6 + template.frequency
+
+            compiled = MsgData(message.name)
+            legacy = MsgData(message.name)
+            self.assertEquals(template.decoder.decode(data, decode_pos, compiled),
+                              legacy_decode(template, data, decode_pos, legacy))
+
+            for name in legacy.blocks:
+                for compiled_block, legacy_block in zip(compiled.blocks[name], legacy.blocks[name]):
+                    self.assertEquals(compiled_block.var_list, legacy_block.var_list)
+                    for var_name in legacy_block.var_list:
+                        self.assertEquals(repr(compiled_block[var_name]), repr(legacy_block[var_name]))
+
+    def test_projection(self):
+        decoder = self.template_dict['ObjectUpdate'].decoder
+        projected = decoder.project(frozenset(['ObjectData.FullID', 'ObjectData.PCode']))
+        assert decoder.project(frozenset(['ObjectData.PCode', 'ObjectData.FullID'])) is projected, \
+               'Projection not cached'
+        assert decoder.project(None) is decoder, 'Empty projection not the full decoder'
+
+        data = OBJECT_UPDATE[:6] + zero_code_expand(OBJECT_UPDATE, 6)
+        decode_pos = 6 + self.template_dict['ObjectUpdate'].frequency
+        full = MsgData('ObjectUpdate')
+        partial = MsgData('ObjectUpdate')
+        self.assertEquals(projected.decode(data, decode_pos, partial),
+                          decoder.decode(data, decode_pos, full))
+
+        self.assertEquals(partial.blocks.keys(), ['ObjectData'])
+        for full_block, partial_block in zip(full.blocks['ObjectData'], partial.blocks['ObjectData']):
+            self.assertEquals(partial_block.var_list, ['FullID', 'PCode'])
+            self.assertEquals(str(partial_block['FullID']), str(full_block['FullID']))
+            self.assertEquals(partial_block['PCode'], full_block['PCode'])
+
+    def test_projection_whole_block(self):
+        decoder = self.template_dict['ObjectUpdate'].decoder.project(frozenset(['RegionData', 'RegionData.TimeDilation']))
+        msg_data = MsgData('ObjectUpdate')
+        data = OBJECT_UPDATE[:6] + zero_code_expand(OBJECT_UPDATE, 6)
+        decoder.decode(data, 6 + self.template_dict['ObjectUpdate'].frequency, msg_data)
+
+        self.assertEquals(msg_data.blocks.keys(), ['RegionData'])
+        self.assertEquals(msg_data.blocks['RegionData'][0].var_list, ['RegionHandle', 'TimeDilation'])
+
+    def test_variable_data_is_deferred(self):
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        message = deserializer.deserialize(OBJECT_UPDATE)
+        record = message.blocks['ObjectData'][0]
+
+        raw = tuple.__getitem__(record, record._index['TextureEntry'])
+        assert isinstance(raw, BufferedData), 'Variable data sliced while decoding'
+        self.assertEquals(type(record.TextureEntry), str)
+        self.assertEquals(record['TextureEntry'], record.TextureEntry)
+        self.assertEquals(type(record._asdict()['ObjectData']), str)
+        self.assertEquals([type(value) for value in record if isinstance(value, BufferedData)], [])
+
+    def test_truncated_data(self):
+        decoder = self.template_dict['ChatFromViewer'].decoder
+        self.assertEquals(decoder.decode('\x00' * 20, 0, MsgData('ChatFromViewer')), None)
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestTemplateDecoder))
+    return suite
@@ -0,0 +1,168 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+#standard libraries
+import unittest
+from uuid import UUID
+
+#local libraries
+from pyogp.lib.base import exc
+from pyogp.lib.base.settings import Settings
+from pyogp.lib.base.datatypes import Vector3, Quaternion
+from pyogp.lib.base.message.message import Message, Block
+from pyogp.lib.base.message.template_dict import TemplateDictionary
+from pyogp.lib.base.message.template_decoder import FIXED_RUN, VARIABLE_FIELD
+from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
+from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
+from pyogp.lib.base.message.benchmarks.bench_serializer import legacy_encode
+
+class TestTemplateEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.template_dict = TemplateDictionary()
+        self.settings = Settings()
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = False
+
+    def tearDown(self):
+        pass
+
+    def agent_update(self):
+        return Message('AgentUpdate',
+                       Block('AgentData', AgentID = UUID('550e8400-e29b-41d4-a716-446655440000'),
+                             SessionID = UUID('550e8400-e29b-41d4-a716-446655440001'),
+                             BodyRotation = Quaternion(X = 0.0, Y = 0.0, Z = 0.6, W = 0.8),
+                             HeadRotation = (0.0, 0.0, 0.0, 1.0),
+                             State = 0,
+                             CameraCenter = Vector3(X = 128.0, Y = 128.0, Z = 22.5),
+                             CameraAtAxis = (1.0, 0.0, 0.0),
+                             CameraLeftAxis = (0.0, 1.0, 0.0),
+                             CameraUpAxis = (0.0, 0.0, 1.0),
+                             Far = 64.0,
+                             ControlFlags = 0x100,
+                             Flags = 0))
+
+    def test_fixed_runs_are_merged(self):
+        encoder = self.template_dict['ChatFromViewer'].encoder
+
+        agent_data, chat_data = encoder.blocks
+        self.assertEquals([step[0] for step in agent_data.steps], [FIXED_RUN])
+        self.assertEquals(agent_data.fixed_size, 32)
+        self.assertEquals([step[0] for step in chat_data.steps], [VARIABLE_FIELD, FIXED_RUN])
+        self.assertEquals(chat_data.fixed_size, None)
+
+    def test_matches_legacy_encode(self):
+        chat = Message('ChatFromViewer',
+                       Block('AgentData', AgentID = UUID('550e8400-e29b-41d4-a716-446655440000'),
+                             SessionID = UUID('550e8400-e29b-41d4-a716-446655440000')),
+                       Block('ChatData', Message = u'Hi Locklainn Tester \xe9', Type = 1, Channel = 0))
+
+        for msg in (chat, self.agent_update()):
+            template = self.template_dict[msg.name]
+            self.assertEquals(template.encoder.encode(msg), legacy_encode(template, msg))
+
+    def test_fixed_size_fields(self):
+        msg = Message('OpenCircuit', Block('CircuitInfo', IP = '\x7f\x00\x00\x01', Port = 13000))
+        packed_data = UDPMessageSerializer(template_dict = self.template_dict).serialize(msg)
+        self.assertEquals(packed_data[-6:], '\x7f\x00\x00\x01' + '\x32\xc8')
+
+        packet = UDPMessageDeserializer(settings = self.settings).deserialize(packed_data)
+        self.assertEquals(packet.blocks['CircuitInfo'][0].vars['Port'].data, 13000)
+
+    def test_missing_variable(self):
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID = UUID('550e8400-e29b-41d4-a716-446655440000')),
+                      Block('ChatData', Message = 'Hi', Type = 1, Channel = 0))
+        self.assertRaises(exc.MessageSerializationError,
+                          self.template_dict['ChatFromViewer'].encoder.encode, msg)
+
+    def test_missing_block(self):
+        msg = Message('ChatFromViewer',
+                      Block('ChatData', Message = 'Hi', Type = 1, Channel = 0))
+        self.assertRaises(exc.MessageSerializationError,
+                          self.template_dict['ChatFromViewer'].encoder.encode, msg)
+
+    def test_prepared_message(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        prepared = serializer.prepare(self.agent_update())
+
+        self.assertEquals(serializer.serialize(prepared), serializer.serialize(self.agent_update()))
+
+        prepared.set_var('AgentData', 'ControlFlags', 0x200)
+        prepared.set_var('AgentData', 'CameraCenter', Vector3(X = 1.0, Y = 2.0, Z = 3.0))
+        prepared.packet_id = 7
+
+        packet = deserializer.deserialize(serializer.serialize(prepared))
+        agent_data = packet.blocks['AgentData'][0]
+        self.assertEquals(packet.packet_id, 7)
+        self.assertEquals(agent_data.vars['ControlFlags'].data, 0x200)
+        self.assertEquals(agent_data.vars['CameraCenter'].data(), (1.0, 2.0, 3.0))
+        self.assertEquals(agent_data.vars['Far'].data, 64.0)
+
+    def test_prepared_message_encoded_once(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        prepared = serializer.prepare(self.agent_update())
+
+        body = serializer.encode_body(prepared)
+        assert serializer.encode_body(prepared) is body, 'Body zero coded again'
+
+        prepared.set_var('AgentData', 'ControlFlags', 0x200)
+        assert serializer.encode_body(prepared) != body, 'Body not encoded after set_var'
+
+    def test_prepared_message_clone(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        prepared = serializer.prepare(self.agent_update())
+        clone = prepared.clone()
+        sent = serializer.serialize(clone)
+
+        prepared.set_var('AgentData', 'ControlFlags', 0x200)
+        self.assertEquals(serializer.serialize(clone), sent)
+        self.assertNotEquals(serializer.serialize(prepared), sent)
+
+    def test_prepared_message_after_variable_data(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        chat = Message('ChatFromViewer',
+                       Block('AgentData', AgentID = UUID('550e8400-e29b-41d4-a716-446655440000'),
+                             SessionID = UUID('550e8400-e29b-41d4-a716-446655440000')),
+                       Block('ChatData', Message = 'Hello', Type = 1, Channel = 0))
+        prepared = serializer.prepare(chat)
+        prepared.set_var('ChatData', 'Channel', 42)
+
+        packet = UDPMessageDeserializer(settings = self.settings).deserialize(serializer.serialize(prepared))
+        self.assertEquals(packet.blocks['ChatData'][0].vars['Channel'].data, 42)
+        self.assertEquals(packet.blocks['ChatData'][0].vars['Message'].data, 'Hello')
+
+    def test_prepared_message_variable_data(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        prepared = serializer.prepare(Message('ChatFromViewer',
+                       Block('AgentData', AgentID = UUID('550e8400-e29b-41d4-a716-446655440000'),
+                             SessionID = UUID('550e8400-e29b-41d4-a716-446655440000')),
+                       Block('ChatData', Message = 'Hello', Type = 1, Channel = 0)))
+
+        self.assertRaises(exc.MessageSerializationError,
+                          prepared.set_var, 'ChatData', 'Message', 'Bye')
+
+    def test_prepare_unknown_message(self):
+        serializer = UDPMessageSerializer(template_dict = self.template_dict)
+        self.assertRaises(exc.MessageTemplateNotFound,
+                          serializer.prepare, Message('NotAMessage'))
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestTemplateEncoder))
+    return suite
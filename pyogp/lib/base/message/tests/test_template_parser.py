@@ -57,6 +57,16 @@ class TestDictionary(unittest.TestCase):
         packet = msg_dict.get_template_by_pair('Medium', 8)
         assert packet.name == 'ConfirmEnableSimulator', "Frequency-Number pair resulting in incorrect packet"        
 
+    def test_get_packet_by_header(self):
+        msg_dict = TemplateDictionary(self.template_list)
+        for template in self.template_list:
+            packet = msg_dict.get_template_by_header('\x00' * 6 + template.msg_num_hex + '\x00', 6)
+            assert packet is template, "Header resulting in incorrect packet for " + template.name
+
+        assert msg_dict.get_template_by_header('\xff\xff\x00') == None, "Short Low header not caught"
+        assert msg_dict.get_template_by_header('\xff\xff\x00\x08\x00', 0, 3) == None, "Header end not honored"
+        assert msg_dict.get_template_by_header('\xff\xff\xff\x00') == None, "Unknown Fixed header not caught"
+
 class TestTemplates(unittest.TestCase):
 
     def tearDown(self):
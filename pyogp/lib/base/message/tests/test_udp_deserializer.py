@@ -18,6 +18,7 @@ $/LicenseInfo$
 
 #standard libraries
 import unittest, doctest
+import threading
 from uuid import UUID
 
 #local libraries
@@ -26,6 +27,9 @@ from pyogp.lib.base.message.msgtypes import MsgType
 from pyogp.lib.base.message.message import Message, Block
 from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
 from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
+from pyogp.lib.base.message.template_dict import TemplateDictionary
+from pyogp.lib.base.message.records import BlockRecord
+from pyogp.lib.base.message.tests.test_packetdata import AGENT_DATA_UPDATE, OBJECT_UPDATE
 
 #from indra.base.lluuid import UUID
 
@@ -62,6 +66,152 @@ class TestDeserializer(unittest.TestCase):
         assert data['ChatData'][0].vars['Message'].data == 'Hi Locklainn Tester',\
                'Message for chat is incorrect'
 
+    def test_appended_acks(self):
+        message = '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00'
+        message = '\x10' + '\x00\x00\x00\x01' + '\x00' + message + \
+                  '\x00\x00\x00\x07' + '\x00\x00\x00\x08' + '\x02'
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        packet = deserializer.deserialize(message)
+
+        assert packet['Packets'][0]['ID'] == 1, 'Body read into the acks'
+        assert len(packet['Packets']) == 1, 'Acks decoded as blocks'
+        assert packet.acks == [7, 8], 'Incorrect acks ' + repr(packet.acks)
+
+    def test_peek_header(self):
+        message = '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00'
+        message = '\x50' + '\x00\x00\x00\x09' + '\x00' + message + \
+                  '\x00\x00\x00\x07' + '\x01'
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        header = deserializer.peek_header(message)
+
+        assert header.name == 'PacketAck', 'Incorrect template'
+        assert header.packet_id == 9, 'Incorrect sequence number'
+        assert header.reliable, 'Reliable flag not read'
+        assert header.acks == [7], 'Incorrect acks ' + repr(header.acks)
+
+    def test_peek_header_zero_coded(self):
+        # a Low message number with a zero coded high byte
+        message = '\x80' + '\x00\x00\x00\x01' + '\x00' + '\xff\xff\x00\x01\x01'
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        header = deserializer.peek_header(message)
+
+        assert header.template == deserializer.template_dict.get_template_by_pair('Low', 1), \
+               'Incorrect template ' + repr(header.name)
+
+    def test_records(self):
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID('550e8400-e29b-41d4-a716-446655440000'),
+                            SessionID=UUID('550e8400-e29b-41d4-a716-446655440000')),
+                       Block('ChatData', Message='Hi Locklainn Tester', Type=1, Channel=0))
+        packed_data = UDPMessageSerializer().serialize(msg)
+
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        packet = deserializer.deserialize(packed_data)
+        chat_data = packet.ChatData[0]
+
+        assert isinstance(chat_data, BlockRecord), 'Block not decoded into a record'
+        assert chat_data == ('Hi Locklainn Tester', 1, 0), 'Record values incorrect ' + repr(chat_data)
+        assert chat_data.Message == chat_data['Message'] == 'Hi Locklainn Tester', \
+               'Message for chat is incorrect'
+        assert chat_data.var_list == ['Message', 'Type', 'Channel'], 'Variables out of template order'
+
+        variable = chat_data.get_variable('Channel')
+        assert (variable.name, variable.data, variable.var_type) == ('Channel', 0, MsgType.MVT_S32), \
+               'Variable view incorrect'
+        self.assertRaises(AttributeError, setattr, variable, 'data', 1)
+        assert chat_data._replace(Channel = 5).Channel == 5, 'Record not replaced'
+
+    def test_shared_template_dict(self):
+        template_dict = TemplateDictionary()
+        serializer = UDPMessageSerializer(template_dict = template_dict)
+        deserializer = UDPMessageDeserializer(settings = self.settings, template_dict = template_dict)
+        assert serializer.template_dict is deserializer.template_dict, 'Templates not shared'
+
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID('550e8400-e29b-41d4-a716-446655440000'),
+                            SessionID=UUID('550e8400-e29b-41d4-a716-446655440000')),
+                       Block('ChatData', Message='Hi Locklainn Tester', Type=1, Channel=0))
+        packet = deserializer.decode(serializer.encode(msg))
+        assert packet.blocks['ChatData'][0].vars['Message'].data == 'Hi Locklainn Tester', \
+               'Message for chat is incorrect'
+
+    def test_uuid_interning(self):
+        self.settings.ENABLE_UUID_INTERNING = True
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+
+        first = deserializer.deserialize(AGENT_DATA_UPDATE).blocks['AgentData'][0].AgentID
+        second = deserializer.deserialize(AGENT_DATA_UPDATE).blocks['AgentData'][0].AgentID
+        assert first is second, 'UUID not interned'
+        self.assertRaises(TypeError, first.random)
+
+        other = UDPMessageDeserializer(settings = self.settings)
+        assert other.deserialize(AGENT_DATA_UPDATE).blocks['AgentData'][0].AgentID is not first, \
+               'UUID shared between deserializers'
+
+        self.settings.ENABLE_UUID_INTERNING = False
+        plain = UDPMessageDeserializer(settings = self.settings)
+        assert plain.deserialize(AGENT_DATA_UPDATE).blocks['AgentData'][0].AgentID is not \
+               plain.deserialize(AGENT_DATA_UPDATE).blocks['AgentData'][0].AgentID, \
+               'UUID interned with interning off'
+
+    def test_deserialize_many(self):
+        ack = '\x00' + '\x00\x00\x00\x01' + '\x00' + '\xff\xff\xff\xfb' + \
+              '\x01' + '\x01\x00\x00\x00'
+        unknown = '\x00' + '\x00\x00\x00\x02' + '\x00' + '\xff\xff\xff\x00'
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+
+        packets = deserializer.deserialize_many([AGENT_DATA_UPDATE, ack, unknown, OBJECT_UPDATE, ack])
+        assert [packet and packet.name for packet in packets] == \
+               ['AgentDataUpdate', 'PacketAck', None, 'ObjectUpdate', 'PacketAck'], \
+               'Incorrect deserialization ' + repr(packets)
+        assert deserializer.deserialize_many([]) == [], 'Empty batch not empty'
+
+    def test_deserialize_many_skipped(self):
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = True
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        deserializer.message_handler.register('ObjectUpdate')
+
+        packets = deserializer.deserialize_many([AGENT_DATA_UPDATE, OBJECT_UPDATE])
+        assert packets[0] == None, 'Unhandled packet was decoded'
+        assert packets[1].name == 'ObjectUpdate', 'Handled packet was not decoded'
+
+    def test_projection(self):
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = True
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        deserializer.message_handler.register('ObjectUpdate', ['ObjectData.FullID'])
+        deserializer.message_handler.register('ObjectUpdate', ['ObjectData.PCode'])
+
+        packet = deserializer.deserialize(OBJECT_UPDATE)
+        assert packet.blocks.keys() == ['ObjectData'], 'Unprojected block decoded'
+        assert packet.blocks['ObjectData'][0].var_list == ['FullID', 'PCode'], \
+               'Unprojected variables decoded'
+
+        # registering without fields means everything is wanted
+        deserializer.message_handler.register('ObjectUpdate')
+        deserializer.message_handler.register('ObjectUpdate', ['ObjectData.CRC'])
+        packet = deserializer.deserialize(OBJECT_UPDATE)
+        assert 'RegionData' in packet.blocks, 'Whole message not decoded'
+        assert 'ExtraParams' in packet.blocks['ObjectData'][0].var_list, 'Whole message not decoded'
+
+    def test_decode_from_threads(self):
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        expected = [(AGENT_DATA_UPDATE, 'AgentDataUpdate'), (OBJECT_UPDATE, 'ObjectUpdate')]
+        errors = []
+
+        def decode(datagram, name):
+            for i in range(200):
+                packet = deserializer.decode(datagram)
+                if packet.name != name or len(packet.blocks) == 0:
+                    errors.append(packet.name)
+
+        threads = [threading.Thread(target = decode, args = expected[i % 2]) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == [], 'Packets decoded with the wrong template: %s' % (errors)
+
 
 
 def test_suite():
@@ -21,8 +21,10 @@ import unittest, doctest
 from uuid import UUID
 
 #local libraries
+from pyogp.lib.base import exc
 from pyogp.lib.base.settings import Settings
-from pyogp.lib.base.message.msgtypes import MsgType
+from pyogp.lib.base.message.msgtypes import MsgType, PackFlags
+from pyogp.lib.base.message.message import Message, Block
 from pyogp.lib.base.message.udpdeserializer import UDPMessageDeserializer
 from pyogp.lib.base.message.udpserializer import UDPMessageSerializer
 
@@ -51,6 +53,99 @@ class TestSerializer(unittest.TestCase):
         packed_data = serializer.serialize(packet)
         assert packed_data == message, "Incorrect serialization"
 
+    def test_serialize_zero_coded(self):
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID(int=1), SessionID=UUID(int=2)),
+                      Block('ChatData', Message='', Type=1, Channel=0))
+        packed_data = UDPMessageSerializer().serialize(msg)
+
+        assert ord(packed_data[0]) & PackFlags.LL_ZERO_CODE_FLAG, "Zero coded flag not set"
+        assert len(packed_data) < 53, "Body was not zero coded"
+
+        deserializer = UDPMessageDeserializer(settings = self.settings)
+        packet = deserializer.deserialize(packed_data)
+        assert packet.name == 'ChatFromViewer', "Incorrect deserialization"
+        assert str(packet.blocks['AgentData'][0].vars['SessionID'].data) == str(UUID(int=2)), \
+               "SessionID is incorrect"
+        assert packet.blocks['ChatData'][0].vars['Type'].data == 1, "Type is incorrect"
+
+    def test_serialize_zero_coded_no_gain(self):
+        # a Zerocoded template, but zero coding would grow the body
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID('550e8411-e29b-41d4-a716-446655441111'),
+                            SessionID=UUID('550e8411-e29b-41d4-a716-446655441111')),
+                      Block('ChatData', Message='Hi', Type=1, Channel=1))
+        msg.send_flags = PackFlags.LL_ZERO_CODE_FLAG
+        packed_data = UDPMessageSerializer().serialize(msg)
+
+        assert not ord(packed_data[0]) & PackFlags.LL_ZERO_CODE_FLAG, "Zero coded flag set"
+        assert packed_data[6:10] == '\xff\xff\x00\x50', "Body was zero coded"
+
+    def test_encoded_size(self):
+        serializer = UDPMessageSerializer()
+        msg = Message('PacketAck', [Block('Packets', ID=packet_id) for packet_id in (1, 2, 3)])
+        assert serializer.encoded_size(msg) == 23, "Wrong size " + str(serializer.encoded_size(msg))
+        assert serializer.encoded_size(msg) == len(serializer.serialize(msg)), "Size differs from serialize"
+
+        msg = Message('ChatFromViewer',
+                      Block('AgentData', AgentID=UUID('550e8411-e29b-41d4-a716-446655441111'),
+                            SessionID=UUID('550e8411-e29b-41d4-a716-446655441111')),
+                      Block('ChatData', Message=u'Hi \xe9', Type=1, Channel=1))
+        assert serializer.encoded_size(msg) == len(serializer.serialize(msg)), "Size differs from serialize"
+
+    def test_split(self):
+        serializer = UDPMessageSerializer(mtu = 500)
+        msg = Message('ObjectSelect',
+                      Block('AgentData', AgentID=UUID(int=1), SessionID=UUID(int=2)),
+                      [Block('ObjectData', ObjectLocalID=local_id) for local_id in range(1, 601)])
+        parts = serializer.split(msg)
+
+        # 43 bytes of header, message number and AgentData, then 4 per
+        # object, which would be [114] * 5 + [30] before zero coding
+        assert [len(part.blocks['ObjectData']) for part in parts] == [160, 144, 120, 120, 56], \
+               "Split wrong, got " + str([len(part.blocks['ObjectData']) for part in parts])
+
+        local_ids = []
+        for part in parts:
+            assert len(serializer.serialize(part)) <= 500, "Part larger than the mtu"
+            assert part.blocks['AgentData'] == msg.blocks['AgentData'], "AgentData not copied"
+            local_ids += [block.vars['ObjectLocalID'].data for block in part.blocks['ObjectData']]
+        assert local_ids == range(1, 601), "Objects lost or reordered"
+
+    def test_split_repeat_count(self):
+        msg = Message('PacketAck', [Block('Packets', ID=packet_id) for packet_id in range(300)])
+        parts = UDPMessageSerializer().split(msg)
+        assert [len(part.blocks['Packets']) for part in parts] == [255, 45], "Too many repeats in a block"
+
+    def test_encode_body_too_large(self):
+        serializer = UDPMessageSerializer(mtu = 500)
+        msg = Message('ObjectSelect',
+                      Block('AgentData', AgentID=UUID(int=1), SessionID=UUID(int=2)),
+                      [Block('ObjectData', ObjectLocalID=local_id) for local_id in range(1, 201)])
+        self.assertRaises(exc.MessageTooLarge, serializer.encode_body, msg, True)
+
+        body, zero_coded = serializer.encode_body(msg)
+        assert serializer.serialize(msg, (body, zero_coded)) == serializer.serialize(msg), \
+               "Datagram differs with the body built first"
+
+        msg = Message('PacketAck', [Block('Packets', ID=packet_id) for packet_id in range(300)])
+        self.assertRaises(exc.MessageTooLarge, UDPMessageSerializer().encode_body, msg, True)
+
+    def test_split_fits(self):
+        msg = Message('PacketAck', Block('Packets', ID=1))
+        assert UDPMessageSerializer(mtu = 500).split(msg) == [msg], "Message that fits was split"
+
+    def test_split_fits_zero_coded(self):
+        serializer = UDPMessageSerializer(mtu = 500)
+        msg = Message('ObjectSelect',
+                      Block('AgentData', AgentID=UUID(int=1), SessionID=UUID(int=2)),
+                      [Block('ObjectData', ObjectLocalID=local_id) for local_id in range(1, 151)])
+
+        # too large before zero coding, but not after
+        assert serializer.encoded_size(msg) > 500
+        assert serializer.encode_body(msg, True) != None
+        assert serializer.split(msg) == [msg], "Zero coded message that fits was split"
+
 
 def test_suite():
     from unittest import TestSuite, makeSuite
@@ -152,6 +152,45 @@ class TestUDPConnection(unittest.TestCase):
         assert len(circuit.acks) == 1, "Ack not collected"
         assert circuit.acks[0] == 5, "Ack ID not correct, got " + str(circuit.acks[0])
 
+    def test_receive_skipped_reliable(self):
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = True
+        out_message = '\x40' + '\x00\x00\x00\x05' + '\x00' + \
+            '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00'
+        server = MockupUDPServer()
+        server.send_message(self.udp_connection.udp_client, out_message)
+
+        data, data_size = self.udp_connection.udp_client.receive_packet()
+        packet = self.udp_connection.receive_check(self.udp_connection.udp_client.sender,
+                                          data, data_size)
+        assert packet == None, "Unhandled packet was decoded"
+        circuit = self.udp_connection.circuit_manager.get_circuit(self.udp_connection.udp_client.get_sender())
+        assert circuit.acks == [5], "Ack not collected, got " + str(circuit.acks)
+
+    def test_receive_many(self):
+        out_messages = ['\x40' + '\x00\x00\x00\x05' + '\x00' + \
+                        '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00',
+                        '',
+                        '\x80' + '\x00\x00\x00\x06' + '\x00' + \
+                        '\xff\xff\xff\xfb' + '\x01' + '\x02\x00\x03']
+
+        packets = self.udp_connection.receive_check_many(self.host, out_messages)
+        assert [packet.packet_id for packet in packets] == [5, 6], "Packets out of order"
+        assert packets[1].blocks['Packets'][0].vars['ID'].data == 2, "ID Data incorrect"
+        assert self.udp_connection.packets_in == 2, "Empty datagram counted"
+
+        circuit = self.udp_connection.circuit_manager.get_circuit(self.host)
+        assert circuit.acks == [5], "Ack not collected, got " + str(circuit.acks)
+
+    def test_receive_many_skipped(self):
+        self.settings.ENABLE_DEFERRED_PACKET_PARSING = True
+        out_message = '\x40' + '\x00\x00\x00\x05' + '\x00' + \
+            '\xff\xff\xff\xfb' + '\x01' + '\x01\x00\x00\x00'
+
+        packets = self.udp_connection.receive_check_many(self.host, [out_message])
+        assert packets == [], "Unhandled packet was decoded"
+        circuit = self.udp_connection.circuit_manager.get_circuit(self.host)
+        assert circuit.acks == [5], "Ack not collected, got " + str(circuit.acks)
+
     def test_acks(self):
         out_message = '\x40' + '\x00\x00\x00\x05' + '\x00' + \
             '\xff\xff\xff\xfb' + '\x01' + '\x00\x00\x00\x01'
@@ -170,6 +209,89 @@ class TestUDPConnection(unittest.TestCase):
         assert server.rec_buffer == test_msg, "Ack received incorrect, got " + \
                repr(server.rec_buffer)
 
+    def test_send_prepared(self):
+        self.settings.HANDLE_OUTGOING_PACKETS = True
+        prepared = self.udp_connection.udp_serializer.prepare(
+            Message('CompletePingCheck', Block('PingID', PingID = 1)))
+        handled = []
+        self.udp_connection.message_handler.register('CompletePingCheck').subscribe(handled.append)
+
+        buf = self.udp_connection.send_reliable(prepared, self.host, 10)
+        assert handled == [], "PreparedMessage handed to the outgoing handlers"
+
+        prepared.set_var('PingID', 'PingID', 2)
+        circuit = self.udp_connection.find_circuit(self.host)
+        kept = circuit.unacked_packets[1]
+        assert kept is not prepared, "PreparedMessage kept for resending without a copy"
+        assert self.udp_connection.udp_serializer.serialize(kept) == buf, \
+               "Kept message changed by set_var"
+
+    def test_receive_many_one_pass(self):
+        template_dict = self.udp_connection.udp_deserializer.template_dict
+        get_template_by_header = template_dict.get_template_by_header
+        lookups = []
+        def counted(*args):
+            lookups.append(args)
+            return get_template_by_header(*args)
+        template_dict.get_template_by_header = counted
+
+        ack = '\x00' + '\x00\x00\x00\x01' + '\x00' + '\xff\xff\xff\xfb' + \
+              '\x01' + '\x01\x00\x00\x00'
+        received = self.udp_connection.receive_check_many(self.host, [ack, ack])
+
+        assert [packet.name for packet in received] == ['PacketAck', 'PacketAck'], \
+               "Packets not received, got " + repr(received)
+        assert len(lookups) == 2, "Template looked up more than once per datagram"
+
+    def test_acks_split(self):
+        circuit = self.udp_connection.find_circuit(self.host)
+        circuit.acks = range(1, 301)
+
+        self.udp_connection.process_acks()
+        assert self.udp_connection.packets_out == 2, "Acks not split, sent " + \
+               str(self.udp_connection.packets_out)
+        assert circuit.acks == [], "Acks still pending"
+
+    def test_fits_not_split(self):
+        def split(message, mtu = None):
+            raise AssertionError("split a message that fits")
+        self.udp_connection.udp_serializer.split = split
+
+        msg = Message('CompletePingCheck', Block('PingID', PingID = 1))
+        buf = self.udp_connection.send_message(msg, self.host)
+        assert isinstance(buf, str), "Datagram not returned, got " + repr(buf)
+
+    def test_appended_acks(self):
+        out_message = '\x40' + '\x00\x00\x00\x05' + '\x00' + \
+            '\xff\xff\xff\xfb' + '\x01' + '\x00\x00\x00\x01'
+        self.udp_connection.receive_check_many(self.host, [out_message])
+
+        msg = Message('CompletePingCheck', Block('PingID', PingID = 1))
+        buf = self.udp_connection.send_message(msg, self.host)
+        test_str = '\x10' + '\x00\x00\x00\x01' + '\x00' + '\x02' + '\x01' + \
+                   '\x00\x00\x00\x05' + '\x01'
+        assert buf == test_str, "Ack not appended, got " + repr(buf)
+
+        circuit = self.udp_connection.circuit_manager.get_circuit(self.host)
+        assert circuit.acks == [], "Appended ack still pending"
+
+        self.host.ip.rec_buffer = ''
+        self.udp_connection.process_acks()
+        assert self.host.ip.rec_buffer == '', "PacketAck sent for an appended ack"
+
+    def test_appended_acks_mtu(self):
+        self.settings.UDP_MTU = 6 + 2 + 2 * 4 + 1
+        udp_connection = UDPDispatcher(MockupUDPClient(), settings = self.settings)
+        circuit = udp_connection.find_circuit(self.host)
+        circuit.acks = [5, 6, 7]
+
+        msg = Message('CompletePingCheck', Block('PingID', PingID = 1))
+        buf = udp_connection.send_message(msg, self.host)
+        assert len(buf) == self.settings.UDP_MTU, "Packet larger than the mtu"
+        assert buf.endswith('\x00\x00\x00\x05' + '\x00\x00\x00\x06' + '\x02'), \
+               "Acks not appended, got " + repr(buf)
+        assert circuit.acks == [7], "Ack not left pending, got " + str(circuit.acks)
+
 def test_suite():
     from unittest import TestSuite, makeSuite
     suite = TestSuite()
@@ -0,0 +1,65 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+"""
+
+#standard libraries
+import unittest
+
+#local libraries
+from pyogp.lib.base.message.zerocode import zero_code_expand, zero_code_encode
+from pyogp.lib.base.message.benchmarks.bench_zerocode import legacy_zero_code_expand
+from pyogp.lib.base.message.tests.test_packetdata import AGENT_DATA_UPDATE, OBJECT_UPDATE
+
+class TestZeroCode(unittest.TestCase):
+
+    def test_expand(self):
+        self.assertEquals(zero_code_expand('\x01\x00\x03\x02'), '\x01\x00\x00\x00\x02')
+        self.assertEquals(zero_code_expand('\x00\x01\x00\x02'), '\x00\x00\x00')
+        self.assertEquals(zero_code_expand('abc'), 'abc')
+        self.assertEquals(zero_code_expand(''), '')
+
+    def test_trailing_zero(self):
+        self.assertEquals(zero_code_expand('\x05\x00'), '\x05\x00')
+
+    def test_range(self):
+        data = '\xff\xff\x00\x04\x07\xee'
+        self.assertEquals(zero_code_expand(data, 2, 5), '\x00\x00\x00\x00\x07')
+
+    def test_limit(self):
+        data = '\x00\xff\x01'
+        self.assertEquals(zero_code_expand(data, limit = 4), '\x00\x00\x00\x00')
+        self.assertEquals(zero_code_expand('\x01\x02', limit = 4), '\x01\x02')
+
+    def test_encode(self):
+        self.assertEquals(zero_code_encode('\x01\x00\x00\x00\x02'), '\x01\x00\x03\x02')
+        self.assertEquals(zero_code_encode('\x00' * 300), '\x00\xff\x00\x2d')
+        self.assertEquals(zero_code_encode('\x07\x00\x00', 1), '\x00\x02')
+
+    def test_encode_round_trip(self):
+        for packet in (AGENT_DATA_UPDATE, OBJECT_UPDATE):
+            body = zero_code_expand(packet, 6)
+            self.assertEquals(zero_code_expand(zero_code_encode(body)), body)
+
+    def test_matches_legacy_expand(self):
+        for packet in (AGENT_DATA_UPDATE, OBJECT_UPDATE):
+            self.assertEquals(zero_code_expand(packet, 6),
+                              legacy_zero_code_expand(packet[6:]))
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestZeroCode))
+    return suite
@@ -18,7 +18,7 @@ $/LicenseInfo$
 
 #standard libs
 import struct
-from logging import getLogger
+from logging import getLogger, DEBUG
 
 #pyogp libs
 from pyogp.lib.base.settings import Settings
@@ -27,23 +27,67 @@ from template_dict import TemplateDictionary
 from template import MsgData, MsgBlockData, MsgVariableData
 from msgtypes import MsgType, MsgBlockType, MsgFrequency, PacketLayout, EndianType, PackFlags, sizeof
 from data_unpacker import DataUnpacker
-from message import Message
+from zerocode import zero_code_expand
+from columnar import ColumnarDecoder, get_columnar_decoder
+from message import Message, LazyMessage
+from pool import MessagePool
 from pyogp.lib.base.message.message_dot_xml import MessageDotXML
 
 from pyogp.lib.base import exc
+from pyogp.lib.base.datatypes import UUIDTable
 
 logger = getLogger('message.udpdeserializer') 
 
+PACKET_ID = struct.Struct('>I')
+
+class PacketHeader(object):
+    """ what can be learned about a datagram without decoding its body:
+    the flags, the sequence number, the acks appended to it, and which
+    template (and so frequency and message number) it uses """
+
+    def __init__(self, send_flags, packet_id, acks, template, body_end = None):
+
+        self.send_flags = send_flags
+        self.packet_id = packet_id  # aka, sequence number
+        self.acks = acks
+        self.template = template
+        # where the body ends in the datagram, before the appended acks
+        self.body_end = body_end
+
+        self.reliable = bool(send_flags & PackFlags.LL_RELIABLE_FLAG)
+        self.resent = bool(send_flags & PackFlags.LL_RESENT_FLAG)
+        self.zero_coded = bool(send_flags & PackFlags.LL_ZERO_CODE_FLAG)
+
+    def get_name(self):
+
+        if self.template == None:
+            return None
+
+        return self.template.name
+
+    name = property(get_name)
+
+    def __repr__(self):
+
+        return 'PacketHeader(%s, id=%s, flags=%#x, acks=%s)' % (self.name, self.packet_id, self.send_flags, self.acks)
+
 class UDPMessageDeserializer(object):
+    """ decodes datagrams into Messages
 
-    def __init__(self, message_handler = None, settings = None, message_template = None, message_xml = None):
+    No state about the packet being decoded is kept on the instance, so one
+    deserializer can decode on several threads or greenlets at once. The
+    template dictionary is only read, and can be shared with other
+    deserializers and serializers by passing it in as template_dict.
+    """
+
+    def __init__(self, message_handler = None, settings = None, message_template = None, message_xml = None, template_dict = None):
 
-        self.context = None
         self.unpacker = DataUnpacker()
-        self.current_template = None
-        self.current_block = None
 
-        self.template_dict = TemplateDictionary(message_template = message_template)
+        if template_dict != None:
+            self.template_dict = template_dict
+        else:
+            self.template_dict = TemplateDictionary(message_template = message_template)
 
         # allow the settings to be passed in
         # otherwise, grab the defaults
@@ -65,182 +109,261 @@ class UDPMessageDeserializer(object):
         elif self.settings.HANDLE_PACKETS:
             self.message_handler = MessageHandler()
 
-    def deserialize(self, context):
+        # the decoded messages are taken from here if
+        # settings.ENABLE_MESSAGE_POOLING is set
+        self.message_pool = MessagePool(self.settings.MESSAGE_POOL_SIZE)
+
+        # the decoded LLUUIDs are shared between the messages decoded here
+        # if settings.ENABLE_UUID_INTERNING is set
+        if self.settings.ENABLE_UUID_INTERNING:
+            self.uuid_table = UUIDTable(self.settings.UUID_INTERN_TABLE_SIZE)
+        else:
+            self.uuid_table = None
+
+    def is_message_decoded(self, message_name):
+        """ whether the body of a message will be decoded by deserialize(),
+        rather than skipped because no one is handling it """
 
-        self.context = context
+        return self.message_handler.is_message_handled(message_name) or \
+               not self.settings.ENABLE_DEFERRED_PACKET_PARSING
 
-        #Must first strip off acks if present, and zero-decode, 
-        #if needed, in order to determine proper template
-        #once we can test again, do the commented out part below for the offset
+    def peek_header(self, msg_buff):
+        """ read the packet header, appended acks and template of a datagram
+        in one pass, without building a Message
+
+        returns a PacketHeader, or None if the datagram is too short
+        """
 
-        temp_acks = []
-        msg_buff = self.context
         msg_len = len(msg_buff)
+        if msg_len < PacketLayout.MINIMUM_VALID_PACKET_SIZE:
+            return None
+
+        send_flags = ord(msg_buff[0])
+        packet_id = PACKET_ID.unpack_from(msg_buff, PacketLayout.PHL_PACKET_ID)[0]
 
-        if ord(msg_buff[0]) & PackFlags.LL_ACK_FLAG:
+        body_end = msg_len
+        acks = []
+        if send_flags & PackFlags.LL_ACK_FLAG:
             num_acks = ord(msg_buff[msg_len-1])
-            #logger.debug("Decoding packet with acks: %d", num_acks)
-            ack_length = 1 + sizeof(MsgType.MVT_U32) * num_acks
-            temp_acks = msg_buff[-ack_length:]
-            msg_buff = msg_buff[:-ack_length]
+            body_end -= 1 + sizeof(MsgType.MVT_U32) * num_acks
+            if body_end < PacketLayout.MINIMUM_VALID_PACKET_SIZE:
+                return None
+            acks = list(struct.unpack_from('>%dI' % (num_acks), msg_buff, body_end))
+
+        # the message number is at most 4 bytes, and only those need expanding
+        start = PacketLayout.PACKET_ID_LENGTH
+        if send_flags & PackFlags.LL_ZERO_CODE_FLAG:
+            offset = ord(msg_buff[PacketLayout.PHL_OFFSET])
+            header = msg_buff[start:start+offset] + \
+                     zero_code_expand(msg_buff, start + offset, body_end, limit = 4)
+            template = self.template_dict.get_template_by_header(header)
+        else:
+            template = self.template_dict.get_template_by_header(msg_buff, start, body_end)
 
-        #Now zero decode the entire msg except the acks, in order to get the correct evaluation of the template
+        return PacketHeader(send_flags, packet_id, acks, template, body_end)
 
-        if ord(msg_buff[0]) & PackFlags.LL_ZERO_CODE_FLAG:
-            '''
-            #offset = ord(msg_buff[5]) 
-            #header = msg_buff[:6+offset]   #offset will be zero unless the header has extra data
-            header = msg_buff[:6]
-            #inputbuf = msg_buff[6+offset:]  #not yet implemented because we can't test right now
-            inputbuf = msg_buff[6:]      
-            input_len = len(inputbuf)
-            msg_buff = self.zero_code_expand(inputbuf, input_len)
-            '''
-            offset = ord(msg_buff[5])
-            header = msg_buff[:6+offset]   #disregard#offset will be zero unless the header has extra data
-            #header = msg_buff[:6]
-            inputbuf = msg_buff[6+offset:]  #disregard#not yet implemented because we can't test right now
-            #inputbuf = msg_buff[6:]
-            # debugger code commented out 
-            #''.join( [ "%02X " % ord( x ) for x in byteStr ] ).strip() 
-            #print "just did zerodecode " + ''.join( [ "%02X " % ord( x ) for x in header ] ).strip() + ' ' \ 
-                        #+ ''.join( [ "%02X " % ord( x ) for x in msg_buff[:12] ] ).strip() 
-            input_len = len(inputbuf)
-            msg_buff = self.zero_code_expand(inputbuf, input_len)
-            msg_buff = header + msg_buff
-
-        if self.__validate_message(msg_buff) == True:
-
-            # go ahead an merge the acks back in in order for the decode to work
-            # or to get the send_flags for acks
-            msg_buff = msg_buff + ''.join(temp_acks)
-
-            # validate whether we are allowed to receive this message over udp
-            if not self.message_xml.validate_udp_msg(self.current_template.name):
-                logger.warning("Received '%s' over UDP, when it should come over the event queue. Discarding." % (self.current_template.name))
-                return None
+    def deserialize(self, context):
+        """ decode the datagram context, see decode """
 
-            # if the packet is being handled, or if have have disabled deferred packet parsing, handle it!
-            if self.message_handler.is_message_handled(self.current_template.name) or not self.settings.ENABLE_DEFERRED_PACKET_PARSING:
+        return self.decode(context)
 
-                try:
-                    return self.__decode_data(msg_buff)
-                except exc.DataUnpackingError, error:
-                    #logger.warning("Error parsing packet due to: %s" % (error))
-                    raise exc.MessageDeserializationError(self.current_template.name, error)
-                    return None
+    def decode(self, datagram, header = None):
+        """ decode a datagram into a Message
 
-            else:
+        header is what peek_header() returned for the datagram, if it has
+        already been read, so its acks and template aren't read again
 
-                if self.settings.LOG_VERBOSE \
-                and self.settings.ENABLE_UDP_LOGGING \
-                and self.settings.LOG_SKIPPED_PACKETS \
-                and not self.settings.PROXY_LOGGING:
-                    logger.debug('Received packet : %s (Skipping)' % (self.current_template.name))
+        returns None if the message is unknown, not allowed over UDP, or
+        skipped because no one is handling it
+        """
 
-        return None
+        return self.__decode(datagram, {}, self.__log_skipped(), header)
 
-    def __validate_message(self, message_buffer):
-        """ Determines if the message follows a given template. """
-        if self.__decode_template(message_buffer) == True:
-            return True
+    def deserialize_many(self, datagrams, headers = None):
+        """ decode a list of datagrams, e.g. all those waiting on a socket
 
-        return False
+        The checks of whether a message is allowed over UDP and is being
+        handled, and the logging settings, are done once per batch rather
+        than once per datagram. headers is a list of what peek_header()
+        returned for each datagram, if they have already been read.
 
-    def __decode_template(self, message_buffer):
-        """ Determines the template that the message in the buffer
-            appears to be using. """
-        if PacketLayout.PACKET_ID_LENGTH >= len(message_buffer):
-            raise exc.MessageDeserializationError("packet length", "template mismatch")
+        returns a list with one entry per datagram, in the same order, each
+        being what decode would have returned for it
+        """
 
-        header = message_buffer[PacketLayout.PACKET_ID_LENGTH:12]
-        self.current_template = self.__decode_header(header)
-        if self.current_template != None:
-            return True
+        # message name -> (allowed over udp, decoded, decoder)
+        decisions = {}
+        log_skipped = self.__log_skipped()
 
-        logger.info("Received unknown packet: '%s', packet is not in our message_template" % (header)) 
+        if headers == None:
+            headers = [None] * len(datagrams)
 
-        return False
+        return [self.__decode(datagram, decisions, log_skipped, header) \
+                for datagram, header in zip(datagrams, headers)]
 
-    def __decode_header(self, header):
-        frequency = self.__decode_frequency(header)
-        num = self.__decode_num(header)
+    def __log_skipped(self):
 
-        result = self.template_dict.get_template_by_pair(frequency, num)
+        return self.settings.LOG_VERBOSE \
+               and self.settings.ENABLE_UDP_LOGGING \
+               and self.settings.LOG_SKIPPED_PACKETS \
+               and not self.settings.PROXY_LOGGING \
+               and logger.isEnabledFor(DEBUG)
 
-        return result
+    def __decode(self, datagram, decisions, log_skipped, header = None):
+        """ decode a datagram, caching what is learned about its template in
+        decisions. With the datagram's PacketHeader, the body is only
+        zero expanded if it is decoded """
+
+        msg_buff = datagram
+
+        if header != None:
+
+            body_end = header.body_end
+            template = header.template
+
+            if template == None:
+                self.__log_unknown(datagram[PacketLayout.PACKET_ID_LENGTH:12])
+                return None
 
-    def __decode_frequency(self, header):
-        #if it is not a high
-        if header[0] == '\xFF':
-            #if it is not a medium frequency message
-            if header[1] == '\xFF':
-                #if it is a Fixed frequency message
-                if header[2] == '\xFF':
-                    return 'Fixed'
-                #then it is low
-                else:
-                    return 'Low'
-            #then it is medium
-            else:
-                return 'Medium'
-        #then it is high
         else:
-            return 'High'
 
-        return None
+            #Must first find where the acks start if present, and zero-decode,
+            #if needed, in order to determine proper template. The acks are read
+            #in place from the datagram, rather than being sliced off and
+            #rejoined to the body
 
-    def __decode_num(self, header):
-        frequency = self.__decode_frequency(header)
+            body_end = len(msg_buff)
 
-        if frequency == 'Low':
-            return struct.unpack('>H', header[2:4])[0] #int("0x"+ByteToHex(header[2:4]).replace(' ', ''),16)
+            if ord(msg_buff[0]) & PackFlags.LL_ACK_FLAG:
+                num_acks = ord(msg_buff[body_end-1])
+                body_end -= 1 + sizeof(MsgType.MVT_U32) * num_acks
 
-        elif frequency == 'Medium':
-            return struct.unpack('>B', header[1:2])[0] #int("0x"+ByteToHex(header[1:2]).replace(' ', ''),16)
+            msg_buff, body_end = self.__expand_body(msg_buff, body_end)
 
-        elif frequency == 'High':
-            return struct.unpack('>B', header[0])[0] #int("0x"+ByteToHex(header[0]), 16)  
+            template = self.__decode_template(msg_buff)
 
-        elif frequency == 'Fixed':
-            return struct.unpack('>B', header[3:4])[0] #int("0x"+ByteToHex(header[0:4]).replace(' ', ''), 16)
+            if template == None:
+                return None
 
+        if template.name in decisions:
+            allowed, decoded, decoder = decisions[template.name]
         else:
+            allowed = self.message_xml.validate_udp_msg(template.name)
+            decoded = self.is_message_decoded(template.name)
+            if template.name in self.settings.COLUMNAR_MESSAGES:
+                decoder = get_columnar_decoder(template)
+            else:
+                # only the fields the handlers asked for, if they asked
+                decoder = template.decoder.project(self.message_handler.get_projection(template.name))
+            decisions[template.name] = (allowed, decoded, decoder)
+
+        # validate whether we are allowed to receive this message over udp
+        if not allowed:
+            logger.warning("Received '%s' over UDP, when it should come over the event queue. Discarding.", template.name)
             return None
 
-    def __decode_data(self, data):
-        if self.current_template == None:
+        # if the packet is being handled, or if have have disabled deferred packet parsing, handle it!
+        if decoded:
+
+            if header != None:
+                msg_buff, body_end = self.__expand_body(msg_buff, body_end)
+
+            try:
+                return self.__decode_data(template, decoder, msg_buff, body_end, datagram, header)
+            except exc.DataUnpackingError, error:
+                #logger.warning("Error parsing packet due to: %s" % (error))
+                raise exc.MessageDeserializationError(template.name, error)
+
+        if log_skipped:
+            logger.debug('Received packet : %s (Skipping)', template.name)
+
+        return None
+
+    def __expand_body(self, msg_buff, body_end):
+        """ zero decode the body of a zero coded datagram, up to body_end,
+        where the acks start. returns the datagram and where its body ends """
+
+        if ord(msg_buff[0]) & PackFlags.LL_ZERO_CODE_FLAG:
+            offset = ord(msg_buff[5])
+            header = msg_buff[:6+offset]   #offset will be zero unless the header has extra data
+            msg_buff = header + zero_code_expand(msg_buff, 6+offset, body_end)
+            body_end = len(msg_buff)
+
+        return msg_buff, body_end
+
+    def __decode_template(self, message_buffer):
+        """ Determines the template that the message in the buffer
+            appears to be using, or None if it isn't known. """
+        if PacketLayout.PACKET_ID_LENGTH >= len(message_buffer):
+            raise exc.MessageDeserializationError("packet length", "template mismatch")
+
+        template = self.template_dict.get_template_by_header(message_buffer, PacketLayout.PACKET_ID_LENGTH)
+        if template != None:
+            return template
+
+        self.__log_unknown(message_buffer[PacketLayout.PACKET_ID_LENGTH:12])
+
+        return None
+
+    def __log_unknown(self, header):
+
+        logger.info("Received unknown packet: '%s', packet is not in our message_template", header) 
+
+    def __decode_data(self, template, decoder, data, data_end, datagram, header = None):
+        """ decode the message body in data, which ends at data_end, using
+        decoder, the template's decoder or a projection of it
+
+        the appended acks, if any, are taken from header, or read from the
+        end of datagram
+        """
+        if template == None:
             raise exc.MessageTemplateNotFound("deserializing data")
 
-        msg_data = MsgData(self.current_template.name)
+        #at the offset position, the messages stores the offset to where the
+        #payload begins (may be extra header information)
+        offset = self.unpacker.unpack_data(data, MsgType.MVT_U8, PacketLayout.PHL_OFFSET)
 
-        packet = Message(msg_data)
-        msg_size = len(data)
+        freq_bytes = template.frequency
+        #HACK: fixed case
+        if freq_bytes == -1:
+            freq_bytes = 4
 
-        packet.name = self.current_template.name
+        decode_pos = PacketLayout.PACKET_ID_LENGTH + \
+                   freq_bytes + \
+                   offset
+
+        # columnar messages are decoded up front, into their arrays
+        lazy = self.settings.ENABLE_LAZY_PACKET_PARSING and \
+               not isinstance(decoder, ColumnarDecoder)
+
+        if lazy:
+            # blocks are decoded when they are first accessed
+            packet = LazyMessage(template.name, template,
+                                 data, decode_pos, data_end, self.uuid_table)
+        elif self.settings.ENABLE_MESSAGE_POOLING:
+            packet = self.message_pool.acquire(template.name)
+            packet.template = template
+        else:
+            packet = Message(template.name)
+            packet.template = template
 
         #determine packet flags
         packet.send_flags = ord(data[0])
         packet.packet_id = self.unpacker.unpack_data(data, MsgType.MVT_U32, 1, endian_type=EndianType.BIG)
 
-        ##Zero code flag
-        #if packet.send_flags & PackFlags.LL_ZERO_CODE_FLAG:
-            #header = data[0:PacketLayout.PACKET_ID_LENGTH-1]
-            #inputbuf = data[PacketLayout.PACKET_ID_LENGTH-1:]
-            #input_len = len(inputbuf)
-            #data = self.zero_code_expand(inputbuf, input_len)
-            #data = header + data 
-
         #ACK_FLAG - means the incoming packet is acking some old packets of ours
-        if packet.send_flags & PackFlags.LL_ACK_FLAG:
-            msg_size -= 1
-            acks = self.unpacker.unpack_data(data, MsgType.MVT_U8, msg_size)
-            ack_start = acks * sizeof(MsgType.MVT_U32)
-            ack_data = data[msg_size-ack_start:]
-            ack_pos = 0
+        if header != None:
+            for ack_packet_id in header.acks:
+                packet.add_ack(ack_packet_id)
+
+        elif packet.send_flags & PackFlags.LL_ACK_FLAG:
+            msg_size = len(datagram) - 1
+            acks = ord(datagram[msg_size])
+            ack_pos = msg_size - acks * sizeof(MsgType.MVT_U32)
             while acks > 0:
-                ack_packet_id = self.unpacker.unpack_data(ack_data, MsgType.MVT_U32, \
-                                                          start_index=ack_pos)
+                ack_packet_id = self.unpacker.unpack_data(datagram, MsgType.MVT_U32, \
+                                                          start_index=ack_pos, \
+                                                          endian_type=EndianType.BIG)
                 ack_pos += sizeof(MsgType.MVT_U32)
                 packet.add_ack(ack_packet_id)
                 acks -= 1
@@ -255,139 +378,27 @@ class UDPMessageDeserializer(object):
                 #case - ack we sent wasn't received by the sender
             pass
 
-        #at the offset position, the messages stores the offset to where the
-        #payload begins (may be extra header information)
-        #print "Decoding offset"
-        offset = self.unpacker.unpack_data(data, MsgType.MVT_U8, PacketLayout.PHL_OFFSET)
+        if lazy:
+            return packet
 
-        freq_bytes = self.current_template.frequency
-        #HACK: fixed case
-        if freq_bytes == -1:
-            freq_bytes = 4
-
-        decode_pos = PacketLayout.PACKET_ID_LENGTH + \
-                   freq_bytes + \
-                   offset
+        # the blocks are decoded straight into the packet's dict, which a
+        # pooled packet reuses
+        msg_data = MsgData(template.name)
+        msg_data.blocks = packet.blocks
 
-        for block in self.current_template.blocks:
-            repeat_count = 0
-
-            if block.block_type == MsgBlockType.MBT_SINGLE:
-                repeat_count = 1
-            elif block.block_type == MsgBlockType.MBT_MULTIPLE:
-                repeat_count = block.number
-
-            elif block.block_type == MsgBlockType.MBT_VARIABLE:
-                #if the block type is VARIABLE, then the current position
-                #will be the repeat count written in
-                #print "Reading VARIABLE block repeat count" 
-                repeat_count = self.unpacker.unpack_data(data, \
-                                                         MsgType.MVT_U8, \
-                                                         decode_pos)
-
-                decode_pos += 1
-            # ToDo: we need to allow the system to parse as much as it knows about 
-            # and to return what is can, not return None
-            else:
-                logger.warning("ERROR: Unknown block type: %s in %s packet." % (str(block.block_type), packet.name))
-                return None
+        if decoder.decode(data, decode_pos, msg_data, data_end, self.uuid_table) == None:
+            packet.release()
+            return None
 
-            for i in range(repeat_count):
-                block_data = MsgBlockData(block.name)
-                block_data.block_number = i
-                self.current_block = block_data
-
-                msg_data.add_block(self.current_block)
-
-                for variable in block.variables:
-
-                    var_size = variable.size
-                    if variable.type == MsgType.MVT_VARIABLE:
-                        #this isn't the size of the data, but the max bytes
-                        #the data can be
-                        #need to copy because we have to advance our decode_pos
-                        #afterwards
-                        data_size = var_size
-                        #HACK: this is a slow procedure, should passed in
-                        templen = len(data)
-                        if (decode_pos + data_size) > templen:
-                            logger.warning("ERROR: trying to read %s from a buffer of len %s in %s" % (str(decode_pos + var_size), str(len(data)), packet.name))
-                            return None
-                        if data_size == 1:
-                            #print "Reading VARIABLE variable size 1 byte"
-                            var_size = self.unpacker.unpack_data(data, \
-                                                                 MsgType.MVT_U8, \
-                                                                 decode_pos)
-                        elif data_size == 2:
-                            #print "Reading VARIABLE variable size 2 bytes" 
-                            var_size = self.unpacker.unpack_data(data, \
-                                                                 MsgType.MVT_U16, \
-                                                                 decode_pos)
-                        elif data_size == 4:
-                            #print "Reading VARIABLE variable size 4 bytes"
-                            var_size = self.unpacker.unpack_data(data, \
-                                                                 MsgType.MVT_U32, \
-                                                                 decode_pos)
-
-                        else:
-                            raise exc.MessageDeserializationError("variable", "unknown data size")
-
-                        decode_pos += data_size
-
-                    #HACK: this is a slow procedure, should passed in
-                    if (decode_pos + var_size) > len(data):
-                        print var_size
-                        logger.warning("ERROR: trying to read %s from a buffer of len %s in %s" % (str(decode_pos + var_size), str(len(data)), packet.name))
-                        return None
-                    try:
-                        unpacked_data = self.unpacker.unpack_data(data, \
-                                                                variable.type, \
-                                                                decode_pos, \
-                                                                var_size=var_size)
-                    except Exception, e:
-                        logger.error("Problem parsing data in %s for %s:%s. Parameters were: Len(data):%s Type:%s decode_pos:%s var_size:%s" % (packet.name, block.name, variable.name, len(data), variable.type, decode_pos, var_size))
-                        raise
-                    #HACK 2: some unpacked_data of type variable needs to treated as binary instead of as string  
-                    if variable.type == MsgType.MVT_VARIABLE and variable.name != 'Data':
-                        unpacked_data = unpacked_data.rstrip('\x00')
-                    var_data = MsgVariableData(variable.name, unpacked_data, variable.type)
-                    self.current_block.add_variable(var_data)
-                    decode_pos += var_size
-
-
-        if len(msg_data.blocks) <= 0 and len(self.current_template.blocks) > 0:
+        if len(msg_data.blocks) <= 0 and len(template.blocks) > 0 and decoder.projection == None:
             raise exc.MessageDeserializationError("message", "message is empty")
 
-        packet.blocks = msg_data.blocks
         return packet
 
     def zero_code_expand(self, msg_buf, msg_size):
-        """made this call more generic due to changes in how zero_code_expand is called. 
-        no more header issues in actual call. Its taken care of earlier in process""" 
-        #if ord(msg_buf[0]) & PackFlags.LL_ZERO_CODE_FLAG == 0:
-            #return msg_buf
-
-        #header = msg_buf[0:PacketLayout.PACKET_ID_LENGTH]
-        #inputbuf = msg_buf[PacketLayout.PACKET_ID_LENGTH:]
-        inputbuf = msg_buf[:]
-        newstring = ""
-        in_zero = False
-        for c in inputbuf:
-            if c != '\0':
-                if in_zero == True:
-                    zero_count = ord(c)
-                    zero_count = zero_count -1
-                    while zero_count>0:
-                        newstring = newstring + '\x00'
-                        zero_count = zero_count -1
-                    in_zero = False
-                else:
-                    newstring = newstring + c
-            else:
-                newstring = newstring + c
-                in_zero = True
-        #return header + newstring
-        return newstring
+        """ expand the zero coded msg_buf[:msg_size], see zerocode.zero_code_expand """
+
+        return zero_code_expand(msg_buf, 0, msg_size)
 
 
 
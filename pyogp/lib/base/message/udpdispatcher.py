@@ -17,7 +17,7 @@ $/LicenseInfo$
 """
 
 # standard python libs
-from logging import getLogger
+from logging import getLogger, DEBUG
 import traceback
 #from msgtypes import *
 
@@ -26,14 +26,15 @@ from circuit import CircuitManager
 from msgtypes import MsgType, MsgBlockType, MsgFrequency, PacketLayout, EndianType, PackFlags, sizeof
 from udpserializer import UDPMessageSerializer
 from udpdeserializer import UDPMessageDeserializer
+from template_dict import TemplateDictionary
 from data_unpacker import DataUnpacker
-from message import Message, Block
+from message import Message, Block, PreparedMessage
 from pyogp.lib.base.message.message_dot_xml import MessageDotXML
 
 from pyogp.lib.base.network.net import NetUDPClient
 from pyogp.lib.base import exc
 from pyogp.lib.base.settings import Settings
-from pyogp.lib.base.helpers import Helpers
+from pyogp.lib.base.helpers import Helpers, LazyHex
 
 # initialize logging
 logger = getLogger('message.udpdispatcher')
@@ -95,11 +96,15 @@ class UDPDispatcher(object):
             from pyogp.lib.base.message.message_handler import MessageHandler
             self.message_handler = MessageHandler()
 
-        # set up our parsers
+        # set up our parsers, which share the one set of templates
+        self.template_dict = TemplateDictionary(message_template = self.message_template)
         self.udp_deserializer = UDPMessageDeserializer(self.message_handler, 
                                                         self.settings,
-                                                        message_template = self.message_template)
-        self.udp_serializer = UDPMessageSerializer(message_template = self.message_template)
+                                                        message_xml = self.message_xml,
+                                                        template_dict = self.template_dict)
+        self.udp_serializer = UDPMessageSerializer(message_xml = self.message_xml,
+                                                   template_dict = self.template_dict,
+                                                   mtu = self.settings.UDP_MTU)
 
     def find_circuit(self, host):
         circuit = self.circuit_manager.get_circuit(host)
@@ -127,49 +132,100 @@ class UDPDispatcher(object):
 
             self.packets_in += 1
 
-            recv_packet = self.udp_deserializer.deserialize(msg_buf)
+            # the header tells us enough to do the reliability bookkeeping,
+            # the body is only decoded when someone is handling the message,
+            # which the deserializer decides, and logs if it is skipped
+            header = self.udp_deserializer.peek_header(msg_buf)
 
-            #couldn't deserialize
-            if recv_packet == None:
+            recv_packet = self.udp_deserializer.decode(msg_buf, header)
 
-                # if its sent as reliable, we should ack it even if we aren't going to parse it
-                # since we can skip parsing the packet in self.udp_deserializer
+            recv_packet = self.__receive_packet(circuit, host, msg_buf, header, recv_packet)
 
-                # this indicate reliable
-                send_flags = ord(msg_buf[0])
-                packet_id = self.data_unpacker.unpack_data(msg_buf, MsgType.MVT_U32, 1, endian_type=EndianType.BIG)
+        return recv_packet
 
-                # queue the ack up
-                circuit.collect_ack(packet_id)
+    def receive_check_many(self, host, msg_bufs):
+        """ check and decode a list of datagrams received from host, e.g. all
+        those waiting on the socket
 
-                return None
+        The circuit, the logging settings and the decoding are looked up
+        once for the batch, see UDPMessageDeserializer.deserialize_many.
+        Each datagram's header is read once, and handed on to the
+        deserializer.
 
-            #Case - trusted packets can only come in over trusted circuits
-            if circuit.is_trusted and \
-                recv_packet.trusted == False:
-                return None
+        returns the packets that were received and decoded, in the order
+        they arrived
+        """
 
-            circuit.handle_packet(recv_packet)
+        msg_bufs = [msg_buf for msg_buf in msg_bufs if len(msg_buf) > 0]
 
-            if self.settings.ENABLE_UDP_LOGGING:
-                if self.settings.ENABLE_BYTES_TO_HEX_LOGGING:
-                    hex_string = '<=>' + self.helpers.bytes_to_hex(msg_buf)
-                else:
-                    hex_string = ''
-                if self.settings.ENABLE_HOST_LOGGING:
-                    host_string = ' (%s)' % (host)
-                else:
-                    host_string = ''
-                if not self.settings.PROXY_LOGGING:
-                    logger.debug('Received packet%s : %s (%s)%s' % (host_string, recv_packet.name, recv_packet.packet_id, hex_string))
+        if len(msg_bufs) == 0:
+            return []
+
+        circuit = self.find_circuit(host)
+        if circuit == None:
+            raise exc.CircuitNotFound(host, 'preparing to check for packets')
+
+        self.packets_in += len(msg_bufs)
+
+        headers = [self.udp_deserializer.peek_header(msg_buf) for msg_buf in msg_bufs]
+
+        # only the bodies of the messages someone is handling are decoded,
+        # the others come back as None
+        recv_packets = self.udp_deserializer.deserialize_many(msg_bufs, headers)
+
+        received = []
+
+        for msg_buf, header, recv_packet in zip(msg_bufs, headers, recv_packets):
+
+            recv_packet = self.__receive_packet(circuit, host, msg_buf, header, recv_packet)
+
+            if recv_packet != None:
+                received.append(recv_packet)
+
+        return received
+
+    def __receive_packet(self, circuit, host, msg_buf, header, recv_packet):
+        """ the reliability bookkeeping, logging and handling of a received
+        datagram, returns recv_packet, or None if it is to be dropped """
+
+        #skipped, or couldn't deserialize
+        if recv_packet == None:
+
+            # if its sent as reliable, we should ack it even if we aren't going to parse it
+            # and the acks appended to it still count
+            if header != None:
+                circuit.handle_packet(header)
+
+            return None
+
+        #Case - trusted packets can only come in over trusted circuits
+        if circuit.is_trusted and \
+            recv_packet.trusted == False:
+            return None
+
+        circuit.handle_packet(recv_packet)
+
+        # the hex and the message are formatted only if the record is
+        # emitted, see helpers.LazyHex
+        if self.settings.ENABLE_UDP_LOGGING and not self.settings.PROXY_LOGGING and logger.isEnabledFor(DEBUG):
+            if self.settings.ENABLE_BYTES_TO_HEX_LOGGING:
+                hex_string = LazyHex(msg_buf, '<=>')
+            else:
+                hex_string = ''
+            if self.settings.ENABLE_HOST_LOGGING:
+                host_string = ' (%s)' % (host)
+            else:
+                host_string = ''
+            logger.debug('Received packet%s : %s (%s)%s', host_string, recv_packet.name, recv_packet.packet_id, hex_string)
 
-            if self.settings.HANDLE_PACKETS:
-                self.message_handler.handle(recv_packet)
+        if self.settings.HANDLE_PACKETS:
+            self.message_handler.handle(recv_packet)
 
         return recv_packet
 
     def send_reliable(self, message, host, retries):
-        """ Wants to be acked """
+        """ Wants to be acked. Returns what send_message does: the datagram
+            sent, or a list of them if the message was split """
         #sets up the message so send_message will add the RELIABLE flag to
         #the message
         return self.__send_message(message, host, reliable=True, retries=retries)
@@ -180,6 +236,11 @@ class UDPDispatcher(object):
         return self.__send_message(host, message, retrying=True)                
 
     def send_message(self, message, host):
+        """ Sends message to host, returning the datagram sent. A message
+            that doesn't fit in settings.UDP_MTU is split into several,
+            see UDPMessageSerializer.split, and then a list of the
+            datagrams is returned instead. The same goes for
+            send_reliable """
         return self.__send_message(message, host)
 
     def __send_message(self, message, host, reliable=False, retries=0, retrying=False):
@@ -188,13 +249,40 @@ class UDPDispatcher(object):
         if host.is_ok() == False:
             return
 
-        if isinstance(message,Message):
+        if isinstance(message, (Message, PreparedMessage)):
             packet = message
         else:
             packet = message()
 
-        # enable monitoring of outgoing packets
-        if self.settings.HANDLE_OUTGOING_PACKETS:
+        #the body doesn't depend on the header, so a message too big for
+        #one datagram is found before it is given a packet id, and goes
+        #out as several
+        try:
+            try:
+                body = self.udp_serializer.encode_body(packet, check_size = True)
+            except exc.MessageTooLarge:
+                packets = self.udp_serializer.split(packet)
+
+                if len(packets) > 1:
+                    return [self.__send_message(part, host, reliable, retries, retrying) \
+                            for part in packets]
+
+                #a single repeat that doesn't fit still goes out on its own
+                body = self.udp_serializer.encode_body(packet)
+
+        except Exception, error:
+            logger.warning("Error trying to serialize the following packet: %s", packet)
+            traceback.print_exc()
+
+            return
+
+        #unknown, or not allowed over UDP, which the serializer logged
+        if body == None:
+            return
+
+        # enable monitoring of outgoing packets. A PreparedMessage only
+        # has its encoded body, and no blocks to hand to the handlers
+        if self.settings.HANDLE_OUTGOING_PACKETS and not isinstance(packet, PreparedMessage):
             self.message_handler.handle(packet)
 
         #use circuit manager to get the circuit to send on
@@ -210,21 +298,25 @@ class UDPDispatcher(object):
             circuit.prepare_packet(packet)
 
         try:
-            send_buffer = self.udp_serializer.serialize(packet)
+            send_buffer = self.udp_serializer.serialize(packet, body)
+
+            #the acks that fit on the packet don't need a PacketAck any more
+            if send_buffer != None:
+                circuit.sent_acks(packet.acks)
 
-            if self.settings.ENABLE_UDP_LOGGING:
+            if self.settings.ENABLE_UDP_LOGGING and logger.isEnabledFor(DEBUG):
                 if packet.name in self.settings.UDP_SPAMMERS and self.settings.DISABLE_SPAMMERS:
                     pass
                 else:
                     if self.settings.ENABLE_BYTES_TO_HEX_LOGGING:
-                        hex_string = '<=>' + self.helpers.bytes_to_hex(send_buffer)
+                        hex_string = LazyHex(send_buffer, '<=>')
                     else:
                         hex_string = ''
                     if self.settings.ENABLE_HOST_LOGGING:
                         host_string = ' (%s)' % (host)
                     else:
                         host_string = ''
-                    logger.debug('Sent packet    %s : %s (%s)%s' % (host_string, packet.name, packet.packet_id, hex_string))
+                    logger.debug('Sent packet    %s : %s (%s)%s', host_string, packet.name, packet.packet_id, hex_string)
 
             #TODO: remove this when testing a network
             self.udp_client.send_packet(send_buffer, host)
@@ -237,7 +329,7 @@ class UDPDispatcher(object):
             pass
 
         except Exception, error:
-            logger.warning("Error trying to serialize the following packet: %s" % (packet))
+            logger.warning("Error trying to serialize the following packet: %s", packet)
             traceback.print_exc()
 
             return
@@ -279,36 +371,27 @@ class UDPDispatcher(object):
             #        del circuit.final_retry_packets[unacked_packet.packet_id] 
 
     def __send_acks(self):
-        """ Acks all packets received that we haven't acked yet. """
+        """ Acks all packets received that we haven't acked yet. Most go out
+            appended to other packets as they are sent, so this only has to
+            send the ones that are left when there is no other traffic. """
 
-        # ToDo: review this, not sure it's right?
         for circuit in self.circuit_manager.circuit_map.values():
 
-            acks_this_packet = 0
-            msg = None
-
-            for packet_id in circuit.acks:
+            if len(circuit.acks) == 0:
+                continue
 
-                if acks_this_packet == 0:
+            msg = Message('PacketAck')
 
-                    msg = Message('PacketAck')
+            for packet_id in circuit.acks:
 
                 block = Block("Packets", ID=packet_id)
                 msg.add_block(block)
 
                 if self.settings.LOG_VERBOSE and not self.settings.DISABLE_SPAMMERS:
-                    logger.debug("Acking packet id: %s" % (packet_id))
-
-                acks_this_packet += 1
-
-                if acks_this_packet > 250:
-
-                    self.send_message(msg, circuit.host)
-                    acks_this_packet = 0
-
-            if acks_this_packet > 0:
+                    logger.debug("Acking packet id: %s", packet_id)
 
-                self.send_message(msg, circuit.host)
+            #send_message splits it into as many packets as it takes
+            self.send_message(msg, circuit.host)
 
             circuit.acks = []
 
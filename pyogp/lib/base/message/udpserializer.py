@@ -21,11 +21,14 @@ import struct
 from logging import getLogger
 
 # pygop
-from msgtypes import MsgType, MsgBlockType, EndianType
+from msgtypes import MsgType, MsgBlockType, EndianType, PackFlags, MsgEncoding, PacketLayout, sizeof
 from data_packer import DataPacker
 from template_dict import TemplateDictionary
+from zerocode import zero_code_encode
 from pyogp.lib.base import exc
 from pyogp.lib.base.message.message_dot_xml import MessageDotXML
+from message import Message, PreparedMessage
+from template_encoder import MAX_BLOCK_REPEATS
 
 logger = getLogger('message.udpserializer') 
 
@@ -34,14 +37,27 @@ class UDPMessageSerializer(object):
 
         This class builds messages at its high level, that is, keeping
         that data in data structure form. A serializer should be used on
-        the message produced by this so that it can be sent over a network. """
+        the message produced by this so that it can be sent over a network.
 
-    def __init__(self, message_template = None, message_xml = None):
+        No state about the message being encoded is kept on the instance,
+        so one serializer can encode on several threads or greenlets at once.
+        The template dictionary is only read, and can be shared by passing it
+        in as template_dict.
+
+        mtu is the largest datagram to build. Acks are only appended to a
+        message while they fit in it, and split() spreads messages that
+        don't fit over several. None means there is no limit. """
+
+    def __init__(self, message_template = None, message_xml = None, template_dict = None, mtu = None):
         """initialize the adapter"""
-        self.context = None	# the UDPMessage
 
-        self.template_dict = TemplateDictionary(message_template)
-        self.current_template = None
+        self.mtu = mtu
+
+        if template_dict != None:
+            self.template_dict = template_dict
+        else:
+            self.template_dict = TemplateDictionary(message_template = message_template)
+
         self.packer = DataPacker()
 
         if not message_xml:
@@ -49,123 +65,286 @@ class UDPMessageSerializer(object):
         else:
             self.message_xml = message_xml
 
-    def set_current_template(self):
-        """ establish the template for the current packet """
+    def serialize(self, context, body = None):
+        """ Builds the message by serializing the data. Creates a packet ready
+            to be sent. See encode """
 
-        self.current_template = self.template_dict.get_template(self.context.name)
+        return self.encode(context, body)
 
-    def serialize(self, context):
-        """ Builds the message by serializing the data. Creates a packet ready
-            to be sent. """
+    def prepare(self, message):
+        """ encode the blocks of message once, for sending over and over
+
+        returns a PreparedMessage, whose fixed size variables can be
+        changed in place with set_var(), and which can be passed to
+        encode() or sent by the UDPDispatcher like a Message. Only the
+        header is built per send.
+        """
+
+        template = self.template_dict.get_template(message.name)
+
+        if template == None:
+            raise exc.MessageTemplateNotFound("preparing %s" % (message.name))
+
+        offsets = {}
+        body = template.encoder.encode(message, offsets)
+
+        return PreparedMessage(message, body, offsets)
+
+    def encoded_size(self, message):
+        """ the size of the datagram encode builds for message, before zero
+        coding (which is only used if it makes it smaller) and without
+        appended acks. It is worked out from the template, without
+        packing anything. """
+
+        template = self.template_dict.get_template(message.name)
+
+        if template == None:
+            raise exc.MessageTemplateNotFound("sizing %s" % (message.name))
+
+        if isinstance(message, PreparedMessage):
+            size = len(message.body)
+        else:
+            size = template.encoder.size(message)
+
+        if template.name == 'RegionHandshakeReply':
+            size += 4
+
+        return PacketLayout.PACKET_ID_LENGTH + size
+
+    def split(self, message, mtu = None):
+        """ split a message that doesn't fit in a datagram of mtu bytes
+        (by default, the mtu of the serializer) into several that do
+
+        The repeats of the Variable blocks are spread over as few messages
+        as they fit in, and the other blocks are copied into each. A repeat
+        that doesn't fit in a datagram on its own still gets one. Sizes are
+        measured as encode_body() does, after zero coding, so a message
+        is split if and only if encode_body(message, True) says it is too
+        large.
+
+        returns a list of messages, [message] if it fits or can't be split
+        """
+
+        if mtu == None:
+            mtu = self.mtu
+
+        if not isinstance(message, Message):
+            return [message]
+
+        template = self.template_dict.get_template(message.name)
+
+        if template == None:
+            return [message]
+
+        variable_blocks = [block for block in template.encoder.blocks \
+                           if block.block_type == MsgBlockType.MBT_VARIABLE]
+
+        if len(variable_blocks) == 0:
+            return [message]
+
+        too_many_repeats = False
+        for block in variable_blocks:
+            if len(message.blocks[block.name]) > MAX_BLOCK_REPEATS:
+                too_many_repeats = True
+
+        if not too_many_repeats and (mtu == None or self.__wire_size(message, template) <= mtu):
+            return [message]
+
+        zero_coded = template.msg_encoding == MsgEncoding.LL_ZEROCODED
+
+        #the size of each message before any Variable block repeats are
+        #added, before zero coding, which can only make it smaller
+        base_size = self.encoded_size(message)
+        for block in variable_blocks:
+            for block_data in message.blocks[block.name]:
+                base_size -= block.repeat_size(block_data)
+
+        parts = []
+        part = None
+
+        for block in variable_blocks:
+            for block_data in message.blocks[block.name]:
+
+                repeat_size = block.repeat_size(block_data)
+
+                #a zero coded part can take more than the sizes before zero
+                #coding add up to, which is checked by encoding it
+                if part == None or \
+                   len(part.blocks[block.name]) == MAX_BLOCK_REPEATS or \
+                   (mtu != None and part_size + repeat_size > mtu and part_size > base_size and \
+                    not (zero_coded and self.__fits_with(part, block.name, block_data, template, mtu))):
+
+                    part = self.__new_part(message, variable_blocks)
+                    parts.append(part)
+                    part_size = base_size
+
+                part.blocks[block.name].append(block_data)
+                part_size += repeat_size
+
+        return parts
+
+    def __wire_size(self, message, template):
+        """ the size of the datagram for message without appended acks,
+        after zero coding, as encode_body() builds it """
+
+        if template.msg_encoding == MsgEncoding.LL_ZEROCODED:
+            body = self.encode_body(message)
+            if body != None:
+                return PacketLayout.PACKET_ID_LENGTH + len(body[0])
+
+        return self.encoded_size(message)
 
-        self.context = context
+    def __fits_with(self, part, block_name, block_data, template, mtu):
+        """ whether part still fits in mtu with block_data added to its
+        block_name blocks """
 
-        self.set_current_template()
+        block_list = part.blocks[block_name]
+        block_list.append(block_data)
+
+        try:
+            return self.__wire_size(part, template) <= mtu
+        finally:
+            block_list.pop()
+
+    def __new_part(self, message, variable_blocks):
+        """ a copy of message without the repeats of its Variable blocks """
+
+        part = Message(message.name)
+
+        for block_name in message.blocks:
+            part.blocks[block_name] = list(message.blocks[block_name])
+
+        for block in variable_blocks:
+            part.blocks[block.name] = []
+
+        part.trusted = message.trusted
+
+        return part
+
+    def encode_body(self, message, check_size = False):
+        """ encode the body of the datagram for a Message or
+        PreparedMessage: everything after the header flags, sequence
+        number, and data offset, zero coded if that makes it smaller.
+        It doesn't depend on the header, so it can be built before the
+        message is given a packet id.
+
+        If check_size is set, a Message whose datagram would be larger
+        than the mtu raises MessageTooLarge, and can be split(), as does
+        one with more repeats of a Variable block than can be sent.
+
+        returns (body, whether it is zero coded), or None if the message
+        is unknown or not allowed over UDP
+        """
+
+        prepared = isinstance(message, PreparedMessage)
+
+        #a prepared message is only encoded again after set_var()
+        if prepared and message.encoded_body != None:
+            return message.encoded_body
+
+        template = self.template_dict.get_template(message.name)
+
+        if template == None:
+            return None
 
         # validate whether we are allowed to receive this message over udp
-        if not self.message_xml.validate_udp_msg(self.current_template.name):
-            logger.warning("Sending '%s' over UDP, which is deprecated. Discarding." % (self.current_template.name))
+        if not self.message_xml.validate_udp_msg(template.name):
+            logger.warning("Sending '%s' over UDP, which is deprecated. Discarding.", template.name)
             return None
 
-        #doesn't build in the header flags, sequence number, or data offset
-        msg_buffer = ''
-        bytes = 0
+        #the frequency and message number, and the blocks
+        if prepared:
+            msg_buffer = str(message.body)
+        else:
+            msg_buffer = template.encoder.encode(message)
+
+        if template.name == 'RegionHandshakeReply':
+            # testing a hack to let RegionHandshakeReply get parsed
+            msg_buffer += struct.pack(">I", 0)
+
+        zero_coded = False
+
+        if template.msg_encoding == MsgEncoding.LL_ZEROCODED:
+            encoded_buffer = zero_code_encode(msg_buffer)
+
+            #zero coding can grow a body without many zeros, so only use it
+            #if it saves something
+            if len(encoded_buffer) < len(msg_buffer):
+                msg_buffer = encoded_buffer
+                zero_coded = True
+
+        if check_size and self.mtu != None and isinstance(message, Message) and \
+           PacketLayout.PACKET_ID_LENGTH + len(msg_buffer) > self.mtu:
+            raise exc.MessageTooLarge(message.name, "larger than the mtu of %s" % (self.mtu))
+
+        if prepared:
+            message.encoded_body = (msg_buffer, zero_coded)
+            return message.encoded_body
+
+        return msg_buffer, zero_coded
+
+    def encode(self, message, body = None):
+        """ encode a Message or PreparedMessage into a datagram
+
+        body is what encode_body() returned for message, if it has
+        already been built.
+
+        The acks of message are appended while they fit in the mtu. Those
+        that don't are dropped from message.acks, so the caller can tell
+        which ones went out.
+
+        returns None if the message is unknown or not allowed over UDP
+        """
+
+        if body == None:
+            body = self.encode_body(message)
+
+            if body == None:
+                return None
+
+        msg_buffer, zero_coded = body
+
+        #the flag is only set if the body on the wire really is zero coded
+        send_flags = message.send_flags & ~PackFlags.LL_ZERO_CODE_FLAG
+        if zero_coded:
+            send_flags |= PackFlags.LL_ZERO_CODE_FLAG
+
+        acks = self.__appended_acks(message.acks, len(msg_buffer))
+
+        #the acks go after the zero coded body, as big endian U32s followed
+        #by their count
+        if acks:
+            msg_buffer += struct.pack('>%dIB' % (len(acks)), *(acks + [len(acks)]))
+            send_flags |= PackFlags.LL_ACK_FLAG
+        else:
+            send_flags &= ~PackFlags.LL_ACK_FLAG
+
+        message.acks = acks
+        message.num_acks = len(acks)
 
         #put the flags in the begining of the data. NOTE: for 1 byte, endian doesn't matter
-        msg_buffer += self.packer.pack_data(self.context.send_flags, MsgType.MVT_U8)
+        header = self.packer.pack_data(send_flags, MsgType.MVT_U8)
 
         #set packet ID
-        msg_buffer += self.packer.pack_data(self.context.packet_id, \
-                                                  MsgType.MVT_S32, \
-                                                  endian_type=EndianType.BIG)
+        header += self.packer.pack_data(message.packet_id, \
+                                              MsgType.MVT_S32, \
+                                              endian_type=EndianType.BIG)
 
         #pack in the offset to the data. NOTE: for 1 byte, endian doesn't matter
-        msg_buffer += self.packer.pack_data(0, MsgType.MVT_U8)
-
-        if self.current_template == None:
-            return None
+        header += self.packer.pack_data(0, MsgType.MVT_U8)
 
-        #don't need to pack the frequency and message number. The template
-        #stores it because it doesn't change per template.
-        pack_freq_num = self.current_template.msg_num_hex
-        msg_buffer += pack_freq_num
-        bytes += len(pack_freq_num)
+        return header + msg_buffer
 
-        #message_data = self.context.message_data
+    def __appended_acks(self, acks, body_size):
+        """ the acks that fit after a body of body_size bytes """
 
-        for block in self.current_template.get_blocks():
-            packed_block, block_size = self.build_block(block, context)
-            msg_buffer += packed_block
-            bytes += block_size
+        max_acks = PacketLayout.MAX_APPENDED_ACKS
 
-        if self.current_template.name == 'RegionHandshakeReply':
-            # testing a hack to let RegionHandshakeReply get parsed
-            msg_buffer += struct.pack(">I", 0)
+        if self.mtu != None:
+            space = self.mtu - PacketLayout.PACKET_ID_LENGTH - body_size - 1
+            max_acks = min(max_acks, max(space, 0) / sizeof(MsgType.MVT_U32))
 
-        self.message_buffer = msg_buffer
-
-        return msg_buffer
-
-    def build_block(self, template_block, message_data):
-        block_buffer = ''
-        bytes = 0
-
-        #the MsgData blocks is a list of lists
-        #each block in the list is a block_list because you can have more than
-        #one block for any given name
-        block_list = message_data.get_block(template_block.name)
-        block_count = len(block_list)
-
-        #multiple block type means there is a static number of these blocks
-        #that make up this message, with the number stored in the template
-        #don't need to add it to the buffer, because the message handlers that
-        #receieve this know how many to read automatically
-        if template_block.block_type == MsgBlockType.MBT_MULTIPLE:
-            if template_block.number != block_count:
-                raise exc.MessageSerializationError(template_block.name, "block data mismatch")
-
-        #variable means the block variables can repeat, so we have to
-        #mark how many blocks there are of this type that repeat, stored in
-        #the data
-        if template_block.block_type == MsgBlockType.MBT_VARIABLE:
-            block_buffer += struct.pack('>B', block_count)
-            bytes += 1            
-
-        for block in block_list:
-
-            for v in template_block.get_variables(): #message_block.get_variables():
-                #this mapping has to occur to make sure the data is written in correct order
-                variable = block.get_variable(v.name)
-                var_size  = v.size
-                var_data  = variable.data
-
-                data = self.packer.pack_data(var_data, v.type)
-
-                if variable == None:
-                    raise exc.MessageSerializationError(variable.name, "variable value is not set")
-
-
-                #if its a VARIABLE type, we have to write in the size of the data
-                if v.type == MsgType.MVT_VARIABLE:
-                    #data_size = template_block.get_variable(variable.name).size
-                    if var_size == 1:
-                        block_buffer += self.packer.pack_data(len(data), MsgType.MVT_U8)
-                        #block_buffer += struct.pack('>B', var_size)
-                    elif var_size == 2:
-                        block_buffer += self.packer.pack_data(len(data), MsgType.MVT_U16)
-                        #block_buffer += struct.pack('>H', var_size)
-                    elif var_size == 4:
-                        block_buffer += self.packer.pack_data(len(data), MsgType.MVT_U32)
-                        #block_buffer += struct.pack('>I', var_size)
-                    else:
-                        raise exc.MessageSerializationError("variable size", "unrecognized variable size")
-
-                    bytes += var_size
-
-                block_buffer += data
-                bytes += len(data)
-
-        return block_buffer, bytes
+        return list(acks[:max_acks])
 
 
 
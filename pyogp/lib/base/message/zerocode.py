@@ -0,0 +1,83 @@
+"""
+Contributors can be viewed at:
+http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/trunk/CONTRIBUTORS.txt
+
+$LicenseInfo:firstyear=2008&license=apachev2$
+
+Copyright 2009, Linden Research, Inc.
+
+Licensed under the Apache License, Version 2.0.
+You may obtain a copy of the License at:
+    http://www.apache.org/licenses/LICENSE-2.0
+or in
+    http://svn.secondlife.com/svn/linden/projects/2008/pyogp/lib/base/LICENSE.txt
+
+$/LicenseInfo$
+
+Zero coding of message bodies
+
+A run of zeros is sent as a single zero byte followed by a count byte.
+The header of a packet (flags, sequence number and offset) is never zero
+coded, and neither are the appended acks, so these work on the body only.
+"""
+
+# standard python libs
+import re
+
+# a run is at most 255 zeros, as its count has to fit in a byte
+ZERO_RUN = re.compile('\x00{1,255}')
+
+def _encode_run(match):
+
+    return '\x00' + chr(len(match.group(0)))
+
+def zero_code_expand(data, start = 0, end = None, limit = None):
+    """ expand the zero coded data[start:end]
+
+    If limit is given, only the first limit bytes of the expansion are
+    returned, and only as much of data as is needed for them is read.
+
+    The data is split on zeros in one pass, so the literal bytes between
+    runs are copied as whole slices rather than a byte at a time. Every
+    piece after the first starts with the count of the run of zeros that
+    preceded it. An empty piece is a zero that was followed by another zero
+    (or by nothing at all), which stands for the single zero itself.
+    """
+
+    if end == None:
+        end = len(data)
+
+    if limit != None:
+        # every input byte expands to at least one output byte, and every
+        # run of zeros takes two input bytes, so 2 * limit is always enough
+        end = min(end, start + 2 * limit)
+
+    pieces = data[start:end].split('\x00')
+
+    expanded = [pieces[0]]
+
+    for piece in pieces[1:]:
+        if piece:
+            expanded.append('\x00' * ord(piece[0]))
+            expanded.append(piece[1:])
+        else:
+            expanded.append('\x00')
+
+    expanded = ''.join(expanded)
+
+    if limit != None:
+        return expanded[:limit]
+
+    return expanded
+
+def zero_code_encode(data, start = 0, end = None):
+    """ zero code data[start:end]
+
+    Each run of up to 255 zeros becomes a zero followed by the length of the
+    run. Longer runs are split into several runs.
+    """
+
+    if end == None:
+        end = len(data)
+
+    return ZERO_RUN.sub(_encode_run, data[start:end])
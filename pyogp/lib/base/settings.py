@@ -37,6 +37,28 @@ class Settings(object):
         # toggle parsing all/handled packets
         self.ENABLE_DEFERRED_PACKET_PARSING = True
 
+        # toggle decoding the blocks of handled packets only when they
+        # are first accessed, see message.LazyMessage
+        self.ENABLE_LAZY_PACKET_PARSING = False
+
+        # messages whose repeated blocks are decoded into numpy structured
+        # arrays (needs numpy), see message.columnar
+        self.COLUMNAR_MESSAGES = []
+
+        # toggle reusing released messages rather than allocating one per
+        # packet received, see message.pool
+        self.ENABLE_MESSAGE_POOLING = False
+        self.MESSAGE_POOL_SIZE = 256
+
+        # toggle sharing one decoded UUID between the packets a deserializer
+        # decodes that carry the same id, see datatypes.UUIDTable
+        self.ENABLE_UUID_INTERNING = False
+        self.UUID_INTERN_TABLE_SIZE = 65536
+
+        # the largest datagram we send, pending acks are only appended to
+        # outgoing packets while they fit in it
+        self.UDP_MTU = 1200
+
         #~~~~~~~~~~~~~~~~~~
         # Logging behaviors
         #~~~~~~~~~~~~~~~~~~
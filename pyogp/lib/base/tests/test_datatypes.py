@@ -21,6 +21,14 @@ import unittest
 from struct import pack
 from binascii import unhexlify
 import uuid
+import copy
+import pickle
+
+# related
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # pyogp
 from pyogp.lib.base.datatypes import *
@@ -42,7 +50,7 @@ class TestDatatypes(unittest.TestCase):
         # grab the position embedded starting at position 16
         Position = Vector3(data, 16)
 
-        self.assertEquals(Position.__dict__, {'Y': 127.99840545654297, 'X': 128.00155639648438, 'Z': 28.399967193603516})
+        self.assertEquals((Position.X, Position.Y, Position.Z), (128.00155639648438, 127.99840545654297, 28.399967193603516))
         self.assertEquals(Position(), (128.00155639648438, 127.99840545654297, 28.399967193603516))
 
     def test_Vector3_get_bytes(self):
@@ -57,14 +65,13 @@ class TestDatatypes(unittest.TestCase):
 
         vector = Vector3()
 
-        self.assertEquals(vector.__dict__, {'Y': 0.0, 'X': 0.0, 'Z': 0.0})
+        self.assertRaises(AttributeError, getattr, vector, '__dict__')
         self.assertEquals(vector(), (0.0, 0.0, 0.0))
 
     def test_Vector3_from_XYZ(self):
 
         vector = Vector3(X=128.0, Y=128.0, Z=22.0)
 
-        self.assertEquals(vector.__dict__, {'Y': 128.0, 'X': 128.0, 'Z': 22.0})
         self.assertEquals(vector.X, 128.0)
         self.assertEquals(vector.Y, 128.0)        
         self.assertEquals(vector.Z, 22.0)
@@ -78,7 +85,6 @@ class TestDatatypes(unittest.TestCase):
         # grab the position embedded starting at position 16
         quat = Quaternion(data, 0)
 
-        self.assertEquals(quat.__dict__, {'Y': 0.0, 'X': 0.0, 'Z': 1.0, 'W': 27.299999237060547})
         self.assertEquals(quat(), (0.0, 0.0, 1.0, 27.299999237060547))
 
     def test_Quaternion_get_bytes(self):
@@ -91,16 +97,77 @@ class TestDatatypes(unittest.TestCase):
 
         quat = Quaternion()
 
-        self.assertEquals(quat.__dict__, {'Y': 0.0, 'X': 0.0, 'Z': 0.0, 'W': 0.0})
+        self.assertRaises(AttributeError, getattr, quat, '__dict__')
         self.assertEquals(quat(), (0.0, 0.0, 0.0, 0.0))
 
     def test_Quaternion_from_XYZW(self):
 
         quat = Quaternion(X=128.0, Y=128.0, Z=22.0, W=0.0)
 
-        self.assertEquals(quat.__dict__, {'Y': 128.0, 'X': 128.0, 'Z': 22.0, 'W': 0.0})
         self.assertEquals(quat(), (128.0, 128.0, 22.0, 0.0))
 
+    def test_Quaternion_from_xyz_bytes(self):
+
+        quat = Quaternion(pack('<3f', 0.0, 0.0, 0.6), 0, length = 3)
+
+        self.assertAlmostEquals(quat.W, 0.8, 5)
+
+    def test_Vector3_unpack_list(self):
+
+        data = pack('<7f', 9.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0)
+
+        vectors = Vector3.unpack_list(data, 4)
+
+        self.assertEquals([vector() for vector in vectors], [(1.0, 2.0, 3.0), (4.0, 5.0, 6.0)])
+        self.assertEquals(len(Vector3.unpack_list(data, 4, 1)), 1)
+
+    def test_Vector3_unpack_array(self):
+
+        if numpy == None:
+            return
+
+        data = pack('<7f', 9.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0)
+
+        vectors = Vector3.unpack_array(data, 4)
+
+        self.assertEquals(vectors.shape, (2, 3))
+        self.assertEquals(vectors[1].tolist(), [4.0, 5.0, 6.0])
+
+    def test_Quaternion_unpack_list(self):
+
+        quats = Quaternion.unpack_list(pack('<7f', 0.0, 0.0, 0.6, 0.0, 0.0, 0.0, 1.0), length = 3)
+
+        self.assertEquals(len(quats), 2)
+        self.assertAlmostEquals(quats[0].W, 0.8, 5)
+
+        quats = Quaternion.unpack_list(pack('<4f', 1.0, 2.0, 3.0, 4.0))
+
+        self.assertEquals(quats[0](), (1.0, 2.0, 3.0, 4.0))
+
+    def test_Vector3_arithmetic(self):
+
+        a = Vector3(X = 1.0, Y = 2.0, Z = 3.0)
+        b = Vector3(X = 4.0, Y = 6.0, Z = 8.0)
+
+        self.assertEquals((a + b)(), (5.0, 8.0, 11.0))
+        self.assertEquals((b - a)(), (3.0, 4.0, 5.0))
+        self.assertEquals((a * 2)(), (2.0, 4.0, 6.0))
+        self.assertEquals((2 * a)(), (2.0, 4.0, 6.0))
+        self.assertEquals((b / 2)(), (2.0, 3.0, 4.0))
+        self.assertEquals((-a)(), (-1.0, -2.0, -3.0))
+        self.assertEquals(a.dot(b), 40.0)
+        self.assertEquals(Vector3(X = 3.0, Y = 4.0).length(), 5.0)
+
+        a += b
+        self.assertEquals(a(), (5.0, 8.0, 11.0))
+
+    def test_Vector3_copy(self):
+
+        vector = Vector3(X = 1.0, Y = 2.0, Z = 3.0)
+
+        self.assertEquals(pickle.loads(pickle.dumps(vector))(), (1.0, 2.0, 3.0))
+        self.assertEquals(copy.copy(vector)(), (1.0, 2.0, 3.0))
+
     def test_UUID_from_bytes(self):
 
         tmp_uuid = uuid.UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca')
@@ -123,7 +190,7 @@ class TestDatatypes(unittest.TestCase):
 
         tmp_uuid = UUID()
 
-        self.assertEquals(tmp_uuid.__dict__, {'uuid': uuid.UUID('00000000-0000-0000-0000-000000000000')})
+        self.assertEquals(tmp_uuid.get_bytes(), '\x00' * 16)
         self.assertEquals(tmp_uuid(), uuid.UUID('00000000-0000-0000-0000-000000000000'))
 
     def test_UUID_from_string(self):
@@ -132,6 +199,70 @@ class TestDatatypes(unittest.TestCase):
 
         self.assertEquals(UUID(string = uuid_string).data(), uuid.UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca'))
 
+    def test_UUID_hash(self):
+
+        uuid_string = '2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca'
+        from_string = UUID(string = uuid_string)
+        from_bytes = UUID(bytes = 'xx' + uuid.UUID(uuid_string).bytes, offset = 2)
+
+        self.assertEquals(from_string, from_bytes)
+        self.assertFalse(from_string != from_bytes)
+        self.assertNotEquals(from_string, UUID())
+        self.assertEquals(hash(from_string), hash(from_bytes))
+        self.assertEquals(len(set([from_string, from_bytes, UUID()])), 2)
+        self.assertEquals(str(from_bytes), uuid_string)
+        self.assertEquals(pickle.loads(pickle.dumps(from_bytes)), from_string)
+
+    def test_UUID_lazy(self):
+
+        test_uuid = UUID.from_bytes(uuid.UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca').bytes)
+
+        self.assertEquals(test_uuid._uuid, None)
+        self.assertEquals(test_uuid.uuid, uuid.UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca'))
+
+        test_uuid = UUID()
+        test_uuid.random()
+        self.assertEquals(test_uuid.get_bytes(), test_uuid.uuid.bytes)
+
+    def test_UUID_table(self):
+
+        data = uuid.UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca').bytes
+        other = uuid.UUID('1dd5efe2-faaf-1864-5ac9-bc61c5d8d7ea').bytes
+
+        self.assertFalse(UUID.from_bytes(data) is UUID.from_bytes(data))
+
+        table = UUIDTable(1)
+        interned = table.get(data)
+        self.assert_(table.get('\x00' + data, 1) is interned)
+        self.assertEquals(interned, UUID.from_bytes(data))
+
+        # the table is emptied when it is full
+        self.assert_(table.get(other) is table.get(other))
+        self.assertEquals(len(table), 1)
+        self.assertFalse(table.get(data) is interned)
+
+        # and each table has its own
+        self.assertFalse(UUIDTable().get(data) is UUIDTable().get(data))
+
+    def test_UUID_frozen(self):
+
+        interned = UUIDTable().get('\x00' * 16)
+
+        self.assertRaises(TypeError, interned.random)
+        self.assertRaises(TypeError, setattr, interned, 'uuid', uuid.uuid4())
+        self.assertRaises(TypeError, interned.unpack_from_bytes, '\x01' * 16, 0)
+        self.assertEquals(interned.get_bytes(), '\x00' * 16)
+
+        frozen = FrozenUUID(bytes = '\x00' + 'a' * 16, offset = 1)
+        self.assertEquals(frozen.get_bytes(), 'a' * 16)
+        self.assertEquals(FrozenUUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca'),
+                          UUID('2b7f7a6e-32c5-dbfd-e2c7-926d1a9f0aca'))
+        self.assertRaises(TypeError, frozen.random)
+
+        test_uuid = interned.copy()
+        test_uuid.random()
+        self.assertNotEquals(test_uuid, interned)
+
 def test_suite():
     from unittest import TestSuite, makeSuite
     suite = TestSuite()
@@ -18,9 +18,17 @@ $/LicenseInfo$
 
 # standard python libs
 import unittest
+import struct
+import logging
+
+# related
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # pyogp
-from pyogp.lib.base.helpers import Helpers, ListLLSDSerializer, DictLLSDSerializer, LLSDDeserializer
+from pyogp.lib.base.helpers import Helpers, ListLLSDSerializer, DictLLSDSerializer, LLSDDeserializer, LazyHex
 from pyogp.lib.base.exc import DataParsingError
 
 # pyogp tests
@@ -78,6 +86,76 @@ class TestHelpers(unittest.TestCase):
 
         self.assertEquals(None, deserializer.deserialize(data))
 
+    def test_bytes_to_hex(self):
+
+        self.assertEquals(Helpers.bytes_to_hex('\x00\x1f\xab'), '00 1F AB')
+        self.assertEquals(Helpers.bytes_to_hex(''), '')
+
+    def test_LazyHex(self):
+
+        rendered = []
+
+        class RecordingHex(LazyHex):
+
+            __slots__ = ()
+
+            def __str__(self):
+                rendered.append(self.data)
+                return LazyHex.__str__(self)
+
+        self.assertEquals(str(LazyHex('\x01\x02', '<=>')), '<=>01 02')
+
+        logger = logging.getLogger('pyogp.lib.base.tests.test_helpers')
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            logger.debug('%s', RecordingHex('\x01'))
+        finally:
+            logger.setLevel(level)
+
+        self.assertEquals(rendered, [])
+
+    def test_packed_u16s_to_floats(self):
+
+        if numpy == None:
+            return
+
+        data = struct.pack('<7H', 0, 0, 32767, 32768, 65535, 100, 40000)
+
+        floats = Helpers.packed_u16s_to_floats(data, -64.0, 64.0, offset = 2)
+
+        self.assertEquals(floats.tolist(), [Helpers.packed_u16_to_float(data, offset, -64.0, 64.0)
+                                            for offset in range(2, 14, 2)])
+        self.assertEquals(floats[1:3].tolist(), [0.0, 0.0])
+        self.assertEquals(len(Helpers.packed_u16s_to_floats(data, -64.0, 64.0, count = 3)), 3)
+
+    def test_packed_u16s_to_floats_ranges(self):
+
+        if numpy == None:
+            return
+
+        values = numpy.array([[0, 65535, 0], [65535, 0, 65535]], dtype = numpy.uint16)
+
+        floats = Helpers.packed_u16s_to_floats(values, numpy.array([-1.0, -2.0, 0.0]), numpy.array([1.0, 2.0, 4.0]))
+
+        self.assertEquals(floats.tolist(), [[-1.0, 2.0, 0.0], [1.0, -2.0, 4.0]])
+
+        # offset and count are in bytes, which an array isn't read as
+        self.assertRaises(ValueError, Helpers.packed_u16s_to_floats, values, -1.0, 1.0, 2)
+        self.assertRaises(ValueError, Helpers.packed_u16s_to_floats, values, -1.0, 1.0, count = 1)
+
+    def test_packed_u8s_to_floats(self):
+
+        if numpy == None:
+            return
+
+        data = struct.pack('<4B', 0, 127, 128, 255)
+
+        floats = Helpers.packed_u8s_to_floats(data, -1.0, 1.0)
+
+        self.assertEquals(floats.tolist(), [Helpers.packed_u8_to_float(data, offset, -1.0, 1.0)
+                                            for offset in range(4)])
+
 def test_suite():
     from unittest import TestSuite, makeSuite
     suite = TestSuite()
@@ -54,5 +54,9 @@ setup(name='pyogp.lib.base',
          'wsgiref',
          'eventlet',
          'pyOpenssl'
-]
+],
+     extras_require={
+         # columnar decoding of repeated blocks, see message/columnar.py
+         'columnar': ['numpy'],
+     }
      )